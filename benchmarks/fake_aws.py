@@ -0,0 +1,265 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+"""
+Local stand-in for the EC2, AutoScaling and Cloudformation query APIs, serving a synthetic fleet
+
+Only the calls made by fabric_aws during host resolution are implemented. Every request is counted per action and
+delayed by `latency` seconds to mimic the round-trip to AWS.
+"""
+
+from __future__ import absolute_import
+
+import BaseHTTPServer
+import SocketServer
+import fnmatch
+import threading
+import time
+import urlparse
+from collections import Counter
+from xml.sax.saxutils import escape
+
+import boto.cloudformation.connection
+import boto.ec2.autoscale
+import boto.ec2.connection
+from boto.regioninfo import RegionInfo
+
+from fabric_aws.connections import pool
+
+REGION = 'us-east-1'
+AUTOSCALING_GROUP_NAME = 'bench-asg'
+STACK_NAME = 'bench-stack'
+LOGICAL_RESOURCE_ID = 'AutoScalingGroup'
+AVAILABILITY_ZONES = ['us-east-1a', 'us-east-1b', 'us-east-1c']
+
+
+class FakeInstance(object):
+    def __init__(self, index):
+        self.id = 'i-%08x' % index
+        self.state = 'running'
+        self.instance_type = 'm3.medium'
+        self.placement = AVAILABILITY_ZONES[index % len(AVAILABILITY_ZONES)]
+        self.private_ip_address = '10.%d.%d.%d' % (index >> 16 & 0xff, index >> 8 & 0xff, index & 0xff)
+        self.ip_address = '54.%d.%d.%d' % (index >> 16 & 0xff, index >> 8 & 0xff, index & 0xff)
+        self.public_dns_name = 'ec2-%s.compute-1.amazonaws.com' % self.ip_address.replace('.', '-')
+        self.tags = {'Name': 'bench-%d' % index, 'Role': 'bench', 'aws:autoscaling:groupName': AUTOSCALING_GROUP_NAME}
+
+
+def _matches(instance, filters):
+    # `filters` values are (exact values set, wildcard patterns) pairs
+    for name, (exact, patterns) in filters.items():
+        if name.startswith('tag:'):
+            actual = instance.tags.get(name[4:])
+        elif name == 'instance-id':
+            actual = instance.id
+        elif name == 'instance-state-name':
+            actual = instance.state
+        elif name == 'availability-zone':
+            actual = instance.placement
+        else:
+            raise ValueError('Unsupported filter: %s' % name)
+
+        if actual is None:
+            return False
+        if actual not in exact and not any(fnmatch.fnmatchcase(actual, pattern) for pattern in patterns):
+            return False
+
+    return True
+
+
+def _split_values(values):
+    patterns = [value for value in values if '*' in value or '?' in value]
+    return set(values) - set(patterns), patterns
+
+
+def _indexed_params(params, prefix):
+    # collects `Prefix.1`, `Prefix.2`... (or `Prefix.member.1`...) in index order
+    values = []
+    for key, value in params.items():
+        if key.startswith(prefix + '.'):
+            values.append((int(key.rsplit('.', 1)[1]), value))
+
+    return [value for _, value in sorted(values)]
+
+
+def _describe_instances_xml(instances, next_token):
+    items = []
+    for instance in instances:
+        tags = ''.join('<item><key>%s</key><value>%s</value></item>' % (escape(key), escape(value))
+                       for key, value in instance.tags.items())
+        items.append(
+            '<item><reservationId>r-%(id)s</reservationId><ownerId>123456789012</ownerId><groupSet/><instancesSet>'
+            '<item><instanceId>%(id)s</instanceId><imageId>ami-00000001</imageId>'
+            '<instanceState><code>16</code><name>%(state)s</name></instanceState>'
+            '<dnsName>%(dns)s</dnsName><instanceType>%(type)s</instanceType>'
+            '<placement><availabilityZone>%(az)s</availabilityZone></placement>'
+            '<privateIpAddress>%(private_ip)s</privateIpAddress><ipAddress>%(ip)s</ipAddress>'
+            '<tagSet>%(tags)s</tagSet></item></instancesSet></item>' % {
+                'id': instance.id, 'state': instance.state, 'dns': instance.public_dns_name,
+                'type': instance.instance_type, 'az': instance.placement,
+                'private_ip': instance.private_ip_address, 'ip': instance.ip_address, 'tags': tags})
+
+    return ('<DescribeInstancesResponse xmlns="http://ec2.amazonaws.com/doc/2014-10-01/">'
+            '<requestId>fake</requestId><reservationSet>%s</reservationSet>%s</DescribeInstancesResponse>' %
+            (''.join(items), '<nextToken>%s</nextToken>' % next_token if next_token else ''))
+
+
+class FakeAWS(object):
+    """
+    Synthetic fleet of `size` running instances, all members of autoscaling group `AUTOSCALING_GROUP_NAME`, which is
+    the `LOGICAL_RESOURCE_ID` resource of Cloudformation stack `STACK_NAME`
+    """
+
+    def __init__(self, size, latency=0.0):
+        self.latency = latency
+        self.instances = [FakeInstance(index) for index in range(size)]
+        self.calls = Counter()
+        self._server = None
+
+    def describe_instances(self, params):
+        filters = {}
+        index = 1
+        while 'Filter.%d.Name' % index in params:
+            values = _indexed_params(params, 'Filter.%d.Value' % index)
+            filters[params['Filter.%d.Name' % index]] = _split_values(values)
+            index += 1
+
+        instance_ids = _indexed_params(params, 'InstanceId')
+        if instance_ids:
+            filters['instance-id'] = _split_values(instance_ids)
+
+        instances = [instance for instance in self.instances if _matches(instance, filters)]
+
+        offset = int(params.get('NextToken', 0))
+        if 'MaxResults' not in params:
+            return _describe_instances_xml(instances, None)
+
+        end = offset + int(params['MaxResults'])
+        return _describe_instances_xml(instances[offset:end], end if end < len(instances) else None)
+
+    def describe_autoscaling_groups(self, params):
+        names = _indexed_params(params, 'AutoScalingGroupNames.member')
+        groups = ''
+        if AUTOSCALING_GROUP_NAME in names:
+            members = ''.join(
+                '<member><InstanceId>%s</InstanceId><AvailabilityZone>%s</AvailabilityZone>'
+                '<LifecycleState>InService</LifecycleState><HealthStatus>Healthy</HealthStatus>'
+                '<LaunchConfigurationName>bench-lc</LaunchConfigurationName></member>' %
+                (instance.id, instance.placement) for instance in self.instances)
+            groups = ('<member><AutoScalingGroupName>%s</AutoScalingGroupName><Instances>%s</Instances>'
+                      '<MinSize>0</MinSize><MaxSize>%d</MaxSize><DesiredCapacity>%d</DesiredCapacity></member>' %
+                      (AUTOSCALING_GROUP_NAME, members, len(self.instances), len(self.instances)))
+
+        return ('<DescribeAutoScalingGroupsResponse xmlns="http://autoscaling.amazonaws.com/doc/2011-01-01/">'
+                '<DescribeAutoScalingGroupsResult><AutoScalingGroups>%s</AutoScalingGroups>'
+                '</DescribeAutoScalingGroupsResult></DescribeAutoScalingGroupsResponse>' % groups)
+
+    @staticmethod
+    def list_stack_resources(params):
+        return ('<ListStackResourcesResponse xmlns="http://cloudformation.amazonaws.com/doc/2010-05-15/">'
+                '<ListStackResourcesResult><StackResourceSummaries><member>'
+                '<LogicalResourceId>%s</LogicalResourceId><PhysicalResourceId>%s</PhysicalResourceId>'
+                '<ResourceType>AWS::AutoScaling::AutoScalingGroup</ResourceType>'
+                '<ResourceStatus>CREATE_COMPLETE</ResourceStatus></member></StackResourceSummaries>'
+                '</ListStackResourcesResult></ListStackResourcesResponse>' %
+                (LOGICAL_RESOURCE_ID, AUTOSCALING_GROUP_NAME))
+
+    def handle(self, params):
+        action = params.get('Action')
+        self.calls[action] += 1
+        time.sleep(self.latency)
+
+        if action == 'DescribeInstances':
+            return self.describe_instances(params)
+        if action == 'DescribeAutoScalingGroups':
+            return self.describe_autoscaling_groups(params)
+        if action == 'ListStackResources':
+            return self.list_stack_resources(params)
+
+        raise ValueError('Unsupported action: %s' % action)
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self, body):
+                params = dict(urlparse.parse_qsl(urlparse.urlparse(self.path).query))
+                params.update(urlparse.parse_qsl(body))
+
+                try:
+                    status, response = 200, fake.handle(params)
+                except ValueError as e:
+                    status, response = 400, '<Response><Errors><Error><Code>FakeAWS</Code><Message>%s</Message>' \
+                                            '</Error></Errors></Response>' % escape(str(e))
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/xml')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def do_GET(self):
+                self._respond('')
+
+            def do_POST(self):
+                self._respond(self.rfile.read(int(self.headers.getheader('Content-Length', 0))))
+
+            def log_message(self, *args):
+                pass
+
+        class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+            daemon_threads = True
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        return self._server.server_address[1]
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def connect(self):
+        """
+        Point fabric_aws' connection pool for `REGION` to this endpoint
+        """
+
+        port = self._server.server_address[1]
+        credentials = {'aws_access_key_id': 'fake', 'aws_secret_access_key': 'fake', 'is_secure': False,
+                       'port': port}
+
+        pool.register('ec2', REGION, boto.ec2.connection.EC2Connection(
+            region=RegionInfo(name=REGION, endpoint='127.0.0.1'), **credentials))
+        pool.register('autoscale', REGION, boto.ec2.autoscale.AutoScaleConnection(
+            region=RegionInfo(name=REGION, endpoint='127.0.0.1'), **credentials))
+        pool.register('cloudformation', REGION, boto.cloudformation.connection.CloudFormationConnection(
+            region=RegionInfo(name=REGION, endpoint='127.0.0.1'), **credentials))
@@ -0,0 +1,134 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+"""
+Host resolution benchmark
+
+Runs the fabric_aws host generators against a local fake AWS endpoint (see `fake_aws`) for growing synthetic fleets
+and reports wall time, AWS calls and peak memory of every scenario. Each scenario runs in a fresh process, so caches
+and memory peaks don't leak from one scenario to the next.
+
+    python benchmarks/resolution.py --sizes 10,1000,50000 --latency 0.05
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fabric_aws import autoscaling_group_generator, cloudformation_autoscaling_group_generator, ec2_generator
+from fake_aws import FakeAWS, REGION, AUTOSCALING_GROUP_NAME, STACK_NAME, LOGICAL_RESOURCE_ID
+
+SCENARIOS = [
+    ('ec2', lambda: ec2_generator(REGION, filters={'tag:Role': 'bench'})),
+    ('ec2_paginated', lambda: ec2_generator(REGION, filters={'tag:Role': 'bench'}, page_size=1000)),
+    ('autoscaling_group', lambda: autoscaling_group_generator(REGION, AUTOSCALING_GROUP_NAME)),
+    ('autoscaling_group_tags', lambda: autoscaling_group_generator(REGION, AUTOSCALING_GROUP_NAME,
+                                                                   strategy='tags')),
+    ('cloudformation_autoscaling_group', lambda: cloudformation_autoscaling_group_generator(REGION, STACK_NAME,
+                                                                                           LOGICAL_RESOURCE_ID)),
+]
+
+
+def _run_scenario(fake, scenario, results):
+    fake.connect()
+
+    start_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    hosts = len(list(scenario()))
+    wall_time = time.time() - start
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_memory
+
+    results.put((wall_time, hosts, peak_memory))
+
+
+def run(sizes, latency, scenario_names=None):
+    """
+    :return: One result dict per (size, scenario)
+    :rtype: list[dict]
+    """
+
+    rows = []
+    for size in sizes:
+        fake = FakeAWS(size, latency)
+        fake.start()
+
+        try:
+            for name, scenario in SCENARIOS:
+                if scenario_names and name not in scenario_names:
+                    continue
+
+                fake.calls.clear()
+                results = multiprocessing.Queue()
+                process = multiprocessing.Process(target=_run_scenario, args=(fake, scenario, results))
+                process.start()
+                wall_time, hosts, peak_memory = results.get()
+                process.join()
+
+                rows.append({'scenario': name, 'size': size, 'hosts': hosts, 'wall_time': wall_time,
+                             'calls': dict(fake.calls), 'peak_memory_kb': peak_memory})
+        finally:
+            fake.stop()
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,10000,50000',
+                        help='comma separated fleet sizes (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds added to every AWS call (default: %(default)s)')
+    parser.add_argument('--scenarios', default=None,
+                        help='comma separated scenarios to run (default: all of %s)' %
+                             ', '.join(name for name, _ in SCENARIOS))
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    rows = run([int(size) for size in args.sizes.split(',')], args.latency,
+               args.scenarios.split(',') if args.scenarios else None)
+
+    if args.json:
+        print json.dumps(rows, indent=2)
+        return
+
+    print '%-34s %8s %8s %10s %6s %12s' % ('scenario', 'size', 'hosts', 'wall (s)', 'calls', 'memory (KB)')
+    for row in rows:
+        print '%-34s %8d %8d %10.3f %6d %12d' % (row['scenario'], row['size'], row['hosts'], row['wall_time'],
+                                                sum(row['calls'].values()), row['peak_memory_kb'])
+
+
+if __name__ == '__main__':
+    main()
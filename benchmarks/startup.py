@@ -0,0 +1,143 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+"""
+Startup benchmark
+
+Times `fab --list` on a generated fabfile with `--tasks` fabric_aws decorated tasks, next to the same fabfile without
+the decorators, so the import and decorator-definition cost of fabric_aws can be told apart from fabric's own.
+Nothing is resolved, so no AWS endpoint (real or fake) is needed.
+
+    python benchmarks/startup.py --tasks 100 --repeat 10
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# `fab` entry point, run with the current interpreter so the benchmark doesn't depend on the PATH
+FAB = 'import sys; from fabric.main import main; sys.argv[0] = "fab"; main()'
+
+DECORATORS = [
+    "@ec2('us-east-1', filters={'tag:Name': 'web-%(index)d'})",
+    "@autoscaling_group('us-east-1', 'asg-%(index)d')",
+    "@cloudformation_autoscaling_group('us-east-1', 'stack-%(index)d', 'AutoScalingGroup')",
+]
+
+
+def fabfile(tasks, decorated):
+    """
+    :return: Source of a fabfile defining `tasks` tasks, decorated with fabric_aws decorators if `decorated`
+    :rtype: str
+    """
+
+    lines = ['from fabric.api import run, task']
+    if decorated:
+        lines.append('from fabric_aws import autoscaling_group, cloudformation_autoscaling_group, ec2')
+
+    for index in range(tasks):
+        lines.append('')
+        if decorated:
+            lines.append(DECORATORS[index % len(DECORATORS)] % {'index': index})
+        lines.extend(['@task', 'def uptime_%d():' % index, "    run('uptime')"])
+
+    return '\n'.join(lines) + '\n'
+
+
+def time_fab_list(path, repeat):
+    """
+    :return: Wall time of each `fab --list` run
+    :rtype: list[float]
+    """
+
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+
+    timings = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(repeat):
+            start = time.time()
+            subprocess.check_call([sys.executable, '-c', FAB, '-f', path, '--list'], env=environment,
+                                  stdout=devnull, stderr=devnull)
+            timings.append(time.time() - start)
+
+    return timings
+
+
+def run(tasks, repeat):
+    """
+    :return: One result dict per fabfile
+    :rtype: list[dict]
+    """
+
+    directory = tempfile.mkdtemp()
+    rows = []
+
+    try:
+        for name, decorated in [('fabric', False), ('fabric_aws', True)]:
+            path = os.path.join(directory, 'fabfile_%s.py' % name)
+            with open(path, 'w') as f:
+                f.write(fabfile(tasks, decorated))
+
+            timings = sorted(time_fab_list(path, repeat))
+            rows.append({'fabfile': name, 'tasks': tasks, 'min': timings[0], 'median': timings[len(timings) // 2],
+                         'max': timings[-1]})
+    finally:
+        shutil.rmtree(directory)
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=100, help='tasks per fabfile (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=10, help='runs per fabfile (default: %(default)s)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    rows = run(args.tasks, args.repeat)
+
+    if args.json:
+        print json.dumps(rows, indent=2)
+        return
+
+    print '%-12s %6s %8s %10s %8s' % ('fabfile', 'tasks', 'min (s)', 'median (s)', 'max (s)')
+    for row in rows:
+        print '%-12s %6d %8.3f %10.3f %8.3f' % (row['fabfile'], row['tasks'], row['min'], row['median'], row['max'])
+
+
+if __name__ == '__main__':
+    main()
@@ -28,19 +28,41 @@
 
 from __future__ import absolute_import
 
-# noinspection PyProtectedMember
-from fabric.decorators import wraps, _wrap_as_new
-import boto.cloudformation
-import boto.ec2
-import boto.ec2.autoscale
-
+import time
 
-def _list_annotating_decorator(attribute, *values):
+# noinspection PyProtectedMember
+from fabric.decorators import wraps, runs_once, _wrap_as_new
+from fabric.state import env
+from fabric_aws.cache import cached_resolution, configure_cache, get_cache, DEFAULT_CACHE_PATH
+from fabric_aws.api import call
+from fabric_aws.connections import configure_connections, get_connection, reset_connections
+from fabric_aws.batch import resolver as batch_resolver
+from fabric_aws.fanout import fan_out, PartialResolutionError
+from fabric_aws.instrumentation import record_resolution
+from fabric_aws.records import HostRecord
+from fabric_aws.stacks import stack_index
+from fabric_aws.autoscaling import autoscaling_group_filters, choose_strategy
+from fabric_aws.engine import resolver as async_resolver, iter_result
+from fabric_aws.inventory import get_inventory, use_inventory, export_inventory
+from fabric_aws.filters import instance_sets
+from fabric_aws.tracking import autoscaling_group_tracker, instance_ids_tracker
+from fabric_aws.health import autoscaling_group_healthy_members, healthy_instances
+from fabric_aws.rolling import plan_waves, roll
+from fabric_aws.prewarm import get_prewarmer
+from fabric_aws.addressing import AddressResolver, instance_addresses
+
+
+def _list_annotating_decorator(attribute, *values, **kwargs):
     # based on fabric.decorators._list_annotating_decorator
-    # it is exactcly the same as the original, except the fact that it generates the list lazily
+    # it is exactcly the same as the original, except the fact that it generates the list lazily, and that
+    # `before_run` (if given) is called before the task runs on each host
+    before_run = kwargs.pop('before_run', None)
+
     def attach_list(func):
         @wraps(func)
         def inner_decorator(*args, **kwargs):
+            if before_run is not None:
+                before_run()
             return func(*args, **kwargs)  # pragma: no cover
 
         _values = values
@@ -56,6 +78,44 @@ def _list_annotating_decorator(attribute, *values):
     return attach_list
 
 
+# options batched resolutions accept besides the region, see `fabric_aws.batch.BatchResolver`
+BATCH_OPTIONS = {
+    'ec2': ('region', 'instance_ids', 'filters', 'hostname_attribute'),
+    'autoscaling_group': ('region', 'autoscaling_group_name', 'hostname_attribute', 'strategy'),
+    'cloudformation_autoscaling_group': ('region', 'cfn_stack_name', 'asg_resource_name', 'hostname_attribute',
+                                         'strategy'),
+}
+
+
+def _batch_options(decorator, kwargs):
+    # options left to their default (`None`/`False`) are dropped, any other option can't be batched
+    unsupported = sorted(name for name, value in kwargs.items()
+                         if name not in BATCH_OPTIONS[decorator] and value not in (None, False))
+    if unsupported:
+        raise ValueError('%s(batch=True) can\'t be combined with %s' % (decorator, ', '.join(unsupported)))
+
+    return dict((name, value) for name, value in kwargs.items() if name in BATCH_OPTIONS[decorator])
+
+
+def _prewarmed(hosts, prewarm):
+    # opens SSH connections to the hosts in the background as fabric reads them, see `fabric_aws.prewarm`
+    if prewarm:
+        hosts = get_prewarmer().prewarm(hosts)
+
+    for host in hosts:
+        yield host
+
+
+def _advance_prewarmer():
+    # the task is about to run on `env.host_string`, see `Prewarmer.advance`
+    get_prewarmer().advance(env.host_string)
+
+
+def _hosts_decorator(hosts, prewarm):
+    return _list_annotating_decorator('hosts', _prewarmed(hosts, prewarm),
+                                      before_run=_advance_prewarmer if prewarm else None)
+
+
 def cloudformation_logical_to_physical(region, cfn_stack_name, logical_resource_id):
     """
     Convert cloudformation logical resource name to physical resource name
@@ -70,8 +130,10 @@ def cloudformation_logical_to_physical(region, cfn_stack_name, logical_resource_
     :rtype: str
     """
 
-    cfn = boto.cloudformation.connect_to_region(region)
-    resource = cfn.describe_stack_resource(cfn_stack_name, logical_resource_id)
+    if get_inventory() is not None:
+        return stack_index.logical_to_physical(region, cfn_stack_name, logical_resource_id)
+
+    resource = call('cloudformation', region, 'describe_stack_resource', cfn_stack_name, logical_resource_id)
 
     return resource.get('DescribeStackResourceResponse', {}). \
         get('DescribeStackResourceResult', {}). \
@@ -91,14 +153,19 @@ def autoscaling_group_instance_ids(region, autoscaling_group_name):
     :rtype: list[str]
     """
 
-    autoscale_connection = boto.ec2.autoscale.connect_to_region(region)
-    asg = autoscale_connection.get_all_groups(names=[autoscaling_group_name])[0]
+    inventory = get_inventory()
+    if inventory is not None:
+        return inventory.autoscaling_group_instance_ids(region, autoscaling_group_name)
+
+    asg = call('autoscale', region, 'get_all_groups', names=[autoscaling_group_name])[0]
 
     return [instance.instance_id for instance in asg.instances]
 
 
 def cloudformation_autoscaling_group_generator(region, cfn_stack_name, asg_resource_name,
-                                               hostname_attribute='public_dns_name'):
+                                               hostname_attribute='public_dns_name', cache_ttl=None,
+                                               force_refresh=False, strategy='groups', incremental=False,
+                                               healthy=False):
     """
     Hosts generator for running a task on all instances inside an autoscaling group that is a part of a CFN stack
     Please decorate your functions with `cloudformation_autoscaling_group`
@@ -107,24 +174,43 @@ def cloudformation_autoscaling_group_generator(region, cfn_stack_name, asg_resou
     :type region: str
     :param cfn_stack_name: Cloudformation stack name
     :type cfn_stack_name: str
-    :param asg_resource_name: Autoscaling group logical resource name inside `cfn_stack_name`
+    :param asg_resource_name: Autoscaling group logical resource name inside `cfn_stack_name`, resources of nested
+                              stacks are separated with dots (e.g. `NestedStack.AutoScalingGroup`)
     :type asg_resource_name: str
     :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
-    :type hostname_attribute: str
+    :type hostname_attribute: str | AddressResolver
+    :param cache_ttl: Seconds to cache the resolved hosts for, `None` disables caching
+    :type cache_ttl: float
+    :param force_refresh: Ignore cached hosts and resolve them again
+    :type force_refresh: bool
+    :param strategy: How to resolve the autoscaling group's instances, see `fabric_aws.autoscaling.choose_strategy`
+    :type strategy: str
+    :param incremental: Keep the group's instances across resolutions and only describe the instances that joined it
+                        since, see `fabric_aws.tracking.AutoscalingGroupTracker`
+    :type incremental: bool
+    :param healthy: Only keep instances that are in service and healthy in the group, running, passing their status
+                    checks and in service on the group's load balancers, see `fabric_aws.health`
+    :type healthy: bool
     :return: Generates a list of hosts
     :rtype: list[str]
     """
 
-    physical_resource_id = cloudformation_logical_to_physical(region, cfn_stack_name, asg_resource_name)
+    def resolve():
+        physical_resource_id = stack_index.logical_to_physical(region, cfn_stack_name, asg_resource_name)
+        return list(autoscaling_group_generator(region, physical_resource_id, hostname_attribute, strategy=strategy,
+                                                incremental=incremental, healthy=healthy))
 
-    hosts = autoscaling_group_generator(region, physical_resource_id, hostname_attribute)
+    hosts = cached_resolution('cloudformation_autoscaling_group', region, (cfn_stack_name, asg_resource_name),
+                              {'strategy': strategy, 'healthy': healthy}, hostname_attribute, resolve, cache_ttl,
+                              force_refresh)
 
     # this will make our function lazy
     for host in hosts:
         yield host
 
 
-def autoscaling_group_generator(region, autoscaling_group_name, hostname_attribute='public_dns_name'):
+def autoscaling_group_generator(region, autoscaling_group_name, hostname_attribute='public_dns_name', cache_ttl=None,
+                                force_refresh=False, strategy='groups', incremental=False, healthy=False):
     """
     Hosts generator for running a task on all instances inside an autoscaling group
     Please decorate your functions with `autoscaling_group`
@@ -134,22 +220,105 @@ def autoscaling_group_generator(region, autoscaling_group_name, hostname_attribu
     :param autoscaling_group_name: Autoscaling group logical resource name inside `cfn_stack_name`
     :type autoscaling_group_name: str
     :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
-    :type hostname_attribute: str
+    :type hostname_attribute: str | AddressResolver
+    :param cache_ttl: Seconds to cache the resolved hosts for, `None` disables caching
+    :type cache_ttl: float
+    :param force_refresh: Ignore cached hosts and resolve them again
+    :type force_refresh: bool
+    :param strategy: How to resolve the autoscaling group's instances, see `fabric_aws.autoscaling.choose_strategy`
+    :type strategy: str
+    :param incremental: Keep the group's instances across resolutions and only describe the instances that joined it
+                        since, see `fabric_aws.tracking.AutoscalingGroupTracker`
+    :type incremental: bool
+    :param healthy: Only keep instances that are in service and healthy in the group, running, passing their status
+                    checks and in service on the group's load balancers, see `fabric_aws.health`
+    :type healthy: bool
     :return: Generates a list of hosts
     :rtype: list[str]
     """
 
-    instance_ids = autoscaling_group_instance_ids(region, autoscaling_group_name)
-
-    hosts = ec2_generator(region,
-                          hostname_attribute=hostname_attribute,
-                          instance_ids=instance_ids)
+    def resolve():
+        if incremental and get_inventory() is None:
+            instances = autoscaling_group_tracker(region, autoscaling_group_name).instances()
+            if healthy:
+                # lifecycle and health states change without a scaling activity, they are read on every resolution
+                instance_ids, load_balancers = autoscaling_group_healthy_members(region, autoscaling_group_name)
+                members = set(instance_ids)
+                instances = healthy_instances(region, [instance for instance in instances if instance.id in members],
+                                              load_balancers=load_balancers)
+            return instance_addresses(instances, hostname_attribute)
+
+        if healthy:
+            instance_ids, load_balancers = autoscaling_group_healthy_members(region, autoscaling_group_name)
+            if not instance_ids:
+                return []
+
+            return list(ec2_generator(region,
+                                      hostname_attribute=hostname_attribute,
+                                      instance_ids=instance_ids,
+                                      healthy=True,
+                                      load_balancers=load_balancers))
+
+        if choose_strategy(strategy, hostname_attribute) == 'tags':
+            return list(ec2_generator(region,
+                                      hostname_attribute=hostname_attribute,
+                                      filters=autoscaling_group_filters([autoscaling_group_name])))
+
+        instance_ids = autoscaling_group_instance_ids(region, autoscaling_group_name)
+        if hostname_attribute == 'id':
+            return instance_ids
+
+        if not instance_ids:
+            # an empty instance id list would match every instance in the region
+            return []
+
+        return list(ec2_generator(region,
+                                  hostname_attribute=hostname_attribute,
+                                  instance_ids=instance_ids))
+
+    hosts = cached_resolution('autoscaling_group', region, (autoscaling_group_name,),
+                              {'strategy': strategy, 'healthy': healthy},
+                              hostname_attribute, resolve, cache_ttl, force_refresh)
 
     # this will make our function lazy
     for host in hosts:
         yield host
 
 
+def _ec2_instance_pages(region, page_size, local_filters, *args, **kwargs):
+    # generates lists of `boto.ec2.instance.Instance`, one per response page, so callers can project each page and let
+    # go of the parsed response before the next page is requested
+    inventory = get_inventory()
+    if inventory is not None:
+        yield inventory.instances(region, *args, **kwargs)
+        return
+
+    if local_filters:
+        yield instance_sets.get(region).select(*args, **kwargs)
+        return
+
+    if page_size is None:
+        reservations = call('ec2', region, 'get_all_instances', *args, **kwargs)
+        instances = [instance for reservation in reservations for instance in reservation.instances]
+        del reservations
+
+        yield instances
+        return
+
+    next_token = None
+    while True:
+        reservations = call('ec2', region, 'get_all_reservations', *args, max_results=page_size,
+                            next_token=next_token, **kwargs)
+        next_token = reservations.next_token
+        instances = [instance for reservation in reservations for instance in reservation.instances]
+        del reservations
+
+        yield instances
+
+        if not next_token:
+            break
+
+
 def ec2_generator(region, *args, **kwargs):
     """
     Hosts generator for running a task on all instances matching `*args` and `**kwargs`
@@ -157,8 +326,26 @@ def ec2_generator(region, *args, **kwargs):
 
     :param region: AWS region
     :type region: str
-    :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
-    :type hostname_attribute: str
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection, or a
+                               `fabric_aws.addressing.AddressResolver` picking the address of each instance
+    :type hostname_attribute: str | AddressResolver
+    :param cache_ttl: Seconds to cache the resolved hosts for, `None` disables caching
+    :type cache_ttl: float
+    :param force_refresh: Ignore cached hosts and resolve them again
+    :type force_refresh: bool
+    :param page_size: Request instances in pages of `page_size` (5-1000, can't be combined with instance ids) and
+                      generate the hosts of each page as soon as it arrives. `None` requests all instances at once
+    :type page_size: int
+    :param local_filters: Fetch every instance of the region once per process and evaluate `instance_ids` and `filters`
+                          locally, see `fabric_aws.filters.InstanceSetCache`
+    :type local_filters: bool
+    :param incremental: Keep the instances of `instance_ids` across resolutions and only describe the instances whose
+                        state changed since, see `fabric_aws.tracking.InstanceIdsTracker`
+    :type incremental: bool
+    :param healthy: Only keep running instances passing their status checks, see `fabric_aws.health`
+    :type healthy: bool
+    :param load_balancers: With `healthy`, also drop instances out of service on these classic load balancers
+    :type load_balancers: list[str]
     :param *args: pass-through arguments to the underlying boto.ec2.get_all_instances() function
     :param *kwargs: pass-through keyword arguments to the underlying boto.ec2.get_all_instances() function
     :return: Generates a list of hosts
@@ -166,13 +353,223 @@ def ec2_generator(region, *args, **kwargs):
     """
 
     hostname_attribute = kwargs.pop('hostname_attribute', 'public_dns_name')
-    ec2_connection = boto.ec2.connect_to_region(region)
+    cache_ttl = kwargs.pop('cache_ttl', None)
+    force_refresh = kwargs.pop('force_refresh', False)
+    page_size = kwargs.pop('page_size', None)
+    local_filters = kwargs.pop('local_filters', False)
+    incremental = kwargs.pop('incremental', False)
+    healthy = kwargs.pop('healthy', False)
+    load_balancers = kwargs.pop('load_balancers', None)
+
+    def select(instances):
+        if healthy:
+            instances = healthy_instances(region, instances, load_balancers=load_balancers)
+        return instance_addresses(instances, hostname_attribute)
+
+    def paginated_hosts():
+        for instances in _ec2_instance_pages(region, page_size, local_filters, *args, **kwargs):
+            for host in select(instances):
+                yield host
+
+    def streamed_hosts():
+        # recorded once the last page has been generated
+        start = time.time()
+        count = 0
+        for host in paginated_hosts():
+            count += 1
+            yield host
+
+        record_resolution('ec2', region, args, count, time.time() - start)
+
+    def tracked_hosts():
+        instance_ids = args[0] if args else kwargs.get('instance_ids')
+        if not instance_ids or len(args) > 1 or set(kwargs) - {'instance_ids'}:
+            raise ValueError('Incremental resolution only supports instance ids')
+
+        return select(instance_ids_tracker(region, instance_ids).instances())
+
+    # health settings aren't passed to boto but change the result
+    cache_kwargs = dict(kwargs, healthy=True, load_balancers=load_balancers) if healthy else kwargs
+
+    if incremental and get_inventory() is None:
+        hosts = cached_resolution('ec2', region, args, cache_kwargs, hostname_attribute, tracked_hosts, cache_ttl,
+                                  force_refresh)
+    elif page_size is not None and cache_ttl is None:
+        # later pages are only requested once fabric consumed the hosts of the previous ones
+        hosts = streamed_hosts()
+    else:
+        hosts = cached_resolution('ec2', region, args, cache_kwargs, hostname_attribute,
+                                  lambda: list(paginated_hosts()), cache_ttl, force_refresh)
+
+    # this will make our function lazy
+    for host in hosts:
+        yield host
+
+
+def ec2_record_generator(region, *args, **kwargs):
+    """
+    `HostRecord` generator for all instances matching `*args` and `**kwargs`
+    `*args` and `**kwargs` are passed-through to the underlying boto.ec2.get_all_instances() function
+
+    Each response page is projected into records and freed before the records are generated
+
+    :param region: AWS region
+    :type region: str
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as the records' `address`
+    :type hostname_attribute: str | AddressResolver
+    :param fields: `HostRecord` fields to fill, `None` fills every field
+    :type fields: list[str]
+    :param tags: Tag names to keep in the records, `None` keeps every tag
+    :type tags: list[str]
+    :param page_size: Request instances in pages of `page_size`, see `ec2_generator`
+    :type page_size: int
+    :param local_filters: Evaluate the filters locally, see `ec2_generator`
+    :type local_filters: bool
+    :param *args: pass-through arguments to the underlying boto.ec2.get_all_instances() function
+    :param *kwargs: pass-through keyword arguments to the underlying boto.ec2.get_all_instances() function
+    :return: Generates a list of host records
+    :rtype: list[HostRecord]
+    """
+
+    hostname_attribute = kwargs.pop('hostname_attribute', 'public_dns_name')
+    fields = kwargs.pop('fields', None)
+    tags = kwargs.pop('tags', None)
+    page_size = kwargs.pop('page_size', None)
+    local_filters = kwargs.pop('local_filters', False)
+
+    for instances in _ec2_instance_pages(region, page_size, local_filters, *args, **kwargs):
+        records = [HostRecord.from_instance(instance, hostname_attribute, fields, tags) for instance in instances]
+        del instances
+
+        for record in records:
+            yield record
+
+
+def autoscaling_group_record_generator(region, autoscaling_group_name, hostname_attribute='public_dns_name',
+                                       fields=None, tags=None):
+    """
+    `HostRecord` generator for all instances inside an autoscaling group, see `ec2_record_generator`
+
+    :param region: AWS region
+    :type region: str
+    :param autoscaling_group_name: Autoscaling group name
+    :type autoscaling_group_name: str
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as the records' `address`
+    :type hostname_attribute: str | AddressResolver
+    :param fields: `HostRecord` fields to fill, `None` fills every field
+    :type fields: list[str]
+    :param tags: Tag names to keep in the records, `None` keeps every tag
+    :type tags: list[str]
+    :return: Generates a list of host records
+    :rtype: list[HostRecord]
+    """
+
+    instance_ids = autoscaling_group_instance_ids(region, autoscaling_group_name)
+
+    records = ec2_record_generator(region,
+                                   hostname_attribute=hostname_attribute,
+                                   fields=fields,
+                                   tags=tags,
+                                   instance_ids=instance_ids)
+
+    # this will make our function lazy
+    for record in records:
+        yield record
+
+
+def autoscaling_group_members(region, autoscaling_group_name, hostname_attribute='public_dns_name', healthy=False):
+    """
+    Return the instance id, availability zone and host of every instance inside an autoscaling group
+
+    :param region: AWS region
+    :type region: str
+    :param autoscaling_group_name: Autoscaling group name
+    :type autoscaling_group_name: str
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
+    :type hostname_attribute: str | AddressResolver
+    :param healthy: Only keep healthy instances, see `autoscaling_group_generator`
+    :type healthy: bool
+    :return: (instance id, availability zone, host) tuples
+    :rtype: list[tuple]
+    """
+
+    instance_ids = list(autoscaling_group_generator(region, autoscaling_group_name, 'id', healthy=healthy))
+    if not instance_ids:
+        return []
+
+    records = ec2_record_generator(region,
+                                   hostname_attribute=hostname_attribute,
+                                   fields=['instance_id', 'address', 'placement'],
+                                   instance_ids=instance_ids)
+
+    return [(record.instance_id, record.placement, record.address) for record in records]
+
 
-    reservations = ec2_connection.get_all_instances(*args, **kwargs)
+def ec2_multi_region_generator(regions, *args, **kwargs):
+    """
+    Hosts generator for running a task on all instances matching `*args` and `**kwargs` in several regions
+    Regions are resolved concurrently and the hosts are merged, see `ec2_generator`
+
+    :param regions: AWS regions
+    :type regions: list[str]
+    :param max_workers: Maximum number of regions resolved concurrently
+    :type max_workers: int
+    :param timeout: Seconds each region may take to resolve, `None` waits forever
+    :type timeout: float
+    :param fail_on_error: Raise `PartialResolutionError` when any region fails, instead of warning
+    :type fail_on_error: bool
+    :param *args: pass-through arguments to `ec2_generator`
+    :param *kwargs: pass-through keyword arguments to `ec2_generator`
+    :return: Generates a list of hosts
+    :rtype: list[str]
+    """
+
+    max_workers = kwargs.pop('max_workers', 8)
+    timeout = kwargs.pop('timeout', None)
+    fail_on_error = kwargs.pop('fail_on_error', False)
 
-    hosts = [getattr(instance, hostname_attribute)
-             for reservation in reservations
-             for instance in reservation.instances]
+    def job(region):
+        # ec2_generator pops its own keyword arguments, hand each region a copy
+        return lambda: list(ec2_generator(region, *args, **dict(kwargs)))
+
+    start = time.time()
+    hosts = fan_out([(region, job(region)) for region in regions], max_workers, timeout, fail_on_error)
+    record_resolution('ec2_multi_region', ','.join(regions), args, len(hosts), time.time() - start)
+
+    # this will make our function lazy
+    for host in hosts:
+        yield host
+
+
+def autoscaling_groups_generator(region, autoscaling_group_names, hostname_attribute='public_dns_name',
+                                 max_workers=8, timeout=None, fail_on_error=False, **kwargs):
+    """
+    Hosts generator for running a task on all instances inside several autoscaling groups
+    Autoscaling groups are resolved concurrently and the hosts are merged, see `autoscaling_group_generator`
+
+    :param region: AWS region
+    :type region: str
+    :param autoscaling_group_names: Autoscaling group names
+    :type autoscaling_group_names: list[str]
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
+    :type hostname_attribute: str | AddressResolver
+    :param max_workers: Maximum number of autoscaling groups resolved concurrently
+    :type max_workers: int
+    :param timeout: Seconds each autoscaling group may take to resolve, `None` waits forever
+    :type timeout: float
+    :param fail_on_error: Raise `PartialResolutionError` when any autoscaling group fails, instead of warning
+    :type fail_on_error: bool
+    :param **kwargs: pass-through keyword arguments to `autoscaling_group_generator`
+    :return: Generates a list of hosts
+    :rtype: list[str]
+    """
+
+    def job(autoscaling_group_name):
+        return lambda: list(autoscaling_group_generator(region, autoscaling_group_name, hostname_attribute, **kwargs))
+
+    start = time.time()
+    hosts = fan_out([(name, job(name)) for name in autoscaling_group_names], max_workers, timeout, fail_on_error)
+    record_resolution('autoscaling_groups', region, autoscaling_group_names, len(hosts), time.time() - start)
 
     # this will make our function lazy
     for host in hosts:
@@ -188,9 +585,29 @@ def ec2(*args, **kwargs):
     :param region: AWS region
     :type region: str
     :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
+    :param cache_ttl: Seconds to cache the resolved hosts for, `None` disables caching
+    :param force_refresh: Ignore cached hosts and resolve them again
+    :param page_size: Request instances in pages of `page_size` and generate the hosts of each page as it arrives
+    :param local_filters: Evaluate the filters locally against every instance of the region, fetched once per process
+    :param incremental: Only describe the instances of `instance_ids` whose state changed since the last resolution
+    :param healthy: Only keep running instances passing their status checks (and in service on `load_balancers`)
+    :param batch: Resolve together with every other batched task in the same region, see `fabric_aws.batch`. Can't be
+                  combined with caching, pagination, incremental, health or prefetch options
+    :param prefetch: Start resolving in the background right away, see `fabric_aws.engine`
+    :param prewarm: Open SSH connections to the hosts in the background once they are resolved, see `fabric_aws.prewarm`
     """
 
-    return _list_annotating_decorator('hosts', ec2_generator(*args, **kwargs))
+    prewarm = kwargs.pop('prewarm', False)
+
+    if kwargs.pop('batch', False):
+        ticket = batch_resolver.submit_ec2(*args, **_batch_options('ec2', kwargs))
+        return _hosts_decorator(ticket.hosts(), prewarm)
+
+    if kwargs.pop('prefetch', False):
+        future = async_resolver.ec2(*args, **kwargs)
+        return _hosts_decorator(iter_result(future), prewarm)
+
+    return _hosts_decorator(ec2_generator(*args, **kwargs), prewarm)
 
 @wraps(autoscaling_group_generator)
 def autoscaling_group(*args, **kwargs):
@@ -202,10 +619,40 @@ def autoscaling_group(*args, **kwargs):
     :param autoscaling_group_name: Autoscaling group logical resource name inside `cfn_stack_name`
     :type autoscaling_group_name: str
     :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
-    :type hostname_attribute: str
+    :type hostname_attribute: str | AddressResolver
+    :param cache_ttl: Seconds to cache the resolved hosts for, `None` disables caching
+    :type cache_ttl: float
+    :param force_refresh: Ignore cached hosts and resolve them again
+    :type force_refresh: bool
+    :param strategy: How to resolve the autoscaling group's instances, see `fabric_aws.autoscaling.choose_strategy`
+    :type strategy: str
+    :param incremental: Keep the group's instances across resolutions and only describe the instances that joined it
+                        since, see `fabric_aws.tracking.AutoscalingGroupTracker`
+    :type incremental: bool
+    :param healthy: Only keep instances that are in service and healthy in the group, running, passing their status
+                    checks and in service on the group's load balancers, see `fabric_aws.health`
+    :type healthy: bool
+    :param batch: Resolve together with every other batched task in the same region, see `fabric_aws.batch`. Can't be
+                  combined with caching, pagination, incremental, health or prefetch options
+    :type batch: bool
+    :param prefetch: Start resolving in the background right away, see `fabric_aws.engine`
+    :type prefetch: bool
+    :param prewarm: Open SSH connections to the hosts in the background once they are resolved, see
+                    `fabric_aws.prewarm`
+    :type prewarm: bool
     """
 
-    return _list_annotating_decorator('hosts', autoscaling_group_generator(*args, **kwargs))
+    prewarm = kwargs.pop('prewarm', False)
+
+    if kwargs.pop('batch', False):
+        ticket = batch_resolver.submit_autoscaling_group(*args, **_batch_options('autoscaling_group', kwargs))
+        return _hosts_decorator(ticket.hosts(), prewarm)
+
+    if kwargs.pop('prefetch', False):
+        future = async_resolver.autoscaling_group(*args, **kwargs)
+        return _hosts_decorator(iter_result(future), prewarm)
+
+    return _hosts_decorator(autoscaling_group_generator(*args, **kwargs), prewarm)
 
 
 @wraps(cloudformation_autoscaling_group_generator)
@@ -220,10 +667,128 @@ def cloudformation_autoscaling_group(*args, **kwargs):
     :param asg_resource_name: Autoscaling group logical resource name inside `cfn_stack_name`
     :type asg_group_name: str
     :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
-    :type hostname_attribute: str
+    :type hostname_attribute: str | AddressResolver
+    :param cache_ttl: Seconds to cache the resolved hosts for, `None` disables caching
+    :type cache_ttl: float
+    :param force_refresh: Ignore cached hosts and resolve them again
+    :type force_refresh: bool
+    :param strategy: How to resolve the autoscaling group's instances, see `fabric_aws.autoscaling.choose_strategy`
+    :type strategy: str
+    :param incremental: Keep the group's instances across resolutions and only describe the instances that joined it
+                        since, see `fabric_aws.tracking.AutoscalingGroupTracker`
+    :type incremental: bool
+    :param healthy: Only keep instances that are in service and healthy in the group, running, passing their status
+                    checks and in service on the group's load balancers, see `fabric_aws.health`
+    :type healthy: bool
+    :param batch: Resolve together with every other batched task in the same region, see `fabric_aws.batch`. Can't be
+                  combined with caching, pagination, incremental, health or prefetch options
+    :type batch: bool
+    :param prefetch: Start resolving in the background right away, see `fabric_aws.engine`
+    :type prefetch: bool
+    :param prewarm: Open SSH connections to the hosts in the background once they are resolved, see
+                    `fabric_aws.prewarm`
+    :type prewarm: bool
+    """
+
+    prewarm = kwargs.pop('prewarm', False)
+
+    if kwargs.pop('batch', False):
+        options = _batch_options('cloudformation_autoscaling_group', kwargs)
+        ticket = batch_resolver.submit_cloudformation_autoscaling_group(*args, **options)
+        return _hosts_decorator(ticket.hosts(), prewarm)
+
+    if kwargs.pop('prefetch', False):
+        future = async_resolver.cloudformation_autoscaling_group(*args, **kwargs)
+        return _hosts_decorator(iter_result(future), prewarm)
+
+    hosts = cloudformation_autoscaling_group_generator(*args, **kwargs)
+    return _hosts_decorator(hosts, prewarm)
+
+
+@wraps(ec2_multi_region_generator)
+def ec2_multi_region(*args, **kwargs):
+    """
+    Fabric decorator for running a task on all instances returned by `boto.ec2.get_all_instances()` in several regions
+
+    :param regions: AWS regions
+    :type regions: list[str]
+    :param max_workers: Maximum number of regions resolved concurrently
+    :type max_workers: int
+    :param timeout: Seconds each region may take to resolve, `None` waits forever
+    :type timeout: float
+    :param fail_on_error: Raise `PartialResolutionError` when any region fails, instead of warning
+    :type fail_on_error: bool
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
+    :type hostname_attribute: str | AddressResolver
     """
 
-    return _list_annotating_decorator('hosts', cloudformation_autoscaling_group_generator(*args, **kwargs))
+    return _list_annotating_decorator('hosts', ec2_multi_region_generator(*args, **kwargs))
+
+
+@wraps(autoscaling_groups_generator)
+def autoscaling_groups(*args, **kwargs):
+    """
+    Fabric decorator for running a task on all instances inside several autoscaling groups
+
+    :param region: AWS region
+    :type region: str
+    :param autoscaling_group_names: Autoscaling group names
+    :type autoscaling_group_names: list[str]
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
+    :type hostname_attribute: str | AddressResolver
+    :param max_workers: Maximum number of autoscaling groups resolved concurrently
+    :type max_workers: int
+    :param timeout: Seconds each autoscaling group may take to resolve, `None` waits forever
+    :type timeout: float
+    :param fail_on_error: Raise `PartialResolutionError` when any autoscaling group fails, instead of warning
+    :type fail_on_error: bool
+    """
+
+    return _list_annotating_decorator('hosts', autoscaling_groups_generator(*args, **kwargs))
+
+
+
+def rolling_autoscaling_group(region, autoscaling_group_name, batch_size='25%', hostname_attribute='public_dns_name',
+                              healthy=False, **kwargs):
+    """
+    Fabric decorator for running a task on all instances inside an autoscaling group in waves: the instances are
+    resolved when the task runs, split into waves of `batch_size` spread across availability zones, and each wave runs
+    in parallel once the previous one is done, see `fabric_aws.rolling.roll`
+
+    :param region: AWS region
+    :type region: str
+    :param autoscaling_group_name: Autoscaling group name
+    :type autoscaling_group_name: str
+    :param batch_size: Hosts per wave, or a percentage of the hosts (e.g. `'25%'`)
+    :type batch_size: int | str
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname for fabric connection
+    :type hostname_attribute: str | AddressResolver
+    :param healthy: Only roll over healthy instances, see `autoscaling_group_generator`
+    :type healthy: bool
+    :param pool_size: Hosts of a wave running the task at once
+    :type pool_size: int
+    :param health_gate: Called with the hosts of a wave and their results, aborts the rollout unless it returns True
+    :type health_gate: callable
+    :param in_service_timeout: Seconds to wait for a wave's instances to be InService and Healthy before the next wave
+    :type in_service_timeout: float
+    :param detach: Detach a wave's instances from the group while the task runs on them
+    :type detach: bool
+    :param suspend_processes: Autoscaling processes to suspend while a wave runs, `True` suspends every process
+    :type suspend_processes: list[str] | bool
+    """
+
+    def attach_rollout(func):
+        @wraps(func)
+        def inner_decorator(*args, **task_kwargs):
+            members = autoscaling_group_members(region, autoscaling_group_name, hostname_attribute, healthy)
+            return roll(func, plan_waves(members, batch_size), region, autoscaling_group_name, args, task_kwargs,
+                        **kwargs)
+
+        # the rollout itself runs once, locally, whatever the hosts fab was given
+        return _wrap_as_new(func, runs_once(inner_decorator))
+
+    return attach_rollout
 
 
-__all__ = ['cloudformation_autoscaling_group', 'autoscaling_group', 'ec2']
+__all__ = ['cloudformation_autoscaling_group', 'autoscaling_group', 'ec2', 'ec2_multi_region', 'autoscaling_groups',
+           'rolling_autoscaling_group']
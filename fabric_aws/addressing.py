@@ -0,0 +1,226 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import socket
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+# tried in order by default: public addresses for EC2-Classic/public subnets, the private address otherwise
+DEFAULT_ATTRIBUTES = ('public_dns_name', 'ip_address', 'private_ip_address')
+
+
+def _is_ip_address(address):
+    try:
+        socket.inet_aton(address)
+    except socket.error:
+        return False
+
+    return address.count('.') == 3
+
+
+class DnsCache(object):
+    """
+    Thread-safe cache of hostname to IPv4 address resolutions, including failed ones, kept for `ttl` seconds
+    """
+
+    def __init__(self, ttl=300, max_workers=16):
+        """
+        :param ttl: Seconds to keep a resolution for
+        :type ttl: float
+        :param max_workers: Names resolved at once by `resolve_all`
+        :type max_workers: int
+        """
+
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name):
+        """
+        :return: IPv4 address of `name`, `None` when it doesn't resolve
+        :rtype: str
+        """
+
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+
+        try:
+            address = socket.gethostbyname(name)
+        except socket.error:
+            address = None
+
+        with self._lock:
+            self._entries[name] = (address, time.time() + self.ttl)
+
+        return address
+
+    def resolve_all(self, names):
+        """
+        Resolve `names` concurrently
+
+        :return: name -> IPv4 address, `None` for names that don't resolve
+        :rtype: dict
+        """
+
+        names = list(set(names))
+        if len(names) <= 1:
+            return dict((name, self.resolve(name)) for name in names)
+
+        pool = ThreadPool(min(self.max_workers, len(names)))
+        try:
+            return dict(zip(names, pool.map(self.resolve, names)))
+        finally:
+            pool.close()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+dns_cache = DnsCache()
+
+
+class AddressResolver(object):
+    """
+    Picks the address to connect to for each instance, for fleets where a single `hostname_attribute` doesn't fit
+    every instance. Can be passed anywhere a `hostname_attribute` is accepted.
+
+    The address is, in order of precedence:
+
+    * the value of the instance's `tag` tag, if set
+    * the first non-empty attribute of the rule matching the instance's subnet, then VPC
+    * the first non-empty attribute of `attributes`
+
+    Everything is read from the already described instance, no AWS call is made. With `resolve_dns`, candidate
+    hostnames are resolved (concurrently, through `dns_cache`), names that don't resolve are skipped in favor of the
+    next attribute, and the IP address is used.
+    """
+
+    def __init__(self, attributes=DEFAULT_ATTRIBUTES, rules=None, tag=None, resolve_dns=False):
+        """
+        :param attributes: `boto.ec2.instance.Instance` attributes to try, in order
+        :type attributes: list[str]
+        :param rules: Subnet or VPC id -> attributes to try, in order, for instances in that subnet or VPC
+        :type rules: dict
+        :param tag: Tag overriding the address of the instances it is set on
+        :type tag: str
+        :param resolve_dns: Resolve hostnames and skip the ones that don't resolve
+        :type resolve_dns: bool
+        """
+
+        self.attributes = tuple(attributes)
+        self.rules = dict((key, tuple(value)) for key, value in (rules or {}).items())
+        self.tag = tag
+        self.resolve_dns = resolve_dns
+
+    def candidates(self, instance):
+        """
+        :return: Candidate addresses of `instance`, in order of preference
+        :rtype: list[str]
+        """
+
+        candidates = []
+        if self.tag is not None:
+            candidates.append((getattr(instance, 'tags', None) or {}).get(self.tag))
+
+        attributes = self.rules.get(getattr(instance, 'subnet_id', None)) or \
+            self.rules.get(getattr(instance, 'vpc_id', None)) or self.attributes
+        candidates.extend(getattr(instance, attribute, None) for attribute in attributes)
+
+        return [candidate for candidate in candidates if candidate]
+
+    def _pick(self, candidates, resolved):
+        for candidate in candidates:
+            if not self.resolve_dns or _is_ip_address(candidate):
+                return candidate
+            if resolved.get(candidate):
+                return resolved[candidate]
+
+        return None
+
+    def address(self, instance):
+        """
+        :return: Address of `instance`, `None` when it has none
+        :rtype: str
+        """
+
+        return self.addresses([instance])[0]
+
+    def addresses(self, instances):
+        """
+        :return: Address of each instance, `None` for instances without one
+        :rtype: list[str]
+        """
+
+        candidates = [self.candidates(instance) for instance in instances]
+
+        resolved = {}
+        if self.resolve_dns:
+            resolved = dns_cache.resolve_all(candidate for instance_candidates in candidates
+                                             for candidate in instance_candidates if not _is_ip_address(candidate))
+
+        return [self._pick(instance_candidates, resolved) for instance_candidates in candidates]
+
+    def __repr__(self):
+        # part of cache keys, see `fabric_aws.cache.make_key`
+        return 'AddressResolver(attributes=%r, rules=%r, tag=%r, resolve_dns=%r)' % (
+            self.attributes, sorted(self.rules.items()), self.tag, self.resolve_dns)
+
+
+def instance_address(instance, hostname_attribute):
+    """
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute or `AddressResolver`
+    :type hostname_attribute: str | AddressResolver
+    :rtype: str
+    """
+
+    if isinstance(hostname_attribute, AddressResolver):
+        return hostname_attribute.address(instance)
+
+    return getattr(instance, hostname_attribute)
+
+
+def instance_addresses(instances, hostname_attribute):
+    """
+    Addresses of `instances`, instances an `AddressResolver` found no address for are left out
+
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute or `AddressResolver`
+    :type hostname_attribute: str | AddressResolver
+    :rtype: list[str]
+    """
+
+    if isinstance(hostname_attribute, AddressResolver):
+        return [address for address in hostname_attribute.addresses(list(instances)) if address is not None]
+
+    return [getattr(instance, hostname_attribute) for instance in instances]
@@ -0,0 +1,92 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+from fabric_aws.cache import make_key
+from fabric_aws.connections import get_connection
+from fabric_aws.scheduler import get_scheduler
+
+# DescribeInstances accepts up to 200 values per filter
+MAX_FILTER_VALUES = 200
+
+# DescribeInstanceStatus accepts up to 100 instance ids
+MAX_STATUS_INSTANCE_IDS = 100
+
+
+def call(service, region, operation, *args, **kwargs):
+    """
+    Call `operation` on the pooled `service` connection of `region`. Every AWS call made by fabric_aws goes through
+    here, so it is rate limited, retried when throttled, coalesced with identical concurrent calls
+    (see `fabric_aws.scheduler`) and measured (see `fabric_aws.instrumentation`)
+
+    :param service: One of `ec2`, `autoscale`, `cloudformation`, `elb`
+    :type service: str
+    :param region: AWS region
+    :type region: str
+    :param operation: boto connection method name, e.g. `get_all_instances`
+    :type operation: str
+    :param *args: pass-through arguments to the boto connection method
+    :param *kwargs: pass-through keyword arguments to the boto connection method
+    :return: The boto connection method's result
+    """
+
+    connection = get_connection(service, region)
+    key = make_key('%s.%s' % (service, operation), region, args, kwargs)
+
+    return get_scheduler().execute(service, region, operation,
+                                   lambda: getattr(connection, operation)(*args, **kwargs), key)
+
+
+def chunks(values, size):
+    """
+    Split `values` into lists of up to `size` values, e.g. to stay within a limit of an AWS call
+
+    :type values: list
+    :type size: int
+    :rtype: list[list]
+    """
+
+    return [values[start:start + size] for start in range(0, len(values), size)]
+
+
+def paginate(service, region, operation, *args, **kwargs):
+    """
+    Generate the items of every page of a paginated `operation`, requesting pages with `next_token` until the
+    response has none, see `call`
+    """
+
+    next_token = None
+    while True:
+        result = call(service, region, operation, *args, next_token=next_token, **kwargs)
+        for item in result:
+            yield item
+
+        next_token = getattr(result, 'next_token', None)
+        if not next_token:
+            break
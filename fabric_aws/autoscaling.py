@@ -0,0 +1,78 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+# tag set by AWS on every instance launched by an autoscaling group
+AUTOSCALING_GROUP_TAG = 'aws:autoscaling:groupName'
+
+# terminated (and stopped) instances keep their tags for a while, only let reachable ones through
+LIVE_INSTANCE_STATES = ['pending', 'running']
+
+STRATEGIES = ('auto', 'groups', 'tags')
+
+
+def autoscaling_group_filters(autoscaling_group_names):
+    """
+    :param autoscaling_group_names: Autoscaling group names
+    :type autoscaling_group_names: list[str]
+    :return: `boto.ec2.get_all_instances()` filters matching the live instances of `autoscaling_group_names`
+    :rtype: dict
+    """
+
+    return {'tag:' + AUTOSCALING_GROUP_TAG: list(autoscaling_group_names),
+            'instance-state-name': LIVE_INSTANCE_STATES}
+
+
+def choose_strategy(strategy, hostname_attribute):
+    """
+    Pick the cheapest way to resolve the hosts of an autoscaling group
+
+    * `groups`: `get_all_groups`, then `get_all_instances` for the group's instance ids (skipped when the hostname is
+      the instance id). Exact membership, two calls
+    * `tags`: a single `get_all_instances` call filtering on the `aws:autoscaling:groupName` tag and on pending or
+      running instances. Might include instances that were just detached from the group
+    * `auto`: `groups` when `hostname_attribute` is `id` (one call), `tags` otherwise
+
+    `groups` is the default, `tags` and `auto` trade exact membership for a call
+
+    :param strategy: One of `STRATEGIES`
+    :type strategy: str
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute to use as hostname
+    :type hostname_attribute: str
+    :return: `groups` or `tags`
+    :rtype: str
+    """
+
+    if strategy not in STRATEGIES:
+        raise ValueError('Unknown autoscaling group resolution strategy: %s' % strategy)
+
+    if strategy != 'auto':
+        return strategy
+
+    return 'groups' if hostname_attribute == 'id' else 'tags'
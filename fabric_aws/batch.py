@@ -0,0 +1,336 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from fabric_aws.addressing import instance_addresses
+from fabric_aws.autoscaling import autoscaling_group_filters, choose_strategy
+from fabric_aws.api import call, chunks, paginate, MAX_FILTER_VALUES
+from fabric_aws.filters import compile_filters, instance_matches, is_supported_filter, normalize_filters
+from fabric_aws.instrumentation import record_resolution
+from fabric_aws.inventory import get_inventory
+from fabric_aws.stacks import stack_index
+
+
+class Ticket(object):
+    """
+    A pending host query. The query is resolved together with every other query pending in the same region the first
+    time any of them is consumed
+    """
+
+    def __init__(self, resolver, region, kind, params, hostname_attribute, args=()):
+        self.resolver = resolver
+        self.region = region
+        self.kind = kind
+        self.params = params
+        self.hostname_attribute = hostname_attribute
+        self.args = args
+
+        self._hosts = None
+        self._error = None
+        self._recorded = False
+        self._done = threading.Event()
+
+    def _resolve(self, instances):
+        try:
+            hosts = instance_addresses(instances, self.hostname_attribute)
+        except Exception as e:
+            self._fail(e)
+        else:
+            self._resolve_hosts(hosts)
+
+    def _resolve_hosts(self, hosts):
+        self._hosts = hosts
+        self._done.set()
+
+    def _fail(self, error):
+        self._error = error
+        self._done.set()
+
+    def result(self):
+        """
+        :return: Resolved hosts
+        :rtype: list[str]
+        """
+
+        start = time.time()
+        self.resolver.flush(self.region)
+        self._done.wait()
+
+        if self._error is not None:
+            raise self._error
+
+        # recorded once, with the time this query waited for the region to be resolved
+        if not self._recorded:
+            self._recorded = True
+            record_resolution(self.kind, self.region, self.args, len(self._hosts), time.time() - start)
+
+        return self._hosts
+
+    def hosts(self):
+        """
+        Hosts generator, resolves the query (and every other query pending in its region) on first iteration
+        """
+
+        for host in self.result():
+            yield host
+
+
+class BatchResolver(object):
+    """
+    Collects host queries and resolves all queries pending in a region with as few AWS calls as possible:
+
+    * Autoscaling groups are resolved through their `aws:autoscaling:groupName` tag like any other EC2 query, or
+      described with a single `get_all_groups` call, see `fabric_aws.autoscaling.choose_strategy`
+    * EC2 queries filtering on the same filter names are merged into a single `get_all_instances` call (the union of
+      their filter values) and the response is split back per query client-side
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, region, kind, params, hostname_attribute, args):
+        ticket = Ticket(self, region, kind, params, hostname_attribute, args)
+        with self._lock:
+            self._pending.setdefault(region, []).append(ticket)
+
+        return ticket
+
+    def submit_ec2(self, region, instance_ids=None, filters=None, hostname_attribute='public_dns_name'):
+        """
+        Queue a query for instances matching `instance_ids` and `filters`, see `boto.ec2.get_all_instances()`
+
+        :rtype: Ticket
+        """
+
+        return self._submit(region, 'ec2', (instance_ids, filters), hostname_attribute,
+                            (instance_ids,) if instance_ids else ())
+
+    def submit_autoscaling_group(self, region, autoscaling_group_name, hostname_attribute='public_dns_name',
+                                 strategy='groups'):
+        """
+        Queue a query for all instances inside autoscaling group `autoscaling_group_name`
+
+        :rtype: Ticket
+        """
+
+        strategy = choose_strategy(strategy, hostname_attribute)
+
+        return self._submit(region, 'autoscaling_group', (autoscaling_group_name, strategy), hostname_attribute,
+                            (autoscaling_group_name,))
+
+    def submit_cloudformation_autoscaling_group(self, region, cfn_stack_name, asg_resource_name,
+                                                hostname_attribute='public_dns_name', strategy='groups'):
+        """
+        Queue a query for all instances inside an autoscaling group that is a part of a CFN stack
+
+        :rtype: Ticket
+        """
+
+        strategy = choose_strategy(strategy, hostname_attribute)
+
+        return self._submit(region, 'cloudformation_autoscaling_group', (cfn_stack_name, asg_resource_name, strategy),
+                            hostname_attribute, (cfn_stack_name, asg_resource_name))
+
+    def flush(self, region):
+        """
+        Resolve every query pending in `region`. A query that fails only fails its own ticket (and the tickets it was
+        merged with), the rest of the region is still resolved
+        """
+
+        with self._lock:
+            tickets = self._pending.pop(region, [])
+
+        if not tickets:
+            return
+
+        try:
+            self._resolve(region, tickets)
+        except Exception as e:
+            _fail(tickets, e)
+
+    def _resolve(self, region, tickets):
+        queries = []
+        autoscaling_group_tickets = {}
+
+        for ticket in tickets:
+            try:
+                if ticket.kind == 'ec2':
+                    instance_ids, filters = ticket.params
+                    queries.append((ticket, instance_ids, normalize_filters(filters)))
+                    continue
+
+                if ticket.kind == 'cloudformation_autoscaling_group':
+                    cfn_stack_name, asg_resource_name, strategy = ticket.params
+                    autoscaling_group_name = stack_index.logical_to_physical(region, cfn_stack_name,
+                                                                             asg_resource_name)
+                else:
+                    autoscaling_group_name, strategy = ticket.params
+
+                if strategy == 'tags':
+                    queries.append((ticket, None,
+                                    normalize_filters(autoscaling_group_filters([autoscaling_group_name]))))
+                else:
+                    autoscaling_group_tickets.setdefault(autoscaling_group_name, []).append(ticket)
+            except Exception as e:
+                ticket._fail(e)
+
+        if autoscaling_group_tickets:
+            try:
+                groups = self._describe_groups(region, list(autoscaling_group_tickets))
+            except Exception as e:
+                _fail([ticket for group_tickets in autoscaling_group_tickets.values() for ticket in group_tickets], e)
+                groups = {}
+                autoscaling_group_tickets = {}
+
+            for autoscaling_group_name, group_tickets in autoscaling_group_tickets.items():
+                for ticket in group_tickets:
+                    if autoscaling_group_name not in groups:
+                        ticket._fail(LookupError('Autoscaling group not found: %s' % autoscaling_group_name))
+                    elif ticket.hostname_attribute == 'id':
+                        ticket._resolve_hosts(groups[autoscaling_group_name])
+                    else:
+                        queries.append((ticket, groups[autoscaling_group_name], {}))
+
+        self._describe_instances(region, queries)
+
+    @staticmethod
+    def _describe_groups(region, autoscaling_group_names):
+        inventory = get_inventory()
+        if inventory is not None:
+            # an autoscaling group missing from the snapshot has no instances there either
+            return dict((name, inventory.autoscaling_group_instance_ids(region, name))
+                        for name in autoscaling_group_names)
+
+        groups = {}
+        for start in range(0, len(autoscaling_group_names), 50):
+            names = autoscaling_group_names[start:start + 50]
+            for group in paginate('autoscale', region, 'get_all_groups', names=names):
+                groups[group.name] = [instance.instance_id for instance in group.instances]
+
+        return groups
+
+    @staticmethod
+    def _describe_chunked(region, filters):
+        # AWS rejects filters with more than MAX_FILTER_VALUES values: every combination of value chunks is described
+        # on its own (values of a filter are OR-ed) and the instances are merged
+        names = sorted(filters)
+        value_chunks = [chunks(sorted(filters[name]), MAX_FILTER_VALUES) for name in names]
+
+        instances = OrderedDict()
+        for values in itertools.product(*value_chunks):
+            reservations = call('ec2', region, 'get_all_instances', filters=dict(zip(names, values)))
+            for reservation in reservations:
+                for instance in reservation.instances:
+                    instances.setdefault(instance.id, instance)
+
+        return list(instances.values())
+
+    def _describe_instances(self, region, queries):
+        inventory = get_inventory()
+        if inventory is not None:
+            for ticket, instance_ids, filters in queries:
+                try:
+                    if instance_ids is not None and not instance_ids:
+                        ticket._resolve([])
+                    else:
+                        ticket._resolve(inventory.instances(region, instance_ids, filters))
+                except Exception as e:
+                    ticket._fail(e)
+            return
+
+        batches = {}
+        for ticket, instance_ids, filters in queries:
+            try:
+                original_filters = filters
+                if instance_ids is not None:
+                    if not instance_ids:
+                        # an empty instance id list matches nothing, asking AWS would return every instance
+                        ticket._resolve([])
+                        continue
+
+                    if 'instance-id' in filters:
+                        filters = None
+                    else:
+                        filters = dict(filters, **{'instance-id': list(instance_ids)})
+
+                if filters is None or not all(is_supported_filter(name) for name in filters):
+                    # can't be split client-side, resolve on its own
+                    reservations = call('ec2', region, 'get_all_instances', instance_ids=instance_ids,
+                                        filters=original_filters or None)
+                    ticket._resolve(instance for reservation in reservations for instance in reservation.instances)
+                    continue
+
+                if any(len(values) > MAX_FILTER_VALUES for values in filters.values()):
+                    # too many values to be merged with other queries
+                    ticket._resolve(self._describe_chunked(region, filters))
+                    continue
+            except Exception as e:
+                ticket._fail(e)
+                continue
+
+            key = frozenset(filters)
+            for batch in batches.setdefault(key, []):
+                merged = dict((name, batch['filters'][name] | set(values)) for name, values in filters.items())
+                if all(len(values) <= MAX_FILTER_VALUES for values in merged.values()):
+                    batch['filters'] = merged
+                    batch['queries'].append((ticket, filters))
+                    break
+            else:
+                batches[key].append({'filters': dict((name, set(values)) for name, values in filters.items()),
+                                     'queries': [(ticket, filters)]})
+
+        for key_batches in batches.values():
+            for batch in key_batches:
+                merged = dict((name, sorted(values)) for name, values in batch['filters'].items())
+                try:
+                    reservations = call('ec2', region, 'get_all_instances', filters=merged or None)
+                    instances = [instance for reservation in reservations for instance in reservation.instances]
+                except Exception as e:
+                    # only the queries merged into this call fail
+                    _fail([ticket for ticket, _ in batch['queries']], e)
+                    continue
+
+                for ticket, filters in batch['queries']:
+                    matchers = compile_filters(filters)
+                    ticket._resolve(instance for instance in instances if instance_matches(instance, matchers))
+
+
+def _fail(tickets, error):
+    for ticket in tickets:
+        if not ticket._done.is_set():
+            ticket._fail(error)
+
+
+resolver = BatchResolver()
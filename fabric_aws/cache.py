@@ -0,0 +1,338 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import errno
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fabric_aws import connections
+from fabric_aws.instrumentation import record_resolution
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'fabric_aws')
+
+
+def make_key(function_name, region, args=(), kwargs=None, hostname_attribute=None, profile_name=None):
+    """
+    Build a stable cache key for a host resolution call
+
+    Filter values are order-insensitive for AWS, so list values are sorted to make equivalent queries share an entry.
+    Positional arguments keep their order, e.g. (stack, logical resource id) pairs.
+
+    :param function_name: Name of the resolving function (e.g. `ec2`, `autoscaling_group`)
+    :type function_name: str
+    :param region: AWS region
+    :type region: str
+    :param args: Positional arguments of the resolution call
+    :type args: tuple
+    :param kwargs: Keyword arguments of the resolution call
+    :type kwargs: dict
+    :param hostname_attribute: `boto.ec2.instance.Instance` attribute used as hostname
+    :type hostname_attribute: str
+    :param profile_name: boto profile the hosts are resolved with, `None` for the default credentials
+    :type profile_name: str
+    :return: Cache key
+    :rtype: str
+    """
+
+    def normalize(value):
+        if isinstance(value, dict):
+            return dict((str(k), normalize(v)) for k, v in value.items())
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return sorted(normalize(v) for v in value)
+        return value
+
+    key = [function_name, region, [normalize(arg) for arg in args], normalize(kwargs or {}), hostname_attribute]
+    if profile_name is not None:
+        key.append(profile_name)
+
+    return json.dumps(key, sort_keys=True, default=repr)
+
+
+class MemoryStore(object):
+    """
+    Size-bounded in-memory store, evicts the least recently used entry first
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, timestamp, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (timestamp, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileStore(object):
+    """
+    Size-bounded on-disk store, one JSON file per entry. Evicts the least recently written entries first
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+
+    def _filename(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._filename(key)) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        # guard against hash collisions
+        if entry.get('key') != key:
+            return None
+
+        return entry['timestamp'], entry['value']
+
+    def set(self, key, timestamp, value):
+        try:
+            os.makedirs(self.path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        # write to a temporary file first so concurrent `fab` processes never read a partial entry
+        filename = self._filename(key)
+        temporary_filename = '%s.%d.%d.tmp' % (filename, os.getpid(), threading.current_thread().ident)
+        with open(temporary_filename, 'w') as f:
+            json.dump({'key': key, 'timestamp': timestamp, 'value': value}, f)
+        os.rename(temporary_filename, filename)
+
+        self._evict()
+
+    def _evict(self):
+        filenames = [os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith('.json')]
+        if len(filenames) <= self.max_entries:
+            return
+
+        filenames.sort(key=os.path.getmtime)
+        for filename in filenames[:len(filenames) - self.max_entries]:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._filename(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        if not os.path.isdir(self.path):
+            return
+
+        for name in os.listdir(self.path):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+
+class ResolutionCache(object):
+    """
+    Host resolution cache, backed by an in-memory store and an optional on-disk store
+
+    Entries older than their TTL are refreshed synchronously, unless `stale_ttl` is set: entries up to `stale_ttl`
+    seconds past their TTL are returned immediately while a background thread refreshes them
+    (stale-while-revalidate).
+    """
+
+    def __init__(self, memory_entries=256, path=None, file_entries=1024, stale_ttl=None):
+        """
+        :param memory_entries: Maximum number of entries kept in memory
+        :type memory_entries: int
+        :param path: Directory for the on-disk store, `None` to keep entries in memory only
+        :type path: str
+        :param file_entries: Maximum number of entries kept on disk
+        :type file_entries: int
+        :param stale_ttl: Seconds past TTL during which a stale entry is served while being refreshed
+        :type stale_ttl: float
+        """
+
+        self.stores = [MemoryStore(memory_entries)]
+        if path is not None:
+            self.stores.append(FileStore(path, file_entries))
+
+        self.stale_ttl = stale_ttl
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        for index, store in enumerate(self.stores):
+            entry = store.get(key)
+            if entry is not None:
+                # promote entries found in slower stores
+                for faster_store in self.stores[:index]:
+                    faster_store.set(key, *entry)
+                return entry
+
+        return None
+
+    def _set(self, key, value):
+        timestamp = time.time()
+        for store in self.stores:
+            store.set(key, timestamp, value)
+
+    def _refresh(self, key, resolver):
+        try:
+            self._set(key, resolver())
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh_in_background(self, key, resolver):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        thread = threading.Thread(target=self._refresh, args=(key, resolver))
+        thread.daemon = True
+        thread.start()
+
+    def get_or_resolve(self, key, resolver, ttl, force_refresh=False):
+        """
+        Return the cached value for `key`, calling `resolver` when it is missing or expired
+
+        :param key: Cache key, see `make_key`
+        :type key: str
+        :param resolver: Function returning a fresh (JSON-serializable) value
+        :type resolver: callable
+        :param ttl: Seconds a cached value is considered fresh
+        :type ttl: float
+        :param force_refresh: Ignore the cached value and call `resolver`
+        :type force_refresh: bool
+        :return: Cached or freshly resolved value
+        """
+
+        entry = None if force_refresh else self._get(key)
+
+        if entry is not None:
+            timestamp, value = entry
+            age = time.time() - timestamp
+
+            if age <= ttl:
+                return value
+
+            if self.stale_ttl is not None and age <= ttl + self.stale_ttl:
+                self._refresh_in_background(key, resolver)
+                return value
+
+        value = resolver()
+        self._set(key, value)
+
+        return value
+
+    def invalidate(self, key):
+        for store in self.stores:
+            store.delete(key)
+
+    def clear(self):
+        for store in self.stores:
+            store.clear()
+
+
+_cache = ResolutionCache()
+
+
+def get_cache():
+    """
+    :return: The process-wide resolution cache
+    :rtype: ResolutionCache
+    """
+
+    return _cache
+
+
+def configure_cache(*args, **kwargs):
+    """
+    Replace the process-wide resolution cache. Arguments are passed-through to `ResolutionCache`
+
+    Use `configure_cache(path=DEFAULT_CACHE_PATH)` in your fabfile to share resolutions between `fab` invocations
+
+    :return: The new process-wide resolution cache
+    :rtype: ResolutionCache
+    """
+
+    global _cache
+    _cache = ResolutionCache(*args, **kwargs)
+
+    return _cache
+
+
+def cached_resolution(function_name, region, args, kwargs, hostname_attribute, resolver, ttl=None,
+                      force_refresh=False):
+    """
+    Resolve hosts through the process-wide cache. When `ttl` is `None` caching is disabled and `resolver` is called
+
+    :return: Resolved hosts
+    :rtype: list[str]
+    """
+
+    start = time.time()
+
+    if ttl is None:
+        hosts = resolver()
+    else:
+        # another profile is usually another account, its hosts don't share entries with the default credentials
+        key = make_key(function_name, region, args, kwargs, hostname_attribute, connections.pool.profile_name)
+        hosts = get_cache().get_or_resolve(key, resolver, ttl, force_refresh)
+
+    record_resolution(function_name, region, args, len(hosts), time.time() - start)
+
+    return hosts
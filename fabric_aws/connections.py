@@ -0,0 +1,195 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import importlib
+import sys
+import threading
+
+# boto is only imported when the first connection to a service is made, so loading a fabfile (or `fab --list`) doesn't
+# pay for it
+SERVICE_MODULES = {
+    'ec2': 'boto.ec2',
+    'autoscale': 'boto.ec2.autoscale',
+    'cloudformation': 'boto.cloudformation',
+    'elb': 'boto.ec2.elb',
+}
+
+
+def _connect_to_region(service):
+    if service not in SERVICE_MODULES:
+        raise ValueError('Unknown AWS service: %s' % service)
+
+    module_name = SERVICE_MODULES[service]
+    importlib.import_module(module_name)
+
+    # looked up through the `boto` package on every call so `boto.<service>` can be swapped (e.g. mocked) after import
+    module = sys.modules['boto']
+    for name in module_name.split('.')[1:]:
+        module = getattr(module, name)
+
+    return module.connect_to_region
+
+
+class ConnectionPool(object):
+    """
+    Thread-safe registry of boto connections keyed by (service, region, profile), kept for the lifetime of the process
+
+    boto connections keep their own pool of HTTP connections, so reusing them also saves TLS handshakes
+    """
+
+    def __init__(self, profile_name=None):
+        """
+        :param profile_name: boto profile used when `get` isn't given one, `None` for the default credentials
+        :type profile_name: str
+        """
+
+        self.profile_name = profile_name
+        self.hits = 0
+        self.misses = 0
+        self._connections = {}
+        self._connection_locks = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is not None:
+                self.hits += 1
+
+            return connection
+
+    def get(self, service, region, profile_name=None):
+        """
+        Return a connection to `service` in `region`, creating it on first use
+
+        :param service: One of `ec2`, `autoscale`, `cloudformation`, `elb`
+        :type service: str
+        :param region: AWS region
+        :type region: str
+        :param profile_name: boto profile name, `None` for the pool's profile
+        :type profile_name: str
+        :return: boto connection
+        """
+
+        key = (service, region, profile_name or self.profile_name)
+
+        connection = self._cached(key)
+        if connection is not None:
+            return connection
+
+        with self._lock:
+            connection_lock = self._connection_locks.setdefault(key, threading.Lock())
+
+        # connections are created outside the pool's lock, so connecting to a region doesn't hold up the others. The
+        # key's lock still makes concurrent callers wait for the same connection rather than create their own
+        with connection_lock:
+            connection = self._cached(key)
+            if connection is not None:
+                return connection
+
+            connect_to_region = _connect_to_region(service)
+            if key[2] is None:
+                connection = connect_to_region(region)
+            else:
+                connection = connect_to_region(region, profile_name=key[2])
+
+            with self._lock:
+                self.misses += 1
+                self._connections[key] = connection
+
+        return connection
+
+    def register(self, service, region, connection, profile_name=None):
+        """
+        Use `connection` for `service` in `region`, e.g. to point fabric_aws to a custom endpoint
+
+        :param service: One of `ec2`, `autoscale`, `cloudformation`, `elb`
+        :type service: str
+        :param region: AWS region
+        :type region: str
+        :param connection: boto connection
+        :param profile_name: boto profile name, `None` for the pool's profile
+        :type profile_name: str
+        """
+
+        with self._lock:
+            self._connections[(service, region, profile_name or self.profile_name)] = connection
+
+    def stats(self):
+        """
+        :return: hit/miss counters and the number of open connections
+        :rtype: dict
+        """
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'connections': len(self._connections)}
+
+    def reset(self):
+        """
+        Forget every pooled connection and zero the counters
+        """
+
+        with self._lock:
+            self._connections.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+pool = ConnectionPool()
+
+
+def configure_connections(profile_name=None):
+    """
+    Use the `profile_name` boto profile for every AWS call fabric_aws makes from now on
+
+    :param profile_name: boto profile name, `None` for the default credentials
+    :type profile_name: str
+    :rtype: ConnectionPool
+    """
+
+    pool.profile_name = profile_name
+
+    return pool
+
+
+def get_connection(service, region, profile_name=None):
+    """
+    Return a pooled boto connection, see `ConnectionPool.get`
+    """
+
+    return pool.get(service, region, profile_name)
+
+
+def reset_connections():
+    """
+    Forget every pooled connection, see `ConnectionPool.reset`
+    """
+
+    pool.reset()
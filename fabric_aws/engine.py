@@ -0,0 +1,249 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
+
+
+class Future(object):
+    """
+    Result of a resolution running in the background
+
+    Callbacks registered with `add_done_callback` run on the thread that completed the future, which lets event loops
+    (Tornado, Twisted, trollius...) bridge it into their own futures without blocking
+    """
+
+    def __init__(self):
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def _complete(self, result=None, exc_info=None):
+        with self._lock:
+            self._result = result
+            self._exc_info = exc_info
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            callback(self)
+
+    def set_result(self, result):
+        self._complete(result=result)
+
+    def set_exception(self, exc_info):
+        self._complete(exc_info=exc_info)
+
+    def done(self):
+        return self._done.is_set()
+
+    def add_done_callback(self, callback):
+        """
+        Call `callback(future)` once the future completes (right away if it already has)
+        """
+
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+
+        callback(self)
+
+    def exception(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise RuntimeError('Resolution did not complete within %s seconds' % timeout)
+
+        return None if self._exc_info is None else self._exc_info[1]
+
+    def result(self, timeout=None):
+        """
+        Wait for the future and return its result, re-raising its exception
+
+        :param timeout: Seconds to wait, `None` waits forever
+        :type timeout: float
+        """
+
+        if self.exception(timeout) is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+
+        return self._result
+
+
+class AsyncResolver(object):
+    """
+    Runs host resolutions on a bounded thread pool and returns `Future` objects, so independent lookups (other tasks,
+    other regions) overlap and dependent lookups (stack resource -> autoscaling group -> instances) are chained without
+    holding a worker while they wait
+    """
+
+    def __init__(self, max_workers=16):
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        # created on first use, so importing a fabfile doesn't start any thread
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self.max_workers)
+            return self._pool
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Run `function(*args, **kwargs)` on the pool
+
+        :rtype: Future
+        """
+
+        future = Future()
+
+        def run():
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                future.set_exception(sys.exc_info())
+            else:
+                future.set_result(result)
+
+        self._get_pool().apply_async(run)
+
+        return future
+
+    def then(self, future, function):
+        """
+        Run `function(result)` on the pool once `future` completes
+
+        :rtype: Future
+        """
+
+        chained = Future()
+
+        def run(result):
+            try:
+                chained.set_result(function(result))
+            except Exception:
+                chained.set_exception(sys.exc_info())
+
+        def schedule(completed):
+            if completed.exception() is not None:
+                chained.set_exception(completed._exc_info)
+            else:
+                self._get_pool().apply_async(run, (completed.result(),))
+
+        future.add_done_callback(schedule)
+
+        return chained
+
+    def cloudformation_logical_to_physical(self, region, cfn_stack_name, logical_resource_id):
+        """
+        Asynchronous `fabric_aws.stacks.StackIndex.logical_to_physical`
+
+        :rtype: Future
+        """
+
+        from fabric_aws.stacks import stack_index
+
+        return self.submit(stack_index.logical_to_physical, region, cfn_stack_name, logical_resource_id)
+
+    def autoscaling_group_instance_ids(self, region, autoscaling_group_name):
+        """
+        Asynchronous `fabric_aws.autoscaling_group_instance_ids`
+
+        :rtype: Future
+        """
+
+        from fabric_aws import autoscaling_group_instance_ids
+
+        return self.submit(autoscaling_group_instance_ids, region, autoscaling_group_name)
+
+    def ec2(self, region, *args, **kwargs):
+        """
+        Asynchronous `fabric_aws.ec2_generator`
+
+        :return: Future list of hosts
+        :rtype: Future
+        """
+
+        from fabric_aws import ec2_generator
+
+        return self.submit(lambda: list(ec2_generator(region, *args, **kwargs)))
+
+    def autoscaling_group(self, region, autoscaling_group_name, *args, **kwargs):
+        """
+        Asynchronous `fabric_aws.autoscaling_group_generator`
+
+        :return: Future list of hosts
+        :rtype: Future
+        """
+
+        from fabric_aws import autoscaling_group_generator
+
+        return self.submit(lambda: list(autoscaling_group_generator(region, autoscaling_group_name, *args, **kwargs)))
+
+    def cloudformation_autoscaling_group(self, region, cfn_stack_name, asg_resource_name, *args, **kwargs):
+        """
+        Asynchronous `fabric_aws.cloudformation_autoscaling_group_generator`
+
+        :return: Future list of hosts
+        :rtype: Future
+        """
+
+        from fabric_aws import autoscaling_group_generator
+
+        physical_resource_id = self.cloudformation_logical_to_physical(region, cfn_stack_name, asg_resource_name)
+
+        return self.then(physical_resource_id,
+                         lambda name: list(autoscaling_group_generator(region, name, *args, **kwargs)))
+
+
+def gather(futures, timeout=None):
+    """
+    Wait for every future and return their results, in order
+
+    :type futures: list[Future]
+    :rtype: list
+    """
+
+    return [future.result(timeout) for future in futures]
+
+
+def iter_result(future):
+    """
+    Hosts generator waiting for `future` on first iteration, lets the synchronous decorators consume a `Future`
+    """
+
+    for host in future.result():
+        yield host
+
+
+resolver = AsyncResolver()
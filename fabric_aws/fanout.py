@@ -0,0 +1,112 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import time
+from multiprocessing.pool import ThreadPool, TimeoutError
+
+from fabric.utils import warn
+
+
+class PartialResolutionError(Exception):
+    """
+    Raised when some (or all) of the fanned-out host resolutions failed
+
+    :ivar failures: Mapping of job label to the exception it raised
+    :ivar hosts: Hosts resolved by the jobs that succeeded
+    """
+
+    def __init__(self, failures, hosts):
+        self.failures = failures
+        self.hosts = hosts
+
+        super(PartialResolutionError, self).__init__(
+            'Host resolution failed for %s' % ', '.join('%s (%r)' % item for item in sorted(failures.items())))
+
+
+def fan_out(jobs, max_workers=8, timeout=None, fail_on_error=False):
+    """
+    Run host resolution jobs concurrently on a bounded thread pool and merge their hosts
+
+    Hosts are de-duplicated, keeping the order of `jobs`. Failed jobs are reported with a warning, unless every job
+    failed or `fail_on_error` is set, in which case `PartialResolutionError` is raised
+
+    :param jobs: (label, function returning a list of hosts) pairs
+    :type jobs: list[(str, callable)]
+    :param max_workers: Maximum number of concurrent jobs
+    :type max_workers: int
+    :param timeout: Seconds each job may take, counted from the start of the fan-out. `None` waits forever
+    :type timeout: float
+    :param fail_on_error: Raise on any failed job instead of warning
+    :type fail_on_error: bool
+    :return: Merged hosts
+    :rtype: list[str]
+    """
+
+    if not jobs:
+        return []
+
+    pool = ThreadPool(min(max_workers, len(jobs)))
+    try:
+        pending = [(label, pool.apply_async(job)) for label, job in jobs]
+        deadline = None if timeout is None else time.time() + timeout
+
+        hosts = []
+        seen = set()
+        failures = {}
+        for label, result in pending:
+            try:
+                if deadline is None:
+                    # AsyncResult.get() without a timeout can't be interrupted with ^C
+                    job_hosts = result.get(0xffff)
+                else:
+                    job_hosts = result.get(max(0, deadline - time.time()))
+            except TimeoutError:
+                failures[label] = TimeoutError('timed out after %s seconds' % timeout)
+                continue
+            except Exception as e:
+                failures[label] = e
+                continue
+
+            for host in job_hosts:
+                if host not in seen:
+                    seen.add(host)
+                    hosts.append(host)
+    finally:
+        # don't wait for timed-out jobs, their threads die with the process
+        pool.close()
+
+    if failures:
+        error = PartialResolutionError(failures, hosts)
+        if fail_on_error or len(failures) == len(jobs):
+            raise error
+
+        warn(str(error))
+
+    return hosts
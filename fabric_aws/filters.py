@@ -0,0 +1,278 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import re
+import threading
+import time
+
+from fabric_aws.api import paginate
+
+# filters that can be evaluated client-side on a `boto.ec2.instance.Instance`, filter name -> instance attribute
+ATTRIBUTE_FILTERS = {
+    'instance-id': 'id',
+    'instance-state-name': 'state',
+    'instance-type': 'instance_type',
+    'availability-zone': 'placement',
+    'image-id': 'image_id',
+    'vpc-id': 'vpc_id',
+    'subnet-id': 'subnet_id',
+    'private-ip-address': 'private_ip_address',
+    'ip-address': 'ip_address',
+    'key-name': 'key_name',
+}
+
+
+def is_supported_filter(name):
+    """
+    :return: Whether filter `name` can be evaluated client-side
+    :rtype: bool
+    """
+
+    return name in ATTRIBUTE_FILTERS or name.startswith('tag:') or name in ('tag-key', 'tag-value')
+
+
+def normalize_filters(filters):
+    """
+    :return: `filters` with every value turned into a list of values
+    :rtype: dict
+    """
+
+    normalized = {}
+    for name, values in (filters or {}).items():
+        normalized[name] = [values] if isinstance(values, basestring) else list(values)
+
+    return normalized
+
+
+def _parse_value(value):
+    # returns (literal, regular expression), literal is None when `value` contains wildcards
+    literal = []
+    expression = []
+    wildcard = False
+
+    characters = iter(value)
+    for char in characters:
+        if char == '\\':
+            char = next(characters, '\\')
+        elif char in '*?':
+            expression.append('.*' if char == '*' else '.')
+            wildcard = True
+            continue
+
+        literal.append(char)
+        expression.append(re.escape(char))
+
+    return None if wildcard else ''.join(literal), ''.join(expression)
+
+
+class ValueMatcher(object):
+    """
+    Matches a value against the values of a filter, with the semantics of EC2 `DescribeInstances` filters: values are
+    OR-ed, matching is case sensitive, `*` matches any sequence of characters, `?` a single character and a backslash
+    escapes the next character (`\\*` is a literal `*`)
+
+    Values without wildcards are looked up in a set, the wildcard ones are compiled into a single regular expression
+    """
+
+    def __init__(self, values):
+        exact = set()
+        patterns = []
+        for value in values:
+            literal, expression = _parse_value(value)
+            if literal is None:
+                patterns.append(expression)
+            else:
+                exact.add(literal)
+
+        self.exact = frozenset(exact)
+        self.pattern = re.compile(r'(?:%s)\Z' % '|'.join(patterns), re.DOTALL) if patterns else None
+
+    def __call__(self, actual):
+        if actual is None:
+            return False
+
+        return actual in self.exact or (self.pattern is not None and self.pattern.match(actual) is not None)
+
+
+def compile_filters(filters):
+    """
+    :param filters: Normalized filters, see `normalize_filters`
+    :type filters: dict
+    :return: Filter name -> `ValueMatcher`, for `instance_matches`
+    :rtype: dict
+    """
+
+    return dict((name, ValueMatcher(values)) for name, values in filters.items())
+
+
+def _instance_values(instance, name):
+    if name.startswith('tag:'):
+        value = instance.tags.get(name[4:])
+        return [] if value is None else [value]
+    if name == 'tag-key':
+        return list(instance.tags)
+    if name == 'tag-value':
+        return list(instance.tags.values())
+
+    value = getattr(instance, ATTRIBUTE_FILTERS[name])
+    return [] if value is None else [value]
+
+
+def instance_matches(instance, matchers):
+    """
+    :param matchers: Compiled filters, see `compile_filters`
+    :type matchers: dict
+    :return: Whether `instance` matches every filter
+    :rtype: bool
+    """
+
+    for name, matches in matchers.items():
+        if not any(matches(value) for value in _instance_values(instance, name)):
+            return False
+
+    return True
+
+
+class InstanceSet(object):
+    """
+    Instances of a region, indexed by filter value so any number of differently filtered queries are answered from a
+    single `DescribeInstances` response. An index is built for a filter name the first time it is queried
+    """
+
+    def __init__(self, instances):
+        self.instances = list(instances)
+        self._indexes = {}
+
+    def _index(self, name):
+        index = self._indexes.get(name)
+        if index is None:
+            index = {}
+            for position, instance in enumerate(self.instances):
+                for value in _instance_values(instance, name):
+                    index.setdefault(value, []).append(position)
+
+            self._indexes[name] = index
+
+        return index
+
+    def select(self, instance_ids=None, filters=None):
+        """
+        Instances matching `instance_ids` and `filters`, in the order AWS returned them. Unlike AWS, unknown instance
+        ids are ignored rather than failing the query
+
+        :param instance_ids: Instance ids
+        :type instance_ids: list[str]
+        :param filters: EC2 filters, see `boto.ec2.get_all_instances()`
+        :type filters: dict
+        :rtype: list[boto.ec2.instance.Instance]
+        """
+
+        constraints = normalize_filters(filters).items()
+        if instance_ids:
+            constraints.append(('instance-id', [instance_id.replace('\\', '\\\\').replace('*', '\\*')
+                                                .replace('?', '\\?') for instance_id in instance_ids]))
+
+        unsupported = [name for name, _ in constraints if not is_supported_filter(name)]
+        if unsupported:
+            raise ValueError('Filters %s can not be evaluated client-side' % ', '.join(sorted(unsupported)))
+
+        positions = None
+        for name, values in constraints:
+            matcher = ValueMatcher(values)
+            index = self._index(name)
+
+            matched = set()
+            for value in matcher.exact:
+                matched.update(index.get(value, ()))
+            if matcher.pattern is not None:
+                for value, value_positions in index.items():
+                    if matcher.pattern.match(value) is not None:
+                        matched.update(value_positions)
+
+            positions = matched if positions is None else positions & matched
+            if not positions:
+                return []
+
+        if positions is None:
+            return list(self.instances)
+
+        return [self.instances[position] for position in sorted(positions)]
+
+
+class InstanceSetCache(object):
+    """
+    Process-wide `InstanceSet` per region, fetched once (concurrent callers wait for the same fetch) and refetched once
+    older than `max_age` seconds
+    """
+
+    def __init__(self, max_age=60, page_size=1000):
+        """
+        :param max_age: Seconds an instance set is used before fetching the region again
+        :type max_age: float
+        :param page_size: Instances per `DescribeInstances` page
+        :type page_size: int
+        """
+
+        self.max_age = max_age
+        self.page_size = page_size
+        self._sets = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, region):
+        """
+        :param region: AWS region
+        :type region: str
+        :rtype: InstanceSet
+        """
+
+        with self._lock:
+            lock = self._locks.setdefault(region, threading.Lock())
+
+        with lock:
+            entry = self._sets.get(region)
+            if entry is None or time.time() - entry[1] > self.max_age:
+                instances = [instance for reservation in
+                             paginate('ec2', region, 'get_all_reservations', max_results=self.page_size)
+                             for instance in reservation.instances]
+                entry = self._sets[region] = (InstanceSet(instances), time.time())
+
+        return entry[0]
+
+    def invalidate(self, region):
+        with self._lock:
+            self._sets.pop(region, None)
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+
+
+instance_sets = InstanceSetCache()
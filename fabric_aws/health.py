@@ -0,0 +1,137 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+from fabric_aws.api import call, MAX_STATUS_INSTANCE_IDS
+from fabric_aws.inventory import get_inventory
+
+# autoscaling group members that are neither starting, leaving nor on standby
+IN_SERVICE_LIFECYCLE_STATES = ('InService',)
+
+# status check results of instances that won't answer SSH
+UNHEALTHY_STATUSES = ('impaired',)
+
+
+def autoscaling_group_healthy_members(region, autoscaling_group_name):
+    """
+    Return the members of an autoscaling group that are in service and healthy according to the group, and the group's
+    load balancers
+
+    :param region: AWS region
+    :type region: str
+    :param autoscaling_group_name: Autoscaling group name
+    :type autoscaling_group_name: str
+    :return: (instance ids, load balancer names)
+    :rtype: tuple
+    """
+
+    inventory = get_inventory()
+    if inventory is not None:
+        # the snapshot doesn't record lifecycle states
+        return inventory.autoscaling_group_instance_ids(region, autoscaling_group_name), []
+
+    groups = call('autoscale', region, 'get_all_groups', names=[autoscaling_group_name])
+    if not groups:
+        raise LookupError('Autoscaling group not found: %s' % autoscaling_group_name)
+
+    instance_ids = [instance.instance_id for instance in groups[0].instances
+                    if instance.lifecycle_state in IN_SERVICE_LIFECYCLE_STATES and instance.health_status == 'Healthy']
+
+    return instance_ids, list(groups[0].load_balancers or [])
+
+
+def impaired_instance_ids(region, instance_ids):
+    """
+    Return the instances failing their instance or system status checks, `MAX_STATUS_INSTANCE_IDS` instances per call
+
+    :param region: AWS region
+    :type region: str
+    :param instance_ids: Running instance ids
+    :type instance_ids: list[str]
+    :rtype: set[str]
+    """
+
+    impaired = set()
+    for start in range(0, len(instance_ids), MAX_STATUS_INSTANCE_IDS):
+        for status in call('ec2', region, 'get_all_instance_status',
+                           instance_ids=instance_ids[start:start + MAX_STATUS_INSTANCE_IDS]):
+            if status.instance_status.status in UNHEALTHY_STATUSES or status.system_status.status in UNHEALTHY_STATUSES:
+                impaired.add(status.id)
+
+    return impaired
+
+
+def out_of_service_instance_ids(region, load_balancers):
+    """
+    Return the instances registered with any of `load_balancers` that are out of service there, one call per load
+    balancer
+
+    :param region: AWS region
+    :type region: str
+    :param load_balancers: Classic load balancer names
+    :type load_balancers: list[str]
+    :rtype: set[str]
+    """
+
+    out_of_service = set()
+    for load_balancer in load_balancers:
+        for state in call('elb', region, 'describe_instance_health', load_balancer):
+            if state.state != 'InService':
+                out_of_service.add(state.instance_id)
+
+    return out_of_service
+
+
+def healthy_instances(region, instances, status_checks=True, load_balancers=None):
+    """
+    Keep the running instances that pass their status checks and are in service on `load_balancers`. Against an
+    inventory snapshot only the recorded instance state is checked
+
+    :param region: AWS region
+    :type region: str
+    :param instances: Instances to check
+    :type instances: list[boto.ec2.instance.Instance]
+    :param status_checks: Drop instances failing their instance or system status checks
+    :type status_checks: bool
+    :param load_balancers: Drop instances out of service on any of these classic load balancers
+    :type load_balancers: list[str]
+    :rtype: list[boto.ec2.instance.Instance]
+    """
+
+    instances = [instance for instance in instances if instance.state == 'running']
+    if not instances or get_inventory() is not None:
+        return instances
+
+    excluded = set()
+    if status_checks:
+        excluded |= impaired_instance_ids(region, [instance.id for instance in instances])
+    if load_balancers:
+        excluded |= out_of_service_instance_ids(region, load_balancers)
+
+    return [instance for instance in instances if instance.id not in excluded]
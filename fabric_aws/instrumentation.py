@@ -0,0 +1,246 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import atexit
+import logging
+import socket
+import sys
+import threading
+from collections import deque, namedtuple
+
+from fabric.api import env, task
+
+THROTTLING_ERROR_CODES = ('Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'RequestThrottled')
+
+CallRecord = namedtuple('CallRecord', 'service region operation duration attempts throttled error items')
+ResolutionRecord = namedtuple('ResolutionRecord', 'function region args hosts duration')
+
+
+def is_throttling_error(error):
+    """
+    :return: whether `error` is an AWS throttling error
+    :rtype: bool
+    """
+
+    return getattr(error, 'error_code', None) in THROTTLING_ERROR_CODES
+
+
+class Collector(object):
+    """
+    In-process sink keeping the last `max_records` records, summarized by `report()`
+    """
+
+    def __init__(self, max_records=10000):
+        self.calls = deque(maxlen=max_records)
+        self.resolutions = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def call(self, record):
+        with self._lock:
+            self.calls.append(record)
+
+    def resolution(self, record):
+        with self._lock:
+            self.resolutions.append(record)
+
+    def clear(self):
+        with self._lock:
+            self.calls.clear()
+            self.resolutions.clear()
+
+    def summary(self):
+        """
+        :return: Mapping of (service, operation) to calls, total/max duration, retries, throttles, errors and items
+        :rtype: dict
+        """
+
+        summary = {}
+        with self._lock:
+            for record in self.calls:
+                entry = summary.setdefault((record.service, record.operation), {
+                    'calls': 0, 'duration': 0.0, 'max_duration': 0.0, 'retries': 0, 'throttled': 0, 'errors': 0,
+                    'items': 0
+                })
+                entry['calls'] += 1
+                entry['duration'] += record.duration
+                entry['max_duration'] = max(entry['max_duration'], record.duration)
+                entry['retries'] += record.attempts - 1
+                entry['throttled'] += record.throttled
+                entry['errors'] += record.error is not None
+                entry['items'] += record.items or 0
+
+        return summary
+
+    def report(self):
+        """
+        :return: Human readable timing breakdown of the AWS calls and host resolutions
+        :rtype: str
+        """
+
+        lines = ['AWS calls:',
+                 '  %-36s %6s %9s %9s %8s %10s %7s %8s' % ('operation', 'calls', 'total (s)', 'max (s)', 'retries',
+                                                           'throttled', 'errors', 'items')]
+        for (service, operation), entry in sorted(self.summary().items()):
+            lines.append('  %-36s %6d %9.3f %9.3f %8d %10d %7d %8d' % (
+                '%s.%s' % (service, operation), entry['calls'], entry['duration'], entry['max_duration'],
+                entry['retries'], entry['throttled'], entry['errors'], entry['items']))
+
+        lines.extend(['Host resolutions:', '  %-60s %6s %9s' % ('resolution', 'hosts', 'time (s)')])
+        with self._lock:
+            resolutions = list(self.resolutions)
+        for record in resolutions:
+            label = '%s(%s)' % (record.function, ', '.join([record.region] + [str(arg) for arg in record.args]))
+            lines.append('  %-60s %6d %9.3f' % (label[:60], record.hosts, record.duration))
+
+        return '\n'.join(lines)
+
+
+class LoggingSink(object):
+    """
+    Sink logging every record
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('fabric_aws')
+        self.level = level
+
+    def call(self, record):
+        self.logger.log(self.level, '%s.%s(%s) took %.3fs, %d attempt(s)%s%s', record.service, record.operation,
+                        record.region, record.duration, record.attempts, ', throttled' if record.throttled else '',
+                        ', failed: %r' % record.error if record.error is not None else '')
+
+    def resolution(self, record):
+        self.logger.log(self.level, '%s(%s) resolved %d host(s) in %.3fs', record.function, record.region,
+                        record.hosts, record.duration)
+
+
+class StatsdSink(object):
+    """
+    Sink sending StatsD metrics over UDP: a timer and counters per AWS operation, a timer and a gauge per resolution
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='fabric_aws'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _send(self, *metrics):
+        try:
+            self._socket.sendto('\n'.join('%s.%s' % (self.prefix, metric) for metric in metrics), self.address)
+        except socket.error:
+            # metrics are best effort, never fail a deployment because of them
+            pass
+
+    def call(self, record):
+        name = '%s.%s' % (record.service, record.operation)
+        metrics = ['%s.duration:%d|ms' % (name, record.duration * 1000), '%s.calls:1|c' % name]
+        if record.attempts > 1:
+            metrics.append('%s.retries:%d|c' % (name, record.attempts - 1))
+        if record.throttled:
+            metrics.append('%s.throttled:1|c' % name)
+        if record.error is not None:
+            metrics.append('%s.errors:1|c' % name)
+
+        self._send(*metrics)
+
+    def resolution(self, record):
+        self._send('%s.duration:%d|ms' % (record.function, record.duration * 1000),
+                   '%s.hosts:%d|g' % (record.function, record.hosts))
+
+
+collector = Collector()
+sinks = [collector]
+_report_registered = []
+
+
+def add_sink(sink):
+    """
+    Send records to `sink` too. Sinks implement `call(CallRecord)` and `resolution(ResolutionRecord)`
+    """
+
+    sinks.append(sink)
+
+
+def remove_sink(sink):
+    sinks.remove(sink)
+
+
+def _print_report_at_exit():
+    # `fab --set fabric_aws_timings ...` prints the breakdown once fab is done
+    if env.get('fabric_aws_timings') and not _report_registered:
+        _report_registered.append(True)
+        atexit.register(lambda: sys.stderr.write(collector.report() + '\n'))
+
+
+def _items(result):
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def record_call(service, region, operation, duration, attempts=1, error=None, result=None, throttled=None):
+    """
+    Record an AWS call made during host resolution
+
+    :param throttled: Number of attempts that were throttled, `None` counts `error` only
+    :type throttled: int
+    """
+
+    _print_report_at_exit()
+
+    if throttled is None:
+        throttled = int(is_throttling_error(error))
+
+    record = CallRecord(service, region, operation, duration, attempts, throttled, error, _items(result))
+    for sink in sinks:
+        sink.call(record)
+
+
+def record_resolution(function, region, args, hosts, duration):
+    """
+    Record a host resolution and the number of hosts it returned
+    """
+
+    # resolutions answered from the cache or an inventory snapshot make no AWS call
+    _print_report_at_exit()
+
+    record = ResolutionRecord(function, region, tuple(args), hosts, duration)
+    for sink in sinks:
+        sink.resolution(record)
+
+
+@task
+def timings():
+    """
+    Print the time spent resolving hosts. Import it into your fabfile and run it last, e.g. `fab deploy timings`
+    """
+
+    print collector.report()
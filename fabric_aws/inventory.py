@@ -0,0 +1,280 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import os
+import sqlite3
+import threading
+import time
+
+from fabric.api import env, task
+
+from fabric_aws.api import paginate
+from fabric_aws.filters import compile_filters, instance_matches, is_supported_filter, normalize_filters
+
+INSTANCE_ATTRIBUTES = ('id', 'state', 'instance_type', 'placement', 'private_ip_address', 'ip_address',
+                       'public_dns_name', 'private_dns_name', 'vpc_id', 'subnet_id', 'image_id', 'key_name')
+
+# SQLite builds older than 3.32 bind at most 999 variables per statement
+MAX_SQL_VARIABLES = 999
+
+SCHEMA = """
+CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE instances (region TEXT, %(columns)s, PRIMARY KEY (region, id));
+CREATE TABLE tags (region TEXT, instance_id TEXT, key TEXT, value TEXT);
+CREATE INDEX tags_key_value ON tags (region, key, value);
+CREATE INDEX tags_instance ON tags (region, instance_id);
+CREATE TABLE autoscaling_groups (region TEXT, name TEXT, instance_id TEXT);
+CREATE INDEX autoscaling_groups_name ON autoscaling_groups (region, name);
+CREATE TABLE stacks (region TEXT, stack_name TEXT, stack_id TEXT);
+CREATE INDEX stacks_name ON stacks (region, stack_name);
+CREATE INDEX stacks_id ON stacks (region, stack_id);
+CREATE TABLE stack_resources (region TEXT, stack_id TEXT, logical_resource_id TEXT, physical_resource_id TEXT,
+                              resource_type TEXT);
+CREATE INDEX stack_resources_logical ON stack_resources (region, stack_id, logical_resource_id);
+""" % {'columns': ', '.join('%s TEXT' % attribute for attribute in INSTANCE_ATTRIBUTES)}
+
+
+class InventoryInstance(object):
+    """
+    EC2 instance read from an inventory snapshot, exposing the same attributes as `boto.ec2.instance.Instance`
+    """
+
+    __slots__ = INSTANCE_ATTRIBUTES + ('tags',)
+
+    def __init__(self, row, tags):
+        for attribute, value in zip(INSTANCE_ATTRIBUTES, row):
+            setattr(self, attribute, value)
+        self.tags = tags
+
+
+def export_inventory(path, regions, stacks=True):
+    """
+    Dump every instance, autoscaling group membership and Cloudformation logical -> physical mapping of `regions` to
+    an indexed sqlite file, see `use_inventory`
+
+    :param path: Inventory file path, replaced atomically
+    :type path: str
+    :param regions: AWS regions
+    :type regions: list[str]
+    :param stacks: Whether to export Cloudformation stack resources
+    :type stacks: bool
+    """
+
+    temporary_path = '%s.%d.tmp' % (path, os.getpid())
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+
+    db = sqlite3.connect(temporary_path)
+    try:
+        db.executescript(SCHEMA)
+
+        for region in regions:
+            for reservation in paginate('ec2', region, 'get_all_reservations', max_results=1000):
+                for instance in reservation.instances:
+                    db.execute('INSERT INTO instances VALUES (?, %s)' % ', '.join('?' * len(INSTANCE_ATTRIBUTES)),
+                               [region] + [getattr(instance, attribute, None) for attribute in INSTANCE_ATTRIBUTES])
+                    db.executemany('INSERT INTO tags VALUES (?, ?, ?, ?)',
+                                   [(region, instance.id, key, value) for key, value in instance.tags.items()])
+
+            for group in paginate('autoscale', region, 'get_all_groups'):
+                db.executemany('INSERT INTO autoscaling_groups VALUES (?, ?, ?)',
+                               [(region, group.name, instance.instance_id) for instance in group.instances])
+
+            if not stacks:
+                continue
+
+            for stack in paginate('cloudformation', region, 'describe_stacks'):
+                db.execute('INSERT INTO stacks VALUES (?, ?, ?)', (region, stack.stack_name, stack.stack_id))
+                db.executemany('INSERT INTO stack_resources VALUES (?, ?, ?, ?, ?)',
+                               [(region, stack.stack_id, summary.logical_resource_id, summary.physical_resource_id,
+                                 summary.resource_type)
+                                for summary in paginate('cloudformation', region, 'list_stack_resources',
+                                                        stack.stack_id)])
+
+        db.executemany('INSERT INTO metadata VALUES (?, ?)',
+                       [('created_at', repr(time.time())), ('regions', ','.join(regions))])
+        db.commit()
+    finally:
+        db.close()
+
+    os.rename(temporary_path, path)
+
+
+class Inventory(object):
+    """
+    Read-only view of an inventory snapshot written by `export_inventory`. Lookups only use indexed columns and never
+    call AWS
+    """
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise IOError('Inventory snapshot not found: %s' % path)
+
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        metadata = dict(self._query('SELECT key, value FROM metadata'))
+        self.created_at = float(metadata['created_at'])
+        self.regions = metadata['regions'].split(',')
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def _instances(self, region, where, parameters):
+        # (rowid, instance) pairs, the tags are selected with the same condition rather than by binding every id
+        rows = self._query('SELECT rowid, %s FROM instances WHERE region = ? AND %s' %
+                           (', '.join(INSTANCE_ATTRIBUTES), where), [region] + list(parameters))
+
+        tags = {}
+        for instance_id, key, value in self._query(
+                'SELECT instance_id, key, value FROM tags WHERE region = ? AND instance_id IN '
+                '(SELECT id FROM instances WHERE region = ? AND %s)' % where, [region, region] + list(parameters)):
+            tags.setdefault(instance_id, {})[key] = value
+
+        return [(row[0], InventoryInstance(row[1:], tags.get(row[1], {}))) for row in rows]
+
+    def instances(self, region, instance_ids=None, filters=None):
+        """
+        Instances matching `instance_ids` and `filters`, with the semantics of `boto.ec2.get_all_instances()`
+
+        :rtype: list[InventoryInstance]
+        """
+
+        if region not in self.regions:
+            raise LookupError('Region %s is not part of inventory snapshot %s' % (region, self.path))
+
+        filters = normalize_filters(filters)
+        unsupported = [name for name in filters if not is_supported_filter(name)]
+        if unsupported:
+            raise ValueError('Filters %s can not be evaluated against an inventory snapshot' % ', '.join(unsupported))
+
+        # narrow down with the indexes, the remaining filters are evaluated on the candidates
+        matchers = compile_filters(filters)
+        indexed_tag = next(((name[4:], sorted(matcher.exact)) for name, matcher in sorted(matchers.items())
+                            if name.startswith('tag:') and matcher.pattern is None), None)
+        if instance_ids:
+            # the tags query binds the region twice besides the ids
+            size = MAX_SQL_VARIABLES - 2
+            rows = []
+            for start in range(0, len(instance_ids), size):
+                chunk = list(instance_ids[start:start + size])
+                rows.extend(self._instances(region, 'id IN (%s)' % ', '.join('?' * len(chunk)), chunk))
+        elif indexed_tag is not None:
+            key, values = indexed_tag
+            rows = self._instances(
+                region, 'id IN (SELECT instance_id FROM tags WHERE region = ? AND key = ? AND value IN (%s))' %
+                ', '.join('?' * len(values)), [region, key] + values)
+        else:
+            rows = self._instances(region, '1', ())
+
+        # snapshot order
+        instances = [instance for _, instance in sorted(rows, key=lambda row: row[0])]
+
+        return [instance for instance in instances if instance_matches(instance, matchers)]
+
+    def autoscaling_group_instance_ids(self, region, autoscaling_group_name):
+        """
+        :return: list of instance ids inside `autoscaling_group_name`
+        :rtype: list[str]
+        """
+
+        rows = self._query('SELECT instance_id FROM autoscaling_groups WHERE region = ? AND name = ? ORDER BY rowid',
+                           (region, autoscaling_group_name))
+
+        return [instance_id for instance_id, in rows]
+
+    def stack_resources(self, region, cfn_stack_name):
+        """
+        Return the resources of a stack, see `fabric_aws.stacks.StackIndex.resources`
+
+        :param cfn_stack_name: Cloudformation stack name or id
+        :type cfn_stack_name: str
+        :return: Mapping of logical resource id to (physical resource id, resource type)
+        :rtype: dict
+        """
+
+        rows = self._query(
+            'SELECT logical_resource_id, physical_resource_id, resource_type FROM stack_resources WHERE region = ? AND '
+            'stack_id IN (SELECT stack_id FROM stacks WHERE region = ? AND (stack_name = ? OR stack_id = ?))',
+            (region, region, cfn_stack_name, cfn_stack_name))
+        if not rows:
+            raise LookupError('Stack %s not found in inventory snapshot %s' % (cfn_stack_name, self.path))
+
+        return dict((logical, (physical, resource_type)) for logical, physical, resource_type in rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_inventory = [None]
+
+
+def use_inventory(path):
+    """
+    Resolve `ec2`, `autoscaling_group` and `cloudformation_autoscaling_group` against an inventory snapshot instead of
+    calling AWS. `None` goes back to calling AWS. `fab --set fabric_aws_inventory=<path>` does the same
+
+    :param path: Inventory file written by `export_inventory`
+    :type path: str
+    :rtype: Inventory
+    """
+
+    if _inventory[0] is not None:
+        _inventory[0].close()
+
+    _inventory[0] = None if path is None else Inventory(path)
+
+    return _inventory[0]
+
+
+def get_inventory():
+    """
+    :return: The inventory snapshot in use, `None` when resolving against AWS
+    :rtype: Inventory
+    """
+
+    path = env.get('fabric_aws_inventory')
+    if path and (_inventory[0] is None or _inventory[0].path != path):
+        use_inventory(path)
+
+    return _inventory[0]
+
+
+@task
+def inventory_export(path, regions, stacks=True):
+    """
+    Write an inventory snapshot, e.g. `fab 'inventory_export:inventory.db,us-east-1;eu-west-1'` (regions are separated
+    with `;`, quoted for the shell)
+    """
+
+    export_inventory(path, regions.split(';'), stacks not in (False, 'False', 'false', 'no', '0'))
@@ -0,0 +1,282 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import os
+import socket
+import struct
+import threading
+from multiprocessing.pool import ThreadPool
+
+from fabric.auth import get_password
+from fabric.network import direct_tcpip, key_filenames, key_from_env, normalize, normalize_to_string, ssh
+from fabric.state import connections, env
+
+
+def _parse_network(network):
+    address, _, bits = network.partition('/')
+    bits = int(bits or 32)
+    mask = (0xffffffff << (32 - bits)) & 0xffffffff
+
+    return struct.unpack('!I', socket.inet_aton(address))[0] & mask, mask
+
+
+def _ip_address(host):
+    try:
+        return struct.unpack('!I', socket.inet_aton(host))[0]
+    except socket.error:
+        return None
+
+
+class Prewarmer(object):
+    """
+    Opens SSH connections to resolved hosts on a background thread pool and stores them in Fabric's connection cache
+    (`fabric.state.connections`), so the first command on each host doesn't wait for the handshake
+
+    Connections are opened without prompting: a host that needs a password Fabric doesn't know yet, or that fails to
+    connect for any reason, is left for Fabric to connect to as usual. Fabric's parallel mode opens its connections in
+    child processes, only serial runs benefit.
+
+    Hosts whose address is inside one of `gateways`' networks (typically the CIDR blocks of VPCs only reachable through
+    a bastion) are connected through that network's gateway, other hosts through `env.gateway` if set. Fabric reuses
+    the cached connections, so this effectively gives each VPC its own gateway.
+
+    Only the `window` hosts following the one Fabric is running the task on are connected to (see `advance`), so a
+    large group doesn't get all its connections opened at once. Before the task runs on a host, its connection is
+    waited for: Fabric then reuses it instead of opening a second one. A connection still not open after `env.timeout`
+    is closed once it opens, and Fabric connects as usual. Tasks that aren't decorated with `prewarm=True` don't wait:
+    if one of them connects to a host while its connection is being pre-warmed, Fabric replaces the pre-warmed
+    connection in its cache and it is only closed when the process exits.
+    """
+
+    def __init__(self, max_workers=10, gateways=None, window=20):
+        """
+        :param max_workers: Connections opened at once
+        :type max_workers: int
+        :param gateways: Network (e.g. `10.1.0.0/16`) to gateway host string
+        :type gateways: dict
+        :param window: Hosts connected to ahead of the one Fabric is on, `None` to connect to every host right away
+        :type window: int
+        """
+
+        self.max_workers = max_workers
+        self.gateways = [(_parse_network(network), gateway) for network, gateway in (gateways or {}).items()]
+        self.window = window
+        self.opened = 0
+        self.failed = {}
+
+        self._waiting = []  # hosts not submitted yet
+        self._ahead = []  # hosts submitted, that Fabric hasn't reached yet
+        self._abandoned = set()
+        self._pid = os.getpid()
+        self._pending = {}
+        self._pool = None
+        self._lock = threading.Lock()
+        self._gateway_locks = {}
+
+    def _get_pool(self):
+        # created on first use, so importing a fabfile doesn't start any thread
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self.max_workers)
+
+            return self._pool
+
+    def gateway_for(self, host):
+        """
+        :return: Gateway host string to reach `host` through, `None` to connect directly
+        :rtype: str
+        """
+
+        address = _ip_address(host)
+        if address is not None:
+            for (network, mask), gateway in self.gateways:
+                if address & mask == network:
+                    return gateway
+
+        return env.gateway or None
+
+    @staticmethod
+    def _connect(user, host, port, sock=None):
+        client = ssh.SSHClient()
+
+        known_hosts = env.get('system_known_hosts')
+        if known_hosts:
+            client.load_system_host_keys(known_hosts)
+        if not env.disable_known_hosts:
+            client.load_system_host_keys()
+        if not env.reject_unknown_hosts:
+            client.set_missing_host_key_policy(ssh.AutoAddPolicy())
+
+        password = get_password(user, host, port, login_only=True)
+        client.connect(hostname=host, port=int(port), username=user, password=password, pkey=key_from_env(password),
+                       key_filename=key_filenames(), timeout=env.timeout, allow_agent=not env.no_agent,
+                       look_for_keys=not env.no_keys, sock=sock)
+
+        if env.keepalive:
+            client.get_transport().set_keepalive(env.keepalive)
+
+        return client
+
+    def _gateway_client(self, gateway):
+        key = normalize_to_string(gateway)
+        with self._lock:
+            lock = self._gateway_locks.setdefault(key, threading.Lock())
+
+        # every host behind the gateway waits for the same gateway connection
+        with lock:
+            if key not in connections:
+                self._store(key, self._connect(*normalize(gateway)))
+
+        return dict.__getitem__(connections, key)
+
+    def _store(self, key, client):
+        # Fabric may have connected to the host while `client` was connecting: its connection is kept (and `client`
+        # closed), replacing it would leak it since `disconnect_all` only closes the cached connections. The same goes
+        # for a connection `advance` stopped waiting for, Fabric connects to the host itself
+        with self._lock:
+            if key in connections or key in self._abandoned:
+                client.close()
+                return False
+
+            connections[key] = client
+            return True
+
+    def _open(self, key):
+        try:
+            if key in connections:
+                return
+
+            user, host, port = normalize(key)
+            gateway = self.gateway_for(host)
+            sock = direct_tcpip(self._gateway_client(gateway), host, port) if gateway else None
+
+            if self._store(key, self._connect(user, host, port, sock)):
+                self.opened += 1
+        except Exception as e:
+            self.failed[key] = e
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def submit(self, host_string):
+        """
+        Open a connection to `host_string` in the background, unless one is already open or being opened
+        """
+
+        key = normalize_to_string(host_string)
+        pool = self._get_pool()
+        with self._lock:
+            if key in self._pending or key in connections:
+                return
+            self._pending[key] = pool.apply_async(self._open, (key,))
+
+    def wait(self, timeout=None):
+        """
+        Wait for the connections being opened
+        """
+
+        with self._lock:
+            pending = list(self._pending.values())
+
+        for result in pending:
+            result.wait(timeout)
+
+    def _fill(self):
+        # submits the hosts following the one Fabric is on, up to `window` of them
+        with self._lock:
+            keys = []
+            while self._waiting and (self.window is None or len(self._ahead) < self.window):
+                keys.append(self._waiting.pop(0))
+                self._ahead.append(keys[-1])
+
+        for key in keys:
+            self.submit(key)
+
+    def prewarm(self, hosts):
+        """
+        Hosts generator queueing each host as it is generated, the hosts inside the window are submitted (see
+        `submit`)
+        """
+
+        for host in hosts:
+            with self._lock:
+                self._waiting.append(normalize_to_string(host))
+            self._fill()
+            yield host
+
+    def advance(self, host_string):
+        """
+        Called before a task runs on `host_string`: waits (up to `env.timeout`) for its connection if it is being opened
+        and slides the window to the hosts following it
+        """
+
+        if os.getpid() != self._pid:
+            # Fabric's parallel mode runs the task in a child process, which doesn't have the pool's threads
+            return
+
+        key = normalize_to_string(host_string)
+        with self._lock:
+            if key in self._ahead:
+                del self._ahead[:self._ahead.index(key) + 1]
+            elif key in self._waiting:
+                del self._ahead[:]
+                del self._waiting[:self._waiting.index(key) + 1]
+            pending = self._pending.get(key)
+
+        if pending is not None:
+            pending.wait(env.timeout)
+            if not pending.ready():
+                with self._lock:
+                    self._abandoned.add(key)
+
+        self._fill()
+
+
+_prewarmer = [Prewarmer()]
+
+
+def configure_prewarm(max_workers=10, gateways=None, window=20):
+    """
+    Replace the process-wide `Prewarmer` used by decorators with `prewarm=True`
+
+    :rtype: Prewarmer
+    """
+
+    _prewarmer[0] = Prewarmer(max_workers, gateways, window)
+
+    return _prewarmer[0]
+
+
+def get_prewarmer():
+    """
+    :rtype: Prewarmer
+    """
+
+    return _prewarmer[0]
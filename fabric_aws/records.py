@@ -0,0 +1,111 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+from fabric_aws.addressing import instance_address
+
+RECORD_FIELDS = ('instance_id', 'address', 'private_ip_address', 'ip_address', 'placement', 'state', 'tags')
+
+
+class HostRecord(object):
+    """
+    Compact description of an EC2 instance, holding only what is needed to connect to it
+
+    Unlike `boto.ec2.instance.Instance` it doesn't keep a reference to the parsed response, so the response can be
+    freed as soon as the records are built
+    """
+
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, instance_id=None, address=None, private_ip_address=None, ip_address=None, placement=None,
+                 state=None, tags=None):
+        self.instance_id = instance_id
+        self.address = address
+        self.private_ip_address = private_ip_address
+        self.ip_address = ip_address
+        self.placement = placement
+        self.state = state
+        self.tags = tags
+
+    @classmethod
+    def from_instance(cls, instance, hostname_attribute='public_dns_name', fields=None, tags=None):
+        """
+        Project a `boto.ec2.instance.Instance` into a `HostRecord`
+
+        :param instance: EC2 instance
+        :type instance: boto.ec2.instance.Instance
+        :param hostname_attribute: `boto.ec2.instance.Instance` attribute or `fabric_aws.addressing.AddressResolver` to
+                                   use as `address`
+        :type hostname_attribute: str | AddressResolver
+        :param fields: Fields to fill, see `RECORD_FIELDS`. `None` fills every field
+        :type fields: list[str]
+        :param tags: Tag names to keep, `None` keeps every tag
+        :type tags: list[str]
+        :rtype: HostRecord
+        """
+
+        fields = RECORD_FIELDS if fields is None else fields
+        record = cls()
+
+        if 'instance_id' in fields:
+            record.instance_id = instance.id
+        if 'address' in fields:
+            record.address = instance_address(instance, hostname_attribute)
+        if 'private_ip_address' in fields:
+            record.private_ip_address = instance.private_ip_address
+        if 'ip_address' in fields:
+            record.ip_address = instance.ip_address
+        if 'placement' in fields:
+            record.placement = instance.placement
+        if 'state' in fields:
+            record.state = instance.state
+        if 'tags' in fields:
+            if tags is None:
+                record.tags = dict(instance.tags)
+            else:
+                record.tags = dict((name, instance.tags[name]) for name in tags if name in instance.tags)
+
+        return record
+
+    def to_dict(self):
+        return dict((field, getattr(self, field)) for field in RECORD_FIELDS)
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**values)
+
+    def __eq__(self, other):
+        return isinstance(other, HostRecord) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'HostRecord(%s)' % ', '.join('%s=%r' % (field, getattr(self, field))
+                                            for field in RECORD_FIELDS if getattr(self, field) is not None)
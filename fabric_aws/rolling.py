@@ -0,0 +1,193 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import math
+import time
+from collections import OrderedDict
+
+from fabric.api import abort, execute, parallel, puts
+from fabric.utils import warn
+
+from fabric_aws.api import call, chunks
+
+# AttachInstances and DetachInstances accept up to 20 instance ids
+ATTACH_CHUNK_SIZE = 20
+
+
+def wave_size(batch_size, total):
+    """
+    :param batch_size: Hosts per wave, or a percentage of the hosts (e.g. `'25%'`)
+    :type batch_size: int | str
+    :param total: Number of hosts
+    :type total: int
+    :return: Hosts per wave, at least 1
+    :rtype: int
+    """
+
+    if isinstance(batch_size, basestring) and batch_size.endswith('%'):
+        batch_size = int(math.ceil(total * float(batch_size[:-1]) / 100))
+
+    return max(1, int(batch_size))
+
+
+def plan_waves(members, batch_size):
+    """
+    Split the members of an autoscaling group into waves of `batch_size` spread evenly across availability zones, so a
+    wave never takes down more of a zone than needed. Members without a host (e.g. no public DNS name) are left out
+    with a warning, since Fabric can't run the task on them
+
+    :param members: (instance id, availability zone, host) tuples
+    :type members: list[tuple]
+    :param batch_size: Hosts per wave, or a percentage of the hosts (e.g. `'25%'`)
+    :type batch_size: int | str
+    :return: Waves of (instance id, availability zone, host) tuples
+    :rtype: list[list[tuple]]
+    """
+
+    unreachable = [instance_id for instance_id, _, host in members if not host]
+    if unreachable:
+        warn('Leaving out instances without a host: %s' % ', '.join(unreachable))
+
+    zones = OrderedDict()
+    for member in sorted((member for member in members if member[2]), key=lambda member: member[1]):
+        zones.setdefault(member[1], []).append(member)
+
+    # take a host from each zone in turn
+    interleaved = []
+    while zones:
+        for zone in list(zones):
+            interleaved.append(zones[zone].pop(0))
+            if not zones[zone]:
+                del zones[zone]
+
+    size = wave_size(batch_size, len(interleaved))
+
+    return [interleaved[start:start + size] for start in range(0, len(interleaved), size)]
+
+
+def _wait_for_group(region, autoscaling_group_name, instance_ids, done, timeout, interval=5):
+    # polls the group until `done(instances by id)` holds
+    deadline = time.time() + timeout
+    while True:
+        groups = call('autoscale', region, 'get_all_groups', names=[autoscaling_group_name])
+        members = dict((instance.instance_id, instance) for instance in groups[0].instances) if groups else {}
+        if done(members):
+            return
+
+        if time.time() >= deadline:
+            abort('Timed out waiting for instances %s of autoscaling group %s' %
+                  (', '.join(instance_ids), autoscaling_group_name))
+
+        time.sleep(interval)
+
+
+def _in_service(instance_ids):
+    return lambda members: all(instance_id in members and members[instance_id].lifecycle_state == 'InService' and
+                               members[instance_id].health_status == 'Healthy' for instance_id in instance_ids)
+
+
+def roll(task, waves, region, autoscaling_group_name, args=(), kwargs=None, pool_size=None, health_gate=None,
+         in_service_timeout=None, detach=False, suspend_processes=None, timeout=600):
+    """
+    Execute `task` wave after wave, the hosts of a wave in parallel
+
+    :param task: Fabric task
+    :param waves: Waves of (instance id, availability zone, host) tuples, see `plan_waves`
+    :type waves: list[list[tuple]]
+    :param region: AWS region
+    :type region: str
+    :param autoscaling_group_name: Autoscaling group name
+    :type autoscaling_group_name: str
+    :param args: Arguments of `task`
+    :param kwargs: Keyword arguments of `task`
+    :param pool_size: Hosts of a wave running `task` at once, `None` uses Fabric's default
+    :type pool_size: int
+    :param health_gate: Called with the hosts of a wave and their results once it is done, the rollout is aborted
+                        unless it returns True
+    :type health_gate: callable
+    :param in_service_timeout: Wait up to this many seconds for the instances of a wave to be InService and Healthy in
+                               the group before the next wave, `None` doesn't wait
+    :type in_service_timeout: float
+    :param detach: Detach the instances of a wave from the group (decrementing its capacity, so they aren't replaced)
+                   while `task` runs on them, and attach them back afterwards
+    :type detach: bool
+    :param suspend_processes: Autoscaling processes to suspend while a wave runs, `True` suspends every process
+    :type suspend_processes: list[str] | bool
+    :param timeout: Seconds to wait for instances to be detached
+    :type timeout: float
+    :return: Results of `task` by host
+    :rtype: dict
+    """
+
+    kwargs = kwargs or {}
+    wave_task = parallel(pool_size=pool_size)(task)
+    processes = None if suspend_processes is True else suspend_processes
+
+    results = {}
+    for index, wave in enumerate(waves):
+        instance_ids = [instance_id for instance_id, _, _ in wave]
+        hosts = [host for _, _, host in wave]
+        puts('Wave %d/%d: %s' % (index + 1, len(waves), ', '.join(hosts)))
+
+        if suspend_processes:
+            call('autoscale', region, 'suspend_processes', autoscaling_group_name, processes)
+
+        try:
+            # only the chunks actually detached are attached back, even when detaching fails or times out
+            detached = []
+            try:
+                if detach:
+                    for chunk in chunks(instance_ids, ATTACH_CHUNK_SIZE):
+                        call('autoscale', region, 'detach_instances', autoscaling_group_name, chunk,
+                             decrement_capacity=True)
+                        detached.append(chunk)
+                    _wait_for_group(region, autoscaling_group_name, instance_ids,
+                                    lambda members: not any(instance_id in members for instance_id in instance_ids),
+                                    timeout)
+
+                wave_results = execute(wave_task, *args, hosts=hosts, **kwargs)
+            finally:
+                for chunk in detached:
+                    call('autoscale', region, 'attach_instances', autoscaling_group_name, chunk)
+        finally:
+            if suspend_processes:
+                call('autoscale', region, 'resume_processes', autoscaling_group_name, processes)
+
+        results.update(wave_results)
+
+        if in_service_timeout is not None:
+            _wait_for_group(region, autoscaling_group_name, instance_ids, _in_service(instance_ids),
+                            in_service_timeout)
+
+        if health_gate is not None and not health_gate(hosts, wave_results):
+            abort('Health gate failed after wave %d/%d, %d waves left' %
+                  (index + 1, len(waves), len(waves) - index - 1))
+
+    return results
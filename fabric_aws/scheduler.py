@@ -0,0 +1,244 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import random
+import sys
+import threading
+import time
+
+from fabric_aws.instrumentation import is_throttling_error, record_call
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second, holding up to `capacity` tokens
+
+    The rate adapts to throttling: it is halved (down to `min_rate`) on every throttling error and grows back by 5% of
+    the configured rate on every successful call
+    """
+
+    def __init__(self, rate, capacity, min_rate=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """
+        Take a token, waiting for one if the bucket is empty
+        """
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class _Flight(object):
+    def __init__(self):
+        self.result = None
+        self.exc_info = None
+        self.done = threading.Event()
+
+
+class Scheduler(object):
+    """
+    Central scheduler for AWS calls:
+
+    * Calls are rate limited by a `TokenBucket` per (service, region)
+    * Throttling errors are retried up to `max_attempts` times with full-jitter exponential backoff
+    * Identical concurrent calls (same key) share a single in-flight request
+    """
+
+    def __init__(self, rate=10, burst=20, rates=None, max_attempts=5, base_delay=0.5, max_delay=20):
+        """
+        :param rate: Calls per second allowed per (service, region)
+        :type rate: float
+        :param burst: Calls allowed at once before `rate` applies
+        :type burst: int
+        :param rates: Per service (rate, burst) overrides, e.g. `{'autoscale': (2, 5)}`
+        :type rates: dict
+        :param max_attempts: Attempts per call when throttled
+        :type max_attempts: int
+        :param base_delay: Backoff delay of the first retry, in seconds. Doubles on every retry
+        :type base_delay: float
+        :param max_delay: Maximum backoff delay, in seconds
+        :type max_delay: float
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self.rates = rates or {}
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._buckets = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, service, region):
+        with self._lock:
+            bucket = self._buckets.get((service, region))
+            if bucket is None:
+                rate, burst = self.rates.get(service, (self.rate, self.burst))
+                bucket = self._buckets[(service, region)] = TokenBucket(rate, burst)
+
+            return bucket
+
+    def backoff(self, attempt):
+        """
+        :return: Seconds to wait before retry number `attempt` (starting at 1)
+        :rtype: float
+        """
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _run(self, service, region, operation, function):
+        bucket = self.bucket(service, region)
+        throttled = 0
+        start = time.time()
+
+        for attempt in range(1, self.max_attempts + 1):
+            bucket.acquire()
+
+            try:
+                result = function()
+            except Exception as e:
+                if not is_throttling_error(e):
+                    record_call(service, region, operation, time.time() - start, attempt, e, throttled=throttled)
+                    raise
+
+                throttled += 1
+                bucket.throttled()
+
+                if attempt == self.max_attempts:
+                    record_call(service, region, operation, time.time() - start, attempt, e, throttled=throttled)
+                    raise
+
+                time.sleep(self.backoff(attempt))
+                continue
+
+            bucket.succeeded()
+            record_call(service, region, operation, time.time() - start, attempt, result=result, throttled=throttled)
+
+            return result
+
+    def execute(self, service, region, operation, function, key=None):
+        """
+        Run `function` (an AWS call) under the rate limit of (`service`, `region`), retrying it when throttled
+
+        :param service: AWS service, e.g. `ec2`
+        :type service: str
+        :param region: AWS region
+        :type region: str
+        :param operation: Operation name, for instrumentation
+        :type operation: str
+        :param function: Makes the AWS call
+        :type function: callable
+        :param key: Calls running concurrently with the same key share one request, `None` disables coalescing
+        :type key: str
+        :return: `function`'s result
+        """
+
+        if key is None:
+            return self._run(service, region, operation, function)
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.exc_info is not None:
+                raise flight.exc_info[0], flight.exc_info[1], flight.exc_info[2]
+            return flight.result
+
+        try:
+            flight.result = self._run(service, region, operation, function)
+        except Exception:
+            flight.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+        return flight.result
+
+
+_scheduler = Scheduler()
+
+
+def get_scheduler():
+    """
+    :return: The process-wide AWS call scheduler
+    :rtype: Scheduler
+    """
+
+    return _scheduler
+
+
+def configure_scheduler(*args, **kwargs):
+    """
+    Replace the process-wide AWS call scheduler. Arguments are passed-through to `Scheduler`
+
+    :return: The new process-wide scheduler
+    :rtype: Scheduler
+    """
+
+    global _scheduler
+    _scheduler = Scheduler(*args, **kwargs)
+
+    return _scheduler
@@ -0,0 +1,164 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import threading
+import time
+from datetime import datetime
+
+from fabric_aws.api import call
+from fabric_aws.inventory import get_inventory
+
+NESTED_STACK_RESOURCE_TYPE = 'AWS::CloudFormation::Stack'
+
+
+class StackIndex(object):
+    """
+    Process-wide index of Cloudformation stack resources
+
+    All resources of a stack are listed at once (`list_stack_resources`), so resolving any number of logical resources
+    of a stack costs a single Cloudformation call. Logical ids may be dotted paths (e.g. `Backend.AutoScalingGroup`)
+    resolved through nested stacks, which are indexed the same way.
+
+    An index older than `revalidate_after` seconds is checked against the stack's most recent event (boto doesn't
+    expose the stack's LastUpdatedTime) and rebuilt only if the stack changed since it was built.
+    """
+
+    def __init__(self, revalidate_after=60):
+        """
+        :param revalidate_after: Seconds an index is trusted before checking the stack for updates
+        :type revalidate_after: float
+        """
+
+        self.revalidate_after = revalidate_after
+        self._stacks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _list_resources(region, cfn_stack_name):
+        resources = {}
+        next_token = None
+        while True:
+            summaries = call('cloudformation', region, 'list_stack_resources', cfn_stack_name, next_token=next_token)
+            for summary in summaries:
+                resources[summary.logical_resource_id] = (summary.physical_resource_id, summary.resource_type)
+
+            next_token = getattr(summaries, 'next_token', None)
+            if not next_token:
+                break
+
+        return resources
+
+    @staticmethod
+    def _changed_since(region, cfn_stack_name, built_at):
+        # events are returned most recent first
+        for event in call('cloudformation', region, 'describe_stack_events', cfn_stack_name):
+            return event.timestamp >= built_at
+
+        return False
+
+    def resources(self, region, cfn_stack_name):
+        """
+        Return the resources of a stack
+
+        :param region: AWS region
+        :type region: str
+        :param cfn_stack_name: Cloudformation stack name or id
+        :type cfn_stack_name: str
+        :return: Mapping of logical resource id to (physical resource id, resource type)
+        :rtype: dict
+        """
+
+        inventory = get_inventory()
+        if inventory is not None:
+            return inventory.stack_resources(region, cfn_stack_name)
+
+        key = (region, cfn_stack_name)
+
+        with self._lock:
+            entry = self._stacks.get(key)
+
+        if entry is not None:
+            resources, built_at, checked_at = entry
+            if time.time() - checked_at <= self.revalidate_after:
+                return resources
+
+            if not self._changed_since(region, cfn_stack_name, built_at):
+                with self._lock:
+                    self._stacks[key] = (resources, built_at, time.time())
+                return resources
+
+        built_at = datetime.utcnow().replace(microsecond=0)
+        resources = self._list_resources(region, cfn_stack_name)
+
+        with self._lock:
+            self._stacks[key] = (resources, built_at, time.time())
+
+        return resources
+
+    def logical_to_physical(self, region, cfn_stack_name, logical_resource_id):
+        """
+        Convert cloudformation logical resource name to physical resource name
+
+        :param region: AWS region
+        :type region: str
+        :param cfn_stack_name: Cloudformation stack name
+        :type cfn_stack_name: str
+        :param logical_resource_id: Cloudformation logical resource id, nested stacks are separated with dots
+        :type logical_resource_id: str
+        :return: Physical resource id
+        :rtype: str
+        """
+
+        stack_name = cfn_stack_name
+        path = logical_resource_id.split('.')
+
+        for index, logical_id in enumerate(path):
+            resources = self.resources(region, stack_name)
+            if logical_id not in resources:
+                raise LookupError('Logical resource %s not found in stack %s' % (logical_id, stack_name))
+
+            physical_resource_id, resource_type = resources[logical_id]
+            if index < len(path) - 1 and resource_type != NESTED_STACK_RESOURCE_TYPE:
+                raise LookupError('Logical resource %s in stack %s is not a nested stack' % (logical_id, stack_name))
+
+            stack_name = physical_resource_id
+
+        return physical_resource_id
+
+    def invalidate(self, region, cfn_stack_name):
+        with self._lock:
+            self._stacks.pop((region, cfn_stack_name), None)
+
+    def clear(self):
+        with self._lock:
+            self._stacks.clear()
+
+
+stack_index = StackIndex()
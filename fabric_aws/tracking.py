@@ -0,0 +1,249 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from __future__ import absolute_import
+
+import threading
+from collections import OrderedDict
+
+from fabric_aws.api import call, MAX_FILTER_VALUES, MAX_STATUS_INSTANCE_IDS
+
+# scaling activities that won't change the group's membership anymore
+FINISHED_ACTIVITY_STATUSES = ('Successful', 'Failed', 'Cancelled')
+
+
+class InstanceTracker(object):
+    """
+    Keeps the instances of a changing set of instance ids up to date across refreshes: instances that joined the set
+    are described, instances that left it or were terminated are dropped, and the others are kept as they are.
+    Subclasses find out which instance ids are members and which ones changed since the last refresh
+    """
+
+    def __init__(self, region):
+        """
+        :param region: AWS region
+        :type region: str
+        """
+
+        self.region = region
+        self.described = 0
+        self._instances = None
+        self._lock = threading.Lock()
+
+    def _delta(self, instances):
+        """
+        :param instances: Instances of the last refresh by id, `None` before the first refresh
+        :type instances: OrderedDict
+        :return: (member instance ids, ids to describe again), `None` when nothing changed
+        :rtype: tuple
+        """
+
+        raise NotImplementedError()
+
+    def _describe(self, instance_ids):
+        # an `instance-id` filter ignores instances that are already gone, where `instance_ids` would fail the call
+        described = {}
+        for start in range(0, len(instance_ids), MAX_FILTER_VALUES):
+            reservations = call('ec2', self.region, 'get_all_instances',
+                                filters={'instance-id': instance_ids[start:start + MAX_FILTER_VALUES]})
+            for reservation in reservations:
+                for instance in reservation.instances:
+                    described[instance.id] = instance
+
+        self.described += len(described)
+
+        return described
+
+    def refresh(self):
+        """
+        Bring the tracked instances up to date
+        """
+
+        with self._lock:
+            delta = self._delta(self._instances)
+            if delta is None:
+                return
+
+            members, changed = delta
+            previous = self._instances or {}
+            stale = set(changed)
+            described = self._describe([instance_id for instance_id in members
+                                        if instance_id not in previous or instance_id in stale])
+
+            instances = OrderedDict()
+            for instance_id in members:
+                if instance_id in previous and instance_id not in stale:
+                    instance = previous[instance_id]
+                else:
+                    instance = described.get(instance_id)
+
+                if instance is not None and instance.state != 'terminated':
+                    instances[instance_id] = instance
+
+            self._instances = instances
+
+    def instances(self):
+        """
+        Refresh and return the tracked instances
+
+        :rtype: list[boto.ec2.instance.Instance]
+        """
+
+        self.refresh()
+
+        return list(self._instances.values())
+
+
+class AutoscalingGroupTracker(InstanceTracker):
+    """
+    Tracks the instances of an autoscaling group. A refresh costs a single `get_all_activities` call while the group's
+    most recent scaling activity hasn't changed, otherwise the group's membership is read (`get_all_groups`) and only
+    the instances that joined the group are described. Members that weren't running when last described are described
+    again on every refresh
+    """
+
+    def __init__(self, region, autoscaling_group_name):
+        """
+        :param region: AWS region
+        :type region: str
+        :param autoscaling_group_name: Autoscaling group name
+        :type autoscaling_group_name: str
+        """
+
+        super(AutoscalingGroupTracker, self).__init__(region)
+        self.autoscaling_group_name = autoscaling_group_name
+        self._last_activity = None
+
+    def _delta(self, instances):
+        # activities are returned most recent first
+        activities = call('autoscale', self.region, 'get_all_activities', self.autoscaling_group_name, max_records=1)
+        last_activity = (activities[0].activity_id, activities[0].status_code) if activities else None
+
+        # members that weren't running yet (e.g. still pending, without addresses) are described again until they are
+        unsettled = [instance_id for instance_id, instance in (instances or {}).items() if instance.state != 'running']
+
+        if instances is not None and last_activity == self._last_activity and \
+                (last_activity is None or last_activity[1] in FINISHED_ACTIVITY_STATUSES):
+            return (list(instances), unsettled) if unsettled else None
+
+        groups = call('autoscale', self.region, 'get_all_groups', names=[self.autoscaling_group_name])
+        if not groups:
+            raise LookupError('Autoscaling group not found: %s' % self.autoscaling_group_name)
+
+        self._last_activity = last_activity
+
+        return [instance.instance_id for instance in groups[0].instances], unsettled
+
+
+class InstanceIdsTracker(InstanceTracker):
+    """
+    Tracks a fixed list of instances. A refresh costs a single `get_all_instance_status` call, and only the instances
+    whose state changed since the last refresh (e.g. stopped instances that got a new public address once started
+    again) are described
+    """
+
+    def __init__(self, region, instance_ids):
+        """
+        :param region: AWS region
+        :type region: str
+        :param instance_ids: Instance ids
+        :type instance_ids: list[str]
+        """
+
+        super(InstanceIdsTracker, self).__init__(region)
+        self.instance_ids = list(instance_ids)
+
+    def _delta(self, instances):
+        if instances is None:
+            return self.instance_ids, ()
+
+        states = {}
+        try:
+            for start in range(0, len(self.instance_ids), MAX_STATUS_INSTANCE_IDS):
+                for status in call('ec2', self.region, 'get_all_instance_status',
+                                   instance_ids=self.instance_ids[start:start + MAX_STATUS_INSTANCE_IDS],
+                                   include_all_instances=True):
+                    states[status.id] = status.state_name
+        except Exception as e:
+            if getattr(e, 'error_code', None) != 'InvalidInstanceID.NotFound':
+                raise
+
+            # some instances are gone for good, describe the ones that are left
+            return self.instance_ids, self.instance_ids
+
+        members = [instance_id for instance_id in self.instance_ids
+                   if states.get(instance_id, 'terminated') != 'terminated']
+        changed = [instance_id for instance_id in members
+                   if instance_id in instances and instances[instance_id].state != states[instance_id]]
+        if not changed and members == list(instances):
+            return None
+
+        return members, changed
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def _get_tracker(key, create):
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = create()
+
+    return tracker
+
+
+def autoscaling_group_tracker(region, autoscaling_group_name):
+    """
+    Return the process-wide tracker of autoscaling group `autoscaling_group_name`
+
+    :rtype: AutoscalingGroupTracker
+    """
+
+    return _get_tracker(('autoscaling_group', region, autoscaling_group_name),
+                        lambda: AutoscalingGroupTracker(region, autoscaling_group_name))
+
+
+def instance_ids_tracker(region, instance_ids):
+    """
+    Return the process-wide tracker of `instance_ids`
+
+    :rtype: InstanceIdsTracker
+    """
+
+    return _get_tracker(('instance_ids', region, tuple(instance_ids)), lambda: InstanceIdsTracker(region, instance_ids))
+
+
+def reset_trackers():
+    """
+    Forget every tracker, the next refresh of each autoscaling group or instance list describes all of its instances
+    """
+
+    with _trackers_lock:
+        _trackers.clear()
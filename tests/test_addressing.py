@@ -0,0 +1,104 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import AddressResolver, ec2_generator, ec2_record_generator
+from fabric_aws.addressing import DnsCache
+from fabric_aws.cache import make_key
+from fabric_aws.connections import reset_connections
+import socket
+import boto.ec2
+import unittest
+import mock
+
+
+def mock_instance(instance_id, public_dns_name='', ip_address=None, private_ip_address=None, vpc_id=None,
+                  subnet_id=None, **tags):
+    return mock.Mock(id=instance_id, public_dns_name=public_dns_name, ip_address=ip_address,
+                     private_ip_address=private_ip_address, vpc_id=vpc_id, subnet_id=subnet_id, tags=tags)
+
+
+INSTANCES = [
+    mock_instance('i-00000001', 'ec2-54-0-0-1.compute-1.amazonaws.com', '54.0.0.1', '10.0.0.1'),
+    mock_instance('i-00000002', '', None, '10.1.0.2', vpc_id='vpc-private', subnet_id='subnet-a'),
+    mock_instance('i-00000003', '', '54.0.0.3', '10.1.0.3', vpc_id='vpc-private', subnet_id='subnet-public'),
+    mock_instance('i-00000004', 'ec2-54-0-0-4.compute-1.amazonaws.com', '54.0.0.4', '10.0.0.4',
+                  ssh_host='jump-4.example.com'),
+    mock_instance('i-00000005'),
+]
+
+
+class TestAddressResolver(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
+    def test_addresses(self):
+        resolver = AddressResolver(rules={'vpc-private': ['private_ip_address'], 'subnet-public': ['ip_address']},
+                                   tag='ssh_host')
+
+        self.assertListEqual(['ec2-54-0-0-1.compute-1.amazonaws.com', '10.1.0.2', '54.0.0.3', 'jump-4.example.com',
+                              None], resolver.addresses(INSTANCES))
+        self.assertListEqual(['54.0.0.1', None, '54.0.0.3', '54.0.0.4', None],
+                             AddressResolver(['ip_address']).addresses(INSTANCES))
+        self.assertListEqual(['ec2-54-0-0-1.compute-1.amazonaws.com', '10.1.0.2', '54.0.0.3',
+                              'ec2-54-0-0-4.compute-1.amazonaws.com', None], AddressResolver().addresses(INSTANCES))
+
+    def test_resolve_dns(self):
+        addresses = {'ec2-54-0-0-1.compute-1.amazonaws.com': '54.0.0.1'}
+
+        def gethostbyname(name):
+            if name not in addresses:
+                raise socket.gaierror('Name or service not known')
+            return addresses[name]
+
+        resolver = AddressResolver(tag='ssh_host', resolve_dns=True)
+        with mock.patch('socket.gethostbyname', side_effect=gethostbyname) as mock_gethostbyname, \
+                mock.patch('fabric_aws.addressing.dns_cache', DnsCache()):
+            self.assertListEqual(['54.0.0.1', '10.1.0.2', '54.0.0.3', '54.0.0.4', None], resolver.addresses(INSTANCES))
+            resolver.addresses(INSTANCES)
+
+        # every name is resolved once, failures included
+        self.assertEqual(3, mock_gethostbyname.call_count)
+
+    def test_generators(self):
+        mock_ec2_connection = mock.MagicMock(**{'get_all_instances.return_value': [mock.Mock(instances=INSTANCES)]})
+        mock_ec2 = mock.MagicMock(**{'connect_to_region.return_value': mock_ec2_connection})
+        resolver = AddressResolver(rules={'vpc-private': ['private_ip_address']})
+
+        with mock.patch('boto.ec2', mock_ec2):
+            self.assertListEqual(['ec2-54-0-0-1.compute-1.amazonaws.com', '10.1.0.2', '10.1.0.3',
+                                  'ec2-54-0-0-4.compute-1.amazonaws.com'],
+                                 list(ec2_generator('region', hostname_attribute=resolver)))
+            self.assertListEqual(['ec2-54-0-0-1.compute-1.amazonaws.com', '10.1.0.2', '10.1.0.3',
+                                  'ec2-54-0-0-4.compute-1.amazonaws.com', None],
+                                 [record.address for record in ec2_record_generator('region',
+                                                                                    hostname_attribute=resolver)])
+
+        same = AddressResolver(rules={'vpc-private': ['private_ip_address']})
+        self.assertEqual(make_key('ec2', 'region', (), {}, same), make_key('ec2', 'region', (), {}, resolver))
+        self.assertNotEqual(make_key('ec2', 'region', (), {}, AddressResolver()),
+                            make_key('ec2', 'region', (), {}, resolver))
@@ -0,0 +1,218 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import *
+from fabric_aws import _batch_options
+from fabric_aws.batch import BatchResolver
+from fabric_aws.filters import compile_filters, instance_matches, is_supported_filter, normalize_filters
+from fabric_aws.connections import reset_connections
+from fabric_aws.stacks import stack_index
+from fabric.api import task
+import boto.cloudformation
+import boto.ec2
+import unittest
+import mock
+from test_boto_integration import mock_environment
+
+
+def mock_instance(instance_id, name, state='running', autoscaling_group_name=None):
+    tags = {'Name': name}
+    if autoscaling_group_name is not None:
+        tags['aws:autoscaling:groupName'] = autoscaling_group_name
+
+    return mock.Mock(id=instance_id, public_dns_name=instance_id + '.example.com', state=state, tags=tags)
+
+
+def mock_batch_environment():
+    instances = [mock_instance('i-00000001', 'web'),
+                 mock_instance('i-00000002', 'web'),
+                 mock_instance('i-00000003', 'db', autoscaling_group_name='my-awesome-physical-resource'),
+                 mock_instance('i-00000004', 'worker', state='stopped',
+                               autoscaling_group_name='my-awesome-physical-resource')]
+
+    def get_all_instances(instance_ids=None, filters=None):
+        filters = dict((name, values) for name, values in normalize_filters(filters).items()
+                       if is_supported_filter(name))
+        if instance_ids:
+            filters['instance-id'] = instance_ids
+        matchers = compile_filters(filters)
+        return [mock.Mock(instances=[instance for instance in instances if instance_matches(instance, matchers)])]
+
+    mock_cloudformation, mock_ec2 = mock_environment()
+    mock_ec2_connection = mock_ec2.connect_to_region.return_value
+    mock_ec2_connection.get_all_instances.side_effect = get_all_instances
+
+    group = mock.Mock(instances=[mock.Mock(instance_id='i-00000003'), mock.Mock(instance_id='i-00000004')])
+    group.name = 'my-awesome-physical-resource'
+    mock_autoscale_connection = mock_ec2.autoscale.connect_to_region.return_value
+    mock_autoscale_connection.get_all_groups.return_value = [group]
+
+    return mock_cloudformation, mock_ec2
+
+
+class TestBatchResolver(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+        stack_index.clear()
+
+    def test_merged_filters(self):
+        mock_cloudformation, mock_ec2 = mock_batch_environment()
+        resolver = BatchResolver()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            web = resolver.submit_ec2('region', filters={'tag:Name': 'web'})
+            db = resolver.submit_ec2('region', filters={'tag:Name': 'db'})
+            running = resolver.submit_ec2('region', filters={'tag:Name': 'w*', 'instance-state-name': 'running'})
+            by_id = resolver.submit_ec2('region', ['i-00000001', 'i-00000004'])
+
+            self.assertListEqual(['i-00000001.example.com', 'i-00000002.example.com'], web.result())
+            self.assertListEqual(['i-00000003.example.com'], db.result())
+            self.assertListEqual(['i-00000001.example.com', 'i-00000002.example.com'], running.result())
+            self.assertListEqual(['i-00000001.example.com', 'i-00000004.example.com'], by_id.result())
+
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        self.assertEqual(3, mock_ec2_connection.get_all_instances.call_count)
+        mock_ec2_connection.get_all_instances.assert_any_call(filters={'tag:Name': ['db', 'web']})
+
+    def test_unsupported_filter_resolved_alone(self):
+        mock_cloudformation, mock_ec2 = mock_batch_environment()
+        resolver = BatchResolver()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            ticket = resolver.submit_ec2('region', filters={'tag:Name': 'web', 'architecture': 'x86_64'})
+            ticket.result()
+
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        mock_ec2_connection.get_all_instances.assert_called_once_with(
+            instance_ids=None, filters={'tag:Name': ['web'], 'architecture': ['x86_64']})
+
+    def test_decorators(self):
+        mock_cloudformation, mock_ec2 = mock_batch_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            @ec2('region', filters={'tag:Name': 'web'}, batch=True)
+            @task
+            def dummy1():
+                pass
+
+            @autoscaling_group('region', 'my-awesome-physical-resource', strategy='tags', batch=True)
+            @task
+            def dummy2():
+                pass
+
+            @cloudformation_autoscaling_group('region', 'stack-name', 'logical-autoscaling-group-name', strategy='tags',
+                                              batch=True)
+            @task
+            def dummy3():
+                pass
+
+            self.assertFalse(mock_ec2.connect_to_region.called)
+
+            self.assertListEqual(['i-00000001.example.com', 'i-00000002.example.com'], list(dummy1.hosts))
+            # the tag lookup leaves the stopped i-00000004 out
+            self.assertListEqual(['i-00000003.example.com'], list(dummy2.hosts))
+            self.assertListEqual(['i-00000003.example.com'], list(dummy3.hosts))
+
+        mock_autoscale_connection = mock_ec2.autoscale.connect_to_region.return_value
+        self.assertFalse(mock_autoscale_connection.get_all_groups.called)
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        self.assertEqual(2, mock_ec2_connection.get_all_instances.call_count)
+
+    def test_autoscaling_group_strategies(self):
+        mock_cloudformation, mock_ec2 = mock_batch_environment()
+        resolver = BatchResolver()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            groups = resolver.submit_autoscaling_group('region', 'my-awesome-physical-resource', strategy='groups')
+            instance_ids = resolver.submit_autoscaling_group('region', 'my-awesome-physical-resource',
+                                                             hostname_attribute='id')
+
+            self.assertListEqual(['i-00000003.example.com', 'i-00000004.example.com'], groups.result())
+            self.assertListEqual(['i-00000003', 'i-00000004'], instance_ids.result())
+
+        mock_autoscale_connection = mock_ec2.autoscale.connect_to_region.return_value
+        mock_autoscale_connection.get_all_groups.assert_called_once_with(names=['my-awesome-physical-resource'],
+                                                                         next_token=None)
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        mock_ec2_connection.get_all_instances.assert_called_once_with(
+            filters={'instance-id': ['i-00000003', 'i-00000004']})
+
+    def test_failures_are_isolated(self):
+        mock_cloudformation, mock_ec2 = mock_batch_environment()
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        get_all_instances = mock_ec2_connection.get_all_instances.side_effect
+
+        def failing_get_all_instances(instance_ids=None, filters=None):
+            if filters and 'instance-type' in filters:
+                raise ValueError('get_all_instances failed')
+            return get_all_instances(instance_ids, filters)
+
+        mock_ec2_connection.get_all_instances.side_effect = failing_get_all_instances
+        resolver = BatchResolver()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            missing = resolver.submit_cloudformation_autoscaling_group('region', 'stack-name', 'missing-resource')
+            failing = resolver.submit_ec2('region', filters={'instance-type': 'm3.medium'})
+            web = resolver.submit_ec2('region', filters={'tag:Name': 'web'})
+            group = resolver.submit_cloudformation_autoscaling_group('region', 'stack-name',
+                                                                     'logical-autoscaling-group-name')
+
+            self.assertRaises(LookupError, missing.result)
+            self.assertRaises(ValueError, failing.result)
+            self.assertListEqual(['i-00000001.example.com', 'i-00000002.example.com'], web.result())
+            self.assertListEqual(['i-00000003.example.com', 'i-00000004.example.com'], group.result())
+
+    def test_filter_values_chunked(self):
+        mock_cloudformation, mock_ec2 = mock_batch_environment()
+        group = mock.Mock(instances=[mock.Mock(instance_id='i-%08d' % index) for index in range(1, 501)])
+        group.name = 'my-awesome-physical-resource'
+        mock_autoscale_connection = mock_ec2.autoscale.connect_to_region.return_value
+        mock_autoscale_connection.get_all_groups.return_value = [group]
+        resolver = BatchResolver()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            ticket = resolver.submit_autoscaling_group('region', 'my-awesome-physical-resource', strategy='groups')
+
+            self.assertListEqual(['i-00000001.example.com', 'i-00000002.example.com', 'i-00000003.example.com',
+                                  'i-00000004.example.com'], ticket.result())
+
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        self.assertListEqual([200, 200, 100], [len(call[1]['filters']['instance-id'])
+                                               for call in mock_ec2_connection.get_all_instances.call_args_list])
+
+    def test_unsupported_options(self):
+        self.assertRaises(ValueError, ec2, 'region', filters={'tag:Name': 'web'}, batch=True, cache_ttl=60)
+        self.assertRaises(ValueError, ec2, 'region', filters={'tag:Name': 'web'}, batch=True, page_size=1000)
+        self.assertRaises(ValueError, autoscaling_group, 'region', 'my-awesome-physical-resource', batch=True,
+                          healthy=True)
+        self.assertRaises(ValueError, cloudformation_autoscaling_group, 'region', 'stack-name',
+                          'logical-autoscaling-group-name', batch=True, force_refresh=True)
+
+        # options left to their default are dropped
+        options = _batch_options('ec2', {'filters': {'tag:Name': 'web'}, 'cache_ttl': None, 'healthy': False})
+        self.assertDictEqual({'filters': {'tag:Name': 'web'}}, options)
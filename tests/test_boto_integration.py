@@ -26,7 +26,11 @@
 # those of the authors and should not be interpreted as representing official
 # policies, either expressed or implied, of DoAT
 
-from fabric_aws import autoscaling_group_instance_ids, cloudformation_logical_to_physical, ec2_generator
+from fabric_aws import autoscaling_group_instance_ids, cloudformation_logical_to_physical, ec2_generator, \
+    autoscaling_group_generator
+from fabric_aws.connections import reset_connections
+import boto.cloudformation
+import boto.ec2
 import unittest
 import mock
 
@@ -60,7 +64,12 @@ def mock_environment():
                     }
                 }
             }
-        }
+        },
+        'list_stack_resources.return_value': mock.MagicMock(next_token=None, __iter__=lambda self: iter([
+            mock.Mock(logical_resource_id='logical-autoscaling-group-name',
+                      physical_resource_id='my-awesome-physical-resource',
+                      resource_type='AWS::AutoScaling::AutoScalingGroup')
+        ]))
     })
     mock_cloudformation = mock.MagicMock(**{'connect_to_region.return_value': mock_cloudformation_connection})
 
@@ -68,6 +77,9 @@ def mock_environment():
 
 
 class TestBotoIntegration(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
     def test_autoscaling_group_instances(self):
         mock_cloudformation, mock_ec2 = mock_environment()
 
@@ -116,3 +128,64 @@ class TestBotoIntegration(unittest.TestCase):
             ['a.a.a', 'b.b.b', 'c.c.c', 'd.d.d'],
             instance_hosts
         )
+
+    def test_ec2_generator_paginated(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        first_page, second_page = mock_ec2_connection.get_all_instances.return_value
+        mock_ec2_connection.get_all_reservations.side_effect = [
+            mock.MagicMock(next_token='token', __iter__=lambda self: iter([first_page])),
+            mock.MagicMock(next_token=None, __iter__=lambda self: iter([second_page]))
+        ]
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            hosts = ec2_generator('us-east-1', filters={'tag:Name': 'web'}, page_size=2)
+
+            self.assertListEqual(['a.a.a', 'b.b.b'], [next(hosts), next(hosts)])
+            self.assertEqual(1, mock_ec2_connection.get_all_reservations.call_count)
+
+            self.assertListEqual(['c.c.c', 'd.d.d'], list(hosts))
+
+        self.assertListEqual([mock.call(filters={'tag:Name': 'web'}, max_results=2, next_token=None),
+                              mock.call(filters={'tag:Name': 'web'}, max_results=2, next_token='token')],
+                             mock_ec2_connection.get_all_reservations.call_args_list)
+        self.assertFalse(mock_ec2_connection.get_all_instances.called)
+
+    def test_autoscaling_group_generator_tags_strategy(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            hosts = list(autoscaling_group_generator('us-east-1', 'dummy-asg-name', strategy='tags'))
+
+        self.assertFalse(mock_ec2.autoscale.connect_to_region.called)
+
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        mock_ec2_connection.get_all_instances.assert_called_once_with(filters={
+            'tag:aws:autoscaling:groupName': ['dummy-asg-name'],
+            'instance-state-name': ['pending', 'running']
+        })
+
+        self.assertListEqual(['a.a.a', 'b.b.b', 'c.c.c', 'd.d.d'], hosts)
+
+    def test_autoscaling_group_generator_default_strategy(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            hosts = list(autoscaling_group_generator('us-east-1', 'dummy-asg-name'))
+
+        mock_ec2.autoscale.connect_to_region.return_value.get_all_groups.assert_called_once_with(
+            names=['dummy-asg-name'])
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        mock_ec2_connection.get_all_instances.assert_called_once_with(
+            instance_ids=['i-00000001', 'i-00000002', 'i-00000003', 'i-00000004'])
+
+        self.assertListEqual(['a.a.a', 'b.b.b', 'c.c.c', 'd.d.d'], hosts)
+
+    def test_autoscaling_group_generator_instance_ids(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            hosts = list(autoscaling_group_generator('us-east-1', 'dummy-asg-name', hostname_attribute='id'))
+
+        self.assertFalse(mock_ec2.connect_to_region.called)
+        self.assertListEqual(['i-00000001', 'i-00000002', 'i-00000003', 'i-00000004'], hosts)
@@ -0,0 +1,125 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import ec2_generator
+from fabric_aws.cache import ResolutionCache, make_key, configure_cache
+from fabric_aws.connections import reset_connections
+import shutil
+import tempfile
+import time
+import boto.cloudformation
+import boto.ec2
+import unittest
+import mock
+from test_boto_integration import mock_environment
+
+
+class TestResolutionCache(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
+    def test_make_key_normalizes_filters(self):
+        self.assertEqual(
+            make_key('ec2', 'us-east-1', (), {'filters': {'tag:Name': ['b', 'a']}}, 'public_dns_name'),
+            make_key('ec2', 'us-east-1', (), {'filters': {'tag:Name': ['a', 'b']}}, 'public_dns_name')
+        )
+        self.assertNotEqual(
+            make_key('ec2', 'us-east-1', (), {}, 'public_dns_name'),
+            make_key('ec2', 'us-east-1', (), {}, 'private_ip_address')
+        )
+        self.assertNotEqual(
+            make_key('cloudformation_autoscaling_group', 'us-east-1', ('web', 'db'), {}, 'public_dns_name'),
+            make_key('cloudformation_autoscaling_group', 'us-east-1', ('db', 'web'), {}, 'public_dns_name')
+        )
+        self.assertEqual(
+            make_key('ec2', 'us-east-1', (['i-2', 'i-1'],), {}, 'public_dns_name'),
+            make_key('ec2', 'us-east-1', (['i-1', 'i-2'],), {}, 'public_dns_name')
+        )
+
+    def test_ttl(self):
+        cache = ResolutionCache()
+        resolver = mock.Mock(side_effect=[['a'], ['b']])
+
+        self.assertListEqual(['a'], cache.get_or_resolve('key', resolver, 60))
+        self.assertListEqual(['a'], cache.get_or_resolve('key', resolver, 60))
+        self.assertListEqual(['b'], cache.get_or_resolve('key', resolver, 0))
+        self.assertEqual(2, resolver.call_count)
+
+    def test_force_refresh(self):
+        cache = ResolutionCache()
+        resolver = mock.Mock(side_effect=[['a'], ['b']])
+
+        cache.get_or_resolve('key', resolver, 60)
+        self.assertListEqual(['b'], cache.get_or_resolve('key', resolver, 60, force_refresh=True))
+
+    def test_eviction(self):
+        cache = ResolutionCache(memory_entries=2)
+
+        for key in ('a', 'b', 'c'):
+            cache.get_or_resolve(key, lambda: [key], 60)
+
+        resolver = mock.Mock(return_value=['new'])
+        self.assertListEqual(['new'], cache.get_or_resolve('a', resolver, 60))
+        self.assertListEqual(['c'], cache.get_or_resolve('c', resolver, 60))
+
+    def test_stale_while_revalidate(self):
+        cache = ResolutionCache(stale_ttl=60)
+        cache.get_or_resolve('key', lambda: ['old'], 60)
+
+        with mock.patch('time.time', return_value=time.time() + 90):
+            self.assertListEqual(['old'], cache.get_or_resolve('key', lambda: ['new'], 60))
+
+        for _ in range(100):
+            if cache.get_or_resolve('key', lambda: ['sync'], 60) == ['new']:
+                break
+            time.sleep(0.01)
+
+        self.assertListEqual(['new'], cache.get_or_resolve('key', lambda: ['sync'], 60))
+
+    def test_file_store(self):
+        path = tempfile.mkdtemp()
+        try:
+            ResolutionCache(path=path).get_or_resolve('key', lambda: ['a.a.a'], 60)
+            resolver = mock.Mock()
+
+            self.assertListEqual(['a.a.a'], ResolutionCache(path=path).get_or_resolve('key', resolver, 60))
+            self.assertFalse(resolver.called)
+        finally:
+            shutil.rmtree(path)
+
+    def test_ec2_generator_cache_ttl(self):
+        configure_cache()
+        mock_cloudformation, mock_ec2 = mock_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            first = list(ec2_generator('us-east-1', filters={'tag:Name': 'web'}, cache_ttl=60))
+            second = list(ec2_generator('us-east-1', filters={'tag:Name': 'web'}, cache_ttl=60))
+
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        self.assertEqual(1, mock_ec2_connection.get_all_instances.call_count)
+        self.assertListEqual(first, second)
@@ -0,0 +1,138 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import ec2_generator, autoscaling_group_instance_ids
+from fabric_aws.cache import make_key
+from fabric_aws.connections import ConnectionPool, configure_connections, pool, reset_connections
+import os
+import subprocess
+import sys
+import threading
+import boto.cloudformation
+import boto.ec2
+import unittest
+import mock
+from test_boto_integration import mock_environment
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
+    def test_reuse(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            list(ec2_generator('us-east-1', instance_ids=['i-00000001']))
+            list(ec2_generator('us-east-1', instance_ids=['i-00000002']))
+            list(ec2_generator('eu-west-1', instance_ids=['i-00000003']))
+            autoscaling_group_instance_ids('us-east-1', 'dummy-asg-name')
+
+        self.assertListEqual([mock.call('us-east-1'), mock.call('eu-west-1')],
+                             mock_ec2.connect_to_region.call_args_list)
+        mock_ec2.autoscale.connect_to_region.assert_called_once_with('us-east-1')
+        self.assertDictEqual({'hits': 1, 'misses': 3, 'connections': 3}, pool.stats())
+
+    def test_profile(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+        connection_pool = ConnectionPool()
+
+        with mock.patch('boto.ec2', mock_ec2):
+            connection_pool.get('ec2', 'us-east-1')
+            connection_pool.get('ec2', 'us-east-1', profile_name='production')
+            connection_pool.get('ec2', 'us-east-1', profile_name='production')
+
+        self.assertListEqual([mock.call('us-east-1'), mock.call('us-east-1', profile_name='production')],
+                             mock_ec2.connect_to_region.call_args_list)
+        self.assertEqual(1, connection_pool.hits)
+
+    def test_configured_profile(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+        configure_connections(profile_name='production')
+
+        try:
+            with mock.patch('boto.ec2', mock_ec2):
+                list(ec2_generator('us-east-1', instance_ids=['i-00000001']))
+                pool.get('ec2', 'us-east-1', profile_name='staging')
+        finally:
+            configure_connections()
+
+        self.assertListEqual([mock.call('us-east-1', profile_name='production'),
+                              mock.call('us-east-1', profile_name='staging')],
+                             mock_ec2.connect_to_region.call_args_list)
+        self.assertNotEqual(make_key('ec2', 'us-east-1', profile_name='production'), make_key('ec2', 'us-east-1'))
+
+    def test_regions_connect_concurrently(self):
+        connection_pool = ConnectionPool()
+        connecting = threading.Event()
+        release = threading.Event()
+
+        def connect_to_region(region):
+            if region == 'us-east-1':
+                connecting.set()
+                release.wait()
+            return mock.Mock(region=region)
+
+        with mock.patch('boto.ec2.connect_to_region', connect_to_region):
+            thread = threading.Thread(target=connection_pool.get, args=('ec2', 'us-east-1'))
+            thread.start()
+            connecting.wait()
+            # us-east-1 is still connecting
+            self.assertEqual('eu-west-1', connection_pool.get('ec2', 'eu-west-1').region)
+            release.set()
+            thread.join()
+
+        self.assertDictEqual({'hits': 0, 'misses': 2, 'connections': 2}, connection_pool.stats())
+
+    def test_thread_safety(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+        connection_pool = ConnectionPool()
+
+        with mock.patch('boto.ec2', mock_ec2):
+            threads = [threading.Thread(target=connection_pool.get, args=('ec2', 'us-east-1')) for _ in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        mock_ec2.connect_to_region.assert_called_once_with('us-east-1')
+        self.assertDictEqual({'hits': 19, 'misses': 1, 'connections': 1}, connection_pool.stats())
+
+    def test_lazy_boto_import(self):
+        script = ('import sys\n'
+                  'from fabric.api import task\n'
+                  'from fabric_aws import ec2\n'
+                  '@ec2("us-east-1", filters={"tag:Name": "web"})\n'
+                  '@task\n'
+                  'def uptime(): pass\n'
+                  'print(sorted(name for name in sys.modules if name.split(".")[0] == "boto"))\n')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=root, stderr=open(os.devnull, 'w'))
+
+        self.assertEqual('[]', output.strip())
@@ -27,13 +27,21 @@
 # policies, either expressed or implied, of DoAT
 
 from fabric_aws import *
+from fabric_aws.connections import reset_connections
+from fabric_aws.stacks import stack_index
 from fabric.api import task
+import boto.cloudformation
+import boto.ec2
 import unittest
 import mock
 from test_boto_integration import mock_environment
 
 
 class TestDecorators(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+        stack_index.clear()
+
     def test_laziness(self):
         mock_cloudformation, mock_ec2 = mock_environment()
 
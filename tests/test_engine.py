@@ -0,0 +1,110 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import *
+from fabric_aws.connections import reset_connections
+from fabric_aws.engine import AsyncResolver, Future, gather
+from fabric_aws.stacks import stack_index
+from fabric.api import task
+import threading
+import time
+import boto.cloudformation
+import boto.ec2
+import unittest
+import mock
+from test_boto_integration import mock_environment
+
+
+class TestAsyncResolver(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+        stack_index.clear()
+
+    def test_future(self):
+        future = Future()
+        callback = mock.Mock()
+        future.add_done_callback(callback)
+
+        threading.Timer(0.05, future.set_result, (['a.a.a'],)).start()
+
+        self.assertListEqual(['a.a.a'], future.result(1))
+        callback.assert_called_once_with(future)
+
+    def test_overlap(self):
+        resolver = AsyncResolver(max_workers=4)
+
+        def slow(value):
+            time.sleep(0.2)
+            return value
+
+        start = time.time()
+        futures = [resolver.submit(slow, value) for value in range(4)]
+
+        self.assertListEqual([0, 1, 2, 3], gather(futures, 1))
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_exception(self):
+        resolver = AsyncResolver(max_workers=1)
+
+        def fail(_):
+            raise LookupError('boom')
+
+        chained = resolver.then(resolver.submit(lambda: 'value'), fail)
+        self.assertRaises(LookupError, chained.result, 1)
+
+        self.assertRaises(LookupError, resolver.then(chained, lambda value: value).result, 1)
+
+    def test_resolution(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+        resolver = AsyncResolver()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            futures = [resolver.ec2('region', filters={'tag:Name': 'web'}),
+                       resolver.autoscaling_group('region', 'autoscaling-group-name', 'private_ip_address'),
+                       resolver.cloudformation_autoscaling_group('region', 'stack-name',
+                                                                 'logical-autoscaling-group-name',
+                                                                 hostname_attribute='id'),
+                       resolver.autoscaling_group_instance_ids('region', 'autoscaling-group-name')]
+
+            results = gather(futures, 1)
+
+        self.assertListEqual([['a.a.a', 'b.b.b', 'c.c.c', 'd.d.d'],
+                              ['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4'],
+                              ['i-00000001', 'i-00000002', 'i-00000003', 'i-00000004'],
+                              ['i-00000001', 'i-00000002', 'i-00000003', 'i-00000004']], results)
+
+    def test_prefetch_decorator(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            @autoscaling_group('region', 'autoscaling-group-name', prefetch=True)
+            @task
+            def dummy():
+                pass
+
+            self.assertListEqual(['a.a.a', 'b.b.b', 'c.c.c', 'd.d.d'], list(dummy.hosts))
@@ -0,0 +1,109 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import *
+from fabric_aws.connections import reset_connections
+from fabric_aws.fanout import fan_out, PartialResolutionError
+from fabric.api import task
+import time
+import boto.cloudformation
+import boto.ec2
+import unittest
+import mock
+from test_boto_integration import mock_environment
+
+
+def slow(hosts, seconds=0.2):
+    def job():
+        time.sleep(seconds)
+        return hosts
+
+    return job
+
+
+def failing():
+    raise ValueError('boom')
+
+
+class TestFanOut(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
+    def test_concurrent_merge(self):
+        start = time.time()
+        hosts = fan_out([('us-east-1', slow(['a', 'b'])), ('eu-west-1', slow(['b', 'c'])), ('ap-south-1', slow(['d']))])
+
+        self.assertLess(time.time() - start, 0.5)
+        self.assertListEqual(['a', 'b', 'c', 'd'], hosts)
+
+    def test_partial_failure(self):
+        with mock.patch('fabric_aws.fanout.warn') as mock_warn:
+            hosts = fan_out([('us-east-1', slow(['a'], 0)), ('eu-west-1', failing)])
+
+        self.assertListEqual(['a'], hosts)
+        self.assertIn('eu-west-1', mock_warn.call_args[0][0])
+
+        with self.assertRaises(PartialResolutionError) as context:
+            fan_out([('us-east-1', slow(['a'], 0)), ('eu-west-1', failing)], fail_on_error=True)
+
+        self.assertListEqual(['eu-west-1'], list(context.exception.failures))
+        self.assertListEqual(['a'], context.exception.hosts)
+
+    def test_all_failed(self):
+        with self.assertRaises(PartialResolutionError):
+            fan_out([('us-east-1', failing), ('eu-west-1', failing)])
+
+    def test_timeout(self):
+        with mock.patch('fabric_aws.fanout.warn'):
+            hosts = fan_out([('us-east-1', slow(['a'], 0)), ('eu-west-1', slow(['b'], 1))], timeout=0.2)
+
+        self.assertListEqual(['a'], hosts)
+
+    def test_decorators(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            @ec2_multi_region(['us-east-1', 'eu-west-1'], filters={'tag:Name': 'web'},
+                              hostname_attribute='private_ip_address')
+            @task
+            def dummy1():
+                pass
+
+            @autoscaling_groups('us-east-1', ['asg-1', 'asg-2'], strategy='groups')
+            @task
+            def dummy2():
+                pass
+
+            self.assertListEqual(['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4'], list(dummy1.hosts))
+            self.assertListEqual(['a.a.a', 'b.b.b', 'c.c.c', 'd.d.d'], list(dummy2.hosts))
+
+        self.assertItemsEqual([mock.call('us-east-1'), mock.call('eu-west-1')],
+                              mock_ec2.connect_to_region.call_args_list)
+        mock_autoscale_connection = mock_ec2.autoscale.connect_to_region.return_value
+        self.assertItemsEqual([mock.call(names=['asg-1']), mock.call(names=['asg-2'])],
+                              mock_autoscale_connection.get_all_groups.call_args_list)
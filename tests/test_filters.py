@@ -0,0 +1,138 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import ec2_generator
+from fabric_aws.connections import reset_connections
+from fabric_aws.filters import InstanceSet, InstanceSetCache, compile_filters, instance_matches, normalize_filters
+import boto.ec2
+import unittest
+import mock
+
+
+def mock_instance(instance_id, state, instance_type, placement, **tags):
+    return mock.Mock(spec=[], id=instance_id, state=state, instance_type=instance_type, placement=placement,
+                     public_dns_name=instance_id + '.example.com', private_ip_address=None, tags=tags)
+
+
+INSTANCES = [
+    mock_instance('i-00000001', 'running', 'm3.medium', 'us-east-1a', Name='web-1', Role='web'),
+    mock_instance('i-00000002', 'running', 'm3.large', 'us-east-1b', Name='web-2', Role='web'),
+    mock_instance('i-00000003', 'stopped', 'm3.medium', 'us-east-1a', Name='Web-3', Role='web'),
+    mock_instance('i-00000004', 'running', 'c4.xlarge', 'us-east-1c', Name='db-1', Role='db', Backup=''),
+    mock_instance('i-00000005', 'pending', 'c4.xlarge', 'us-east-1b', Name='db*', Role='db'),
+    mock_instance('i-00000006', 'terminated', 't2.micro', 'us-east-1a', Name='[test]?'),
+    mock_instance('i-00000007', 'running', 't2.micro', 'us-east-1c', **{'Name': 'back\\slash', 'aws:cf:stack': 'a'}),
+]
+
+# (filters, instance ids, expected instance ids), following the EC2 DescribeInstances filter documentation
+CONFORMANCE_CASES = [
+    # no filters returns everything, in order
+    ({}, None, ['i-00000001', 'i-00000002', 'i-00000003', 'i-00000004', 'i-00000005', 'i-00000006', 'i-00000007']),
+    # a single value, or a list of values OR-ed
+    ({'tag:Role': 'web'}, None, ['i-00000001', 'i-00000002', 'i-00000003']),
+    ({'tag:Role': ['db', 'missing']}, None, ['i-00000004', 'i-00000005']),
+    # filters are AND-ed
+    ({'tag:Role': 'web', 'instance-state-name': 'running'}, None, ['i-00000001', 'i-00000002']),
+    ({'tag:Role': 'web', 'instance-type': 'm3.medium', 'availability-zone': 'us-east-1a'}, None,
+     ['i-00000001', 'i-00000003']),
+    # matching is case sensitive
+    ({'tag:Name': 'web-*'}, None, ['i-00000001', 'i-00000002']),
+    ({'tag:name': 'web-1'}, None, []),
+    # `*` matches any sequence, including an empty one, `?` exactly one character
+    ({'tag:Name': '*'}, None, ['i-00000001', 'i-00000002', 'i-00000003', 'i-00000004', 'i-00000005', 'i-00000006',
+                               'i-00000007']),
+    ({'tag:Name': 'db*'}, None, ['i-00000004', 'i-00000005']),
+    ({'tag:Name': 'web-?'}, None, ['i-00000001', 'i-00000002']),
+    ({'tag:Name': '?eb-?'}, None, ['i-00000001', 'i-00000002', 'i-00000003']),
+    ({'instance-type': 'c4.*', 'availability-zone': '*c'}, None, ['i-00000004']),
+    # wildcards match the whole value
+    ({'tag:Name': 'web'}, None, []),
+    ({'tag:Name': 'eb-*'}, None, []),
+    # a backslash escapes the next character, brackets are not special
+    ({'tag:Name': 'db\\*'}, None, ['i-00000005']),
+    ({'tag:Name': '[test]\\?'}, None, ['i-00000006']),
+    ({'tag:Name': '[test]?'}, None, ['i-00000006']),
+    ({'tag:Name': 'back\\\\slash'}, None, ['i-00000007']),
+    # a tag filter doesn't match instances without the tag, an empty tag value is still a value
+    ({'tag:Backup': '*'}, None, ['i-00000004']),
+    ({'tag:Backup': ''}, None, ['i-00000004']),
+    # tag-key and tag-value match any of the instance's tags
+    ({'tag-key': 'aws:*'}, None, ['i-00000007']),
+    ({'tag-value': 'db'}, None, ['i-00000004', 'i-00000005']),
+    ({'tag-key': 'Backup', 'tag-value': 'web-1'}, None, []),
+    # instance ids are AND-ed with the filters
+    ({}, ['i-00000002', 'i-00000004'], ['i-00000002', 'i-00000004']),
+    ({'tag:Role': 'web'}, ['i-00000002', 'i-00000004'], ['i-00000002']),
+    ({'instance-id': 'i-0000000?'}, ['i-00000006'], ['i-00000006']),
+]
+
+
+class TestFilterConformance(unittest.TestCase):
+    def test_instance_set(self):
+        instance_set = InstanceSet(INSTANCES)
+
+        for filters, instance_ids, expected in CONFORMANCE_CASES:
+            self.assertListEqual(expected, [instance.id for instance in instance_set.select(instance_ids, filters)],
+                                 'filters=%r instance_ids=%r' % (filters, instance_ids))
+
+    def test_instance_matches(self):
+        for filters, instance_ids, expected in CONFORMANCE_CASES:
+            matchers = compile_filters(normalize_filters(filters))
+            matched = [instance.id for instance in INSTANCES
+                       if instance_matches(instance, matchers) and (not instance_ids or instance.id in instance_ids)]
+
+            self.assertListEqual(expected, matched, 'filters=%r instance_ids=%r' % (filters, instance_ids))
+
+    def test_unsupported_filter(self):
+        with self.assertRaises(ValueError):
+            InstanceSet(INSTANCES).select(filters={'architecture': 'x86_64'})
+
+
+class TestLocalFilters(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
+    def test_single_fetch(self):
+        mock_ec2_connection = mock.MagicMock(**{
+            'get_all_reservations.return_value': mock.MagicMock(next_token=None, __iter__=lambda self: iter([
+                mock.Mock(instances=INSTANCES)]))
+        })
+        mock_ec2 = mock.MagicMock(**{'connect_to_region.return_value': mock_ec2_connection})
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('fabric_aws.instance_sets', InstanceSetCache()):
+            self.assertListEqual(['i-00000001.example.com', 'i-00000002.example.com'],
+                                 list(ec2_generator('us-east-1', filters={'tag:Name': 'web-*'}, local_filters=True)))
+            self.assertListEqual(['i-00000004'],
+                                 list(ec2_generator('us-east-1', filters={'tag:Role': 'db', 'instance-state-name':
+                                                                          'running'}, hostname_attribute='id',
+                                                    local_filters=True)))
+            self.assertListEqual(['i-00000006.example.com'],
+                                 list(ec2_generator('us-east-1', ['i-00000006'], local_filters=True)))
+
+        mock_ec2_connection.get_all_reservations.assert_called_once_with(max_results=1000, next_token=None)
+        self.assertFalse(mock_ec2_connection.get_all_instances.called)
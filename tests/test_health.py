@@ -0,0 +1,119 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import autoscaling_group_generator, ec2_generator
+from fabric_aws.connections import reset_connections
+import boto.ec2
+import unittest
+import mock
+
+
+def mock_health_environment():
+    members = [('i-00000001', 'InService', 'Healthy'),
+               ('i-00000002', 'Pending', 'Healthy'),
+               ('i-00000003', 'InService', 'Unhealthy'),
+               ('i-00000004', 'InService', 'Healthy'),
+               ('i-00000005', 'InService', 'Healthy'),
+               ('i-00000006', 'Standby', 'Healthy'),
+               ('i-00000007', 'InService', 'Healthy')]
+    group = mock.Mock(load_balancers=['web-elb'], instances=[
+        mock.Mock(instance_id=instance_id, lifecycle_state=lifecycle_state, health_status=health_status)
+        for instance_id, lifecycle_state, health_status in members])
+
+    states = {'i-00000004': 'stopping'}
+    instances = dict((instance_id, mock.Mock(id=instance_id, state=states.get(instance_id, 'running'),
+                                             public_dns_name=instance_id + '.example.com'))
+                     for instance_id, _, _ in members)
+
+    impaired = {'i-00000005': ('impaired', 'ok')}
+    mock_ec2_connection = mock.MagicMock(**{
+        'get_all_instances.side_effect': lambda instance_ids=None, filters=None: [
+            mock.Mock(instances=[instances[instance_id] for instance_id in instance_ids or filters['instance-id']])],
+        'get_all_instance_status.side_effect': lambda instance_ids: [
+            mock.Mock(id=instance_id, instance_status=mock.Mock(status=impaired.get(instance_id, ('ok', 'ok'))[0]),
+                      system_status=mock.Mock(status=impaired.get(instance_id, ('ok', 'ok'))[1]))
+            for instance_id in instance_ids],
+    })
+    mock_elb_connection = mock.MagicMock(**{
+        'describe_instance_health.return_value': [mock.Mock(instance_id='i-00000001', state='InService'),
+                                                  mock.Mock(instance_id='i-00000007', state='OutOfService')]
+    })
+
+    return mock.MagicMock(**{'connect_to_region.return_value': mock_ec2_connection,
+                             'autoscale.connect_to_region.return_value.get_all_groups.return_value': [group],
+                             'elb.connect_to_region.return_value': mock_elb_connection})
+
+
+class TestHealth(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
+    def test_autoscaling_group(self):
+        mock_ec2 = mock_health_environment()
+
+        with mock.patch('boto.ec2', mock_ec2):
+            self.assertListEqual(['i-00000001.example.com'],
+                                 list(autoscaling_group_generator('region', 'asg', healthy=True)))
+
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        mock_ec2_connection.get_all_instances.assert_called_once_with(
+            instance_ids=['i-00000001', 'i-00000004', 'i-00000005', 'i-00000007'])
+        mock_ec2_connection.get_all_instance_status.assert_called_once_with(
+            instance_ids=['i-00000001', 'i-00000005', 'i-00000007'])
+        mock_ec2.elb.connect_to_region.return_value.describe_instance_health.assert_called_once_with('web-elb')
+
+    def test_autoscaling_group_incremental(self):
+        mock_ec2 = mock_health_environment()
+        mock_autoscale_connection = mock_ec2.autoscale.connect_to_region.return_value
+        mock_autoscale_connection.get_all_activities.return_value = []
+
+        with mock.patch('boto.ec2', mock_ec2):
+            self.assertListEqual(['i-00000001.example.com'],
+                                 list(autoscaling_group_generator('region', 'asg-incremental', healthy=True,
+                                                                  incremental=True)))
+
+            # i-00000002 is now in service, without any scaling activity
+            mock_autoscale_connection.get_all_groups.return_value[0].instances[1].lifecycle_state = 'InService'
+            self.assertListEqual(['i-00000001.example.com', 'i-00000002.example.com'],
+                                 list(autoscaling_group_generator('region', 'asg-incremental', healthy=True,
+                                                                  incremental=True)))
+
+        mock_elb_connection = mock_ec2.elb.connect_to_region.return_value
+        self.assertEqual(2, mock_elb_connection.describe_instance_health.call_count)
+
+    def test_ec2(self):
+        mock_ec2 = mock_health_environment()
+        instance_ids = ['i-00000002', 'i-00000004', 'i-00000005', 'i-00000007']
+
+        with mock.patch('boto.ec2', mock_ec2):
+            self.assertListEqual(['i-00000002', 'i-00000007'],
+                                 list(ec2_generator('region', instance_ids, hostname_attribute='id', healthy=True)))
+            self.assertListEqual(['i-00000002'],
+                                 list(ec2_generator('region', instance_ids, hostname_attribute='id', healthy=True,
+                                                    load_balancers=['web-elb'])))
+            self.assertEqual(4, len(list(ec2_generator('region', instance_ids))))
@@ -0,0 +1,155 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import ec2_generator, ec2_multi_region_generator, autoscaling_group_generator
+from fabric_aws.batch import BatchResolver
+from fabric_aws.connections import reset_connections
+from fabric_aws.scheduler import configure_scheduler
+from fabric_aws.instrumentation import Collector, LoggingSink, StatsdSink, add_sink, remove_sink, collector, \
+    record_resolution
+from fabric.api import settings
+import socket
+import boto.cloudformation
+import boto.ec2
+import unittest
+import mock
+from test_boto_integration import mock_environment
+
+
+class ThrottlingError(Exception):
+    error_code = 'RequestLimitExceeded'
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+        collector.clear()
+
+    def test_collector(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            list(ec2_generator('us-east-1', filters={'tag:Name': 'web'}))
+            list(autoscaling_group_generator('us-east-1', 'dummy-asg-name', strategy='groups'))
+
+        summary = collector.summary()
+        self.assertEqual(2, summary[('ec2', 'get_all_instances')]['calls'])
+        self.assertEqual(4, summary[('ec2', 'get_all_instances')]['items'])
+        self.assertEqual(1, summary[('autoscale', 'get_all_groups')]['calls'])
+
+        self.assertListEqual([('ec2', (), 4), ('ec2', (), 4), ('autoscaling_group', ('dummy-asg-name',), 4)],
+                             [(record.function, record.args, record.hosts) for record in collector.resolutions])
+
+        report = collector.report()
+        self.assertIn('ec2.get_all_instances', report)
+        self.assertIn('autoscaling_group(us-east-1, dummy-asg-name)', report)
+
+    def test_uncached_resolutions(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        reservations = mock_ec2_connection.get_all_instances.return_value
+        mock_ec2_connection.get_all_reservations.return_value = mock.MagicMock(
+            next_token=None, __iter__=lambda self: iter(reservations))
+        resolver = BatchResolver()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            list(ec2_generator('us-east-1', filters={'tag:Name': 'web'}, page_size=1000))
+
+            ticket = resolver.submit_ec2('us-east-1', filters={'architecture': 'x86_64'})
+            list(ticket.hosts())
+            list(ticket.hosts())
+
+            # the streamed resolution and the batched one (recorded once)
+            self.assertListEqual([('ec2', (), 4), ('ec2', (), 4)],
+                                 [(record.function, record.args, record.hosts) for record in collector.resolutions])
+
+            collector.clear()
+            list(ec2_multi_region_generator(['us-east-1', 'eu-west-1'], filters={'tag:Name': 'web'}))
+
+        self.assertListEqual([('ec2', 'eu-west-1', (), 4), ('ec2', 'us-east-1', (), 4),
+                              ('ec2_multi_region', 'us-east-1,eu-west-1', (), 4)],
+                             sorted((record.function, record.region, record.args, record.hosts)
+                                    for record in collector.resolutions))
+
+    def test_errors(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+        mock_ec2.connect_to_region.return_value.get_all_instances.side_effect = ThrottlingError()
+
+        configure_scheduler(max_attempts=3, base_delay=0)
+        try:
+            with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+                self.assertRaises(ThrottlingError, list, ec2_generator('us-east-1'))
+        finally:
+            configure_scheduler()
+
+        summary = collector.summary()[('ec2', 'get_all_instances')]
+        self.assertEqual(1, summary['calls'])
+        self.assertEqual(2, summary['retries'])
+        self.assertEqual(3, summary['throttled'])
+        self.assertEqual(1, summary['errors'])
+
+    def test_sinks(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(1)
+
+        logger = mock.Mock()
+        sinks = [LoggingSink(logger), StatsdSink(*server.getsockname()), Collector()]
+        for sink in sinks:
+            add_sink(sink)
+
+        mock_cloudformation, mock_ec2 = mock_environment()
+        try:
+            with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+                list(ec2_generator('us-east-1'))
+        finally:
+            for sink in sinks:
+                remove_sink(sink)
+
+        self.assertEqual(2, logger.log.call_count)
+        self.assertIn('fabric_aws.ec2.get_all_instances.calls:1|c', server.recv(4096))
+        self.assertIn('fabric_aws.ec2.hosts:4|g', server.recv(4096))
+        self.assertEqual(1, len(sinks[2].calls))
+
+    def test_report_at_exit(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation), \
+                mock.patch('atexit.register') as mock_register, \
+                mock.patch('fabric_aws.instrumentation._report_registered', []), settings(fabric_aws_timings=True):
+            list(ec2_generator('us-east-1'))
+            list(ec2_generator('us-east-1'))
+
+        self.assertEqual(1, mock_register.call_count)
+
+    def test_report_at_exit_without_calls(self):
+        with mock.patch('atexit.register') as mock_register, \
+                mock.patch('fabric_aws.instrumentation._report_registered', []), settings(fabric_aws_timings=True):
+            record_resolution('ec2', 'us-east-1', (), 4, 0.001)
+
+        self.assertEqual(1, mock_register.call_count)
@@ -0,0 +1,172 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import *
+from fabric_aws import ec2_generator, autoscaling_group_generator, cloudformation_autoscaling_group_generator
+from fabric_aws.connections import reset_connections
+from fabric_aws.inventory import export_inventory, use_inventory
+from fabric_aws.stacks import stack_index
+from fabric.api import task
+from test_stacks import summaries
+import os
+import shutil
+import tempfile
+import boto.cloudformation
+import boto.ec2
+import unittest
+import mock
+
+
+def mock_instance(instance_id, name, state='running', autoscaling_group_name=None):
+    tags = {'Name': name}
+    if autoscaling_group_name is not None:
+        tags['aws:autoscaling:groupName'] = autoscaling_group_name
+
+    # spec=[] makes attributes missing from boto's Instance read as None instead of as mocks
+    return mock.Mock(spec=[], id=instance_id, public_dns_name=instance_id + '.example.com',
+                     private_ip_address='10.0.0.%s' % instance_id[-1], state=state, placement='us-east-1a',
+                     instance_type='m3.medium', tags=tags)
+
+
+def mock_export_environment():
+    instances = [mock_instance('i-00000001', 'web'),
+                 mock_instance('i-00000002', 'web', state='stopped'),
+                 mock_instance('i-00000003', 'db', autoscaling_group_name='db-asg'),
+                 mock_instance('i-00000004', 'db', autoscaling_group_name='db-asg')]
+    pages = {
+        None: mock.MagicMock(next_token='page-2', __iter__=lambda self: iter([mock.Mock(instances=instances[:2])])),
+        'page-2': mock.MagicMock(next_token=None, __iter__=lambda self: iter([mock.Mock(instances=instances[2:])])),
+    }
+
+    mock_ec2_connection = mock.MagicMock(**{
+        'get_all_reservations.side_effect': lambda max_results=None, next_token=None: pages[next_token]
+    })
+
+    group = mock.Mock(instances=[mock.Mock(instance_id='i-00000003'), mock.Mock(instance_id='i-00000004')])
+    group.name = 'db-asg'
+    mock_autoscale_connection = mock.MagicMock(**{
+        'get_all_groups.return_value': mock.MagicMock(next_token=None, __iter__=lambda self: iter([group]))
+    })
+    mock_ec2 = mock.MagicMock(**{'connect_to_region.return_value': mock_ec2_connection,
+                                 'autoscale.connect_to_region.return_value': mock_autoscale_connection})
+
+    stacks = {
+        'arn:stack': summaries(('Backend', 'arn:backend-stack', 'AWS::CloudFormation::Stack')),
+        'arn:backend-stack': summaries(('DbGroup', 'db-asg', 'AWS::AutoScaling::AutoScalingGroup')),
+    }
+    mock_cloudformation_connection = mock.MagicMock(**{
+        'describe_stacks.return_value': mock.MagicMock(next_token=None, __iter__=lambda self: iter([
+            mock.Mock(stack_name='stack-name', stack_id='arn:stack'),
+            mock.Mock(stack_name='stack-name-Backend-1', stack_id='arn:backend-stack')])),
+        'list_stack_resources.side_effect': lambda stack_name, next_token=None: stacks[stack_name]
+    })
+    mock_cloudformation = mock.MagicMock(**{'connect_to_region.return_value': mock_cloudformation_connection})
+
+    return mock_cloudformation, mock_ec2
+
+
+class TestInventory(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+        stack_index.clear()
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'inventory.db')
+
+        mock_cloudformation, mock_ec2 = mock_export_environment()
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            export_inventory(self.path, ['us-east-1'])
+
+        reset_connections()
+        use_inventory(self.path)
+
+    def tearDown(self):
+        use_inventory(None)
+        shutil.rmtree(self.directory)
+
+    def test_export(self):
+        inventory = use_inventory(self.path)
+
+        self.assertListEqual(['inventory.db'], os.listdir(self.directory))
+        self.assertListEqual(['us-east-1'], inventory.regions)
+        self.assertListEqual(['i-00000001', 'i-00000002', 'i-00000003', 'i-00000004'],
+                             [instance.id for instance in inventory.instances('us-east-1')])
+        self.assertDictEqual({'Backend': ('arn:backend-stack', 'AWS::CloudFormation::Stack')},
+                             inventory.stack_resources('us-east-1', 'stack-name'))
+
+    def test_resolution_without_aws(self):
+        mock_ec2 = mock.MagicMock()
+        mock_cloudformation = mock.MagicMock()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            self.assertListEqual(['i-00000001.example.com', 'i-00000002.example.com'],
+                                 list(ec2_generator('us-east-1', filters={'tag:Name': 'web'})))
+            self.assertListEqual(['10.0.0.4'], list(ec2_generator('us-east-1', ['i-00000004'],
+                                                                   hostname_attribute='private_ip_address')))
+            self.assertListEqual(['i-00000003.example.com', 'i-00000004.example.com'],
+                                 list(autoscaling_group_generator('us-east-1', 'db-asg', strategy='groups')))
+            self.assertListEqual(['i-00000003', 'i-00000004'],
+                                 list(autoscaling_group_generator('us-east-1', 'db-asg', hostname_attribute='id')))
+            self.assertListEqual(['i-00000003.example.com', 'i-00000004.example.com'],
+                                 list(cloudformation_autoscaling_group_generator('us-east-1', 'stack-name',
+                                                                                 'Backend.DbGroup')))
+
+            @ec2('us-east-1', filters={'tag:Name': 'db'}, batch=True)
+            @task
+            def dummy():
+                pass
+
+            self.assertListEqual(['i-00000003.example.com', 'i-00000004.example.com'], list(dummy.hosts))
+
+        self.assertFalse(mock_ec2.connect_to_region.called)
+        self.assertFalse(mock_ec2.autoscale.connect_to_region.called)
+        self.assertFalse(mock_cloudformation.connect_to_region.called)
+
+    def test_filters(self):
+        self.assertListEqual(['i-00000001.example.com'],
+                             list(ec2_generator('us-east-1', filters={'tag:Name': 'w*',
+                                                                      'instance-state-name': 'running'})))
+        self.assertListEqual(['i-00000003', 'i-00000004'],
+                             list(ec2_generator('us-east-1', filters={'tag-key': 'aws:autoscaling:*'},
+                                                hostname_attribute='id')))
+        self.assertListEqual([], list(ec2_generator('us-east-1', filters={'tag:Name': 'missing'})))
+
+        with self.assertRaises(ValueError):
+            list(ec2_generator('us-east-1', filters={'architecture': 'x86_64'}))
+
+        with self.assertRaises(LookupError):
+            list(ec2_generator('eu-west-1', filters={'tag:Name': 'web'}))
+
+    def test_sql_variables(self):
+        inventory = use_inventory(self.path)
+
+        with mock.patch('fabric_aws.inventory.MAX_SQL_VARIABLES', 3):
+            instances = inventory.instances('us-east-1', ['i-00000004', 'i-00000001', 'i-00000003'])
+
+        self.assertListEqual([('i-00000001', 'web'), ('i-00000003', 'db'), ('i-00000004', 'db')],
+                             [(instance.id, instance.tags['Name']) for instance in instances])
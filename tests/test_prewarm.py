@@ -0,0 +1,168 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import ec2
+from fabric_aws.connections import reset_connections
+from fabric_aws.prewarm import Prewarmer, configure_prewarm
+from fabric.api import env, execute, settings, task
+from fabric.network import normalize_to_string
+from fabric.state import connections
+from test_boto_integration import mock_environment
+import boto.ec2
+import threading
+import unittest
+import mock
+
+
+class TestPrewarm(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+        connections.clear()
+
+    def tearDown(self):
+        connections.clear()
+        configure_prewarm()
+
+    def test_gateway_for(self):
+        prewarmer = Prewarmer(gateways={'10.1.0.0/16': 'bastion-1', '10.2.3.0/24': 'bastion-2'})
+
+        self.assertEqual('bastion-1', prewarmer.gateway_for('10.1.200.3'))
+        self.assertEqual('bastion-2', prewarmer.gateway_for('10.2.3.4'))
+        self.assertIsNone(prewarmer.gateway_for('10.2.4.4'))
+        self.assertIsNone(prewarmer.gateway_for('a.example.com'))
+
+        with settings(gateway='bastion-default'):
+            self.assertEqual('bastion-default', prewarmer.gateway_for('10.2.4.4'))
+
+    def test_prewarm(self):
+        prewarmer = Prewarmer(gateways={'10.0.0.0/8': 'bastion'})
+        failures = {'unreachable.example.com': Exception('timed out')}
+
+        def connect(user, host, port, sock=None):
+            if host in failures:
+                raise failures[host]
+            return mock.Mock(host=host, sock=sock)
+
+        with settings(user='deploy', port='22'), mock.patch.object(Prewarmer, '_connect', staticmethod(connect)), \
+                mock.patch('fabric_aws.prewarm.direct_tcpip', lambda client, host, port: (client.host, host)):
+            hosts = ['10.0.0.1', '10.0.0.2', 'a.example.com', 'unreachable.example.com', '10.0.0.1']
+            self.assertListEqual(hosts, list(prewarmer.prewarm(hosts)))
+            prewarmer.wait()
+
+            self.assertEqual(('bastion', '10.0.0.1'), connections['deploy@10.0.0.1:22'].sock)
+            self.assertEqual(('bastion', '10.0.0.2'), connections['deploy@10.0.0.2:22'].sock)
+            self.assertIsNone(connections['deploy@a.example.com:22'].sock)
+
+        self.assertEqual(3, prewarmer.opened)
+        self.assertListEqual(['deploy@unreachable.example.com:22'], list(prewarmer.failed))
+        self.assertListEqual(['deploy@10.0.0.1:22', 'deploy@10.0.0.2:22', 'deploy@a.example.com:22',
+                              'deploy@bastion:22'], sorted(connections))
+
+    def test_fabric_connection_kept(self):
+        prewarmer = Prewarmer()
+        fabric_client = mock.Mock()
+        prewarmed_client = mock.Mock()
+
+        def connect(user, host, port, sock=None):
+            # fabric connects to the host while the prewarmer is connecting
+            connections['%s@%s:%s' % (user, host, port)] = fabric_client
+            return prewarmed_client
+
+        with settings(user='deploy', port='22'), mock.patch.object(Prewarmer, '_connect', staticmethod(connect)):
+            list(prewarmer.prewarm(['a.example.com']))
+            prewarmer.wait()
+
+            self.assertIs(fabric_client, connections['deploy@a.example.com:22'])
+
+        prewarmed_client.close.assert_called_once_with()
+        self.assertFalse(fabric_client.close.called)
+        self.assertEqual(0, prewarmer.opened)
+
+    def test_decorator(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+        prewarmer = configure_prewarm()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch.object(prewarmer, 'submit') as submit:
+            @ec2('us-east-1', instance_ids=['i-00000001', 'i-00000002'], prewarm=True)
+            @task
+            def dummy():
+                pass
+
+            self.assertFalse(submit.called)
+            self.assertListEqual(['a.a.a', 'b.b.b', 'c.c.c', 'd.d.d'], list(dummy.hosts))
+
+        self.assertListEqual([normalize_to_string(host) for host in ['a.a.a', 'b.b.b', 'c.c.c', 'd.d.d']],
+                             [args[0] for args, _ in submit.call_args_list])
+
+    def test_window(self):
+        prewarmer = configure_prewarm(window=2)
+        ran = []
+
+        connect = staticmethod(lambda user, host, port, sock=None: mock.Mock())
+
+        with settings(user='deploy', port='22'), mock.patch.object(Prewarmer, '_connect', connect), \
+                mock.patch('fabric_aws.ec2_generator', lambda *args, **kwargs: iter(['a', 'b', 'c', 'd'])):
+            @ec2('us-east-1', instance_ids=['i-00000001'], prewarm=True)
+            @task
+            def dummy():
+                prewarmer.wait()
+                ran.append((env.host_string, sorted(connections)))
+
+            execute(dummy)
+
+        self.assertListEqual([
+            ('a', ['deploy@a:22', 'deploy@b:22', 'deploy@c:22']),
+            ('b', ['deploy@a:22', 'deploy@b:22', 'deploy@c:22', 'deploy@d:22']),
+            ('c', ['deploy@a:22', 'deploy@b:22', 'deploy@c:22', 'deploy@d:22']),
+            ('d', ['deploy@a:22', 'deploy@b:22', 'deploy@c:22', 'deploy@d:22']),
+        ], ran)
+        self.assertEqual(4, prewarmer.opened)
+
+    def test_advance_timeout(self):
+        prewarmer = Prewarmer()
+        opening = threading.Event()
+        release = threading.Event()
+        client = mock.Mock()
+
+        def connect(user, host, port, sock=None):
+            opening.set()
+            release.wait()
+            return client
+
+        with settings(user='deploy', port='22', timeout=0.01), \
+                mock.patch.object(Prewarmer, '_connect', staticmethod(connect)):
+            list(prewarmer.prewarm(['a.example.com']))
+            opening.wait()
+            # the connection isn't open in time, fabric connects to the host itself
+            prewarmer.advance('a.example.com')
+            release.set()
+            prewarmer.wait()
+
+        self.assertNotIn('deploy@a.example.com:22', connections)
+        client.close.assert_called_once_with()
+        self.assertEqual(0, prewarmer.opened)
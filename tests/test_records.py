@@ -0,0 +1,75 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import ec2_record_generator, autoscaling_group_record_generator
+from fabric_aws.connections import reset_connections
+from fabric_aws.records import HostRecord
+import boto.cloudformation
+import boto.ec2
+import unittest
+import mock
+from test_boto_integration import mock_environment
+
+
+def mock_instance():
+    return mock.Mock(id='i-00000001', public_dns_name='a.a.a', private_ip_address='10.0.0.1', ip_address='1.1.1.1',
+                     placement='us-east-1a', state='running', tags={'Name': 'web', 'env': 'production'})
+
+
+class TestHostRecord(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
+    def test_from_instance(self):
+        record = HostRecord.from_instance(mock_instance(), 'private_ip_address')
+
+        self.assertEqual(HostRecord('i-00000001', '10.0.0.1', '10.0.0.1', '1.1.1.1', 'us-east-1a', 'running',
+                                    {'Name': 'web', 'env': 'production'}), record)
+
+    def test_projection(self):
+        record = HostRecord.from_instance(mock_instance(), fields=['instance_id', 'address', 'tags'], tags=['Name'])
+
+        self.assertEqual(HostRecord(instance_id='i-00000001', address='a.a.a', tags={'Name': 'web'}), record)
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_dict_round_trip(self):
+        record = HostRecord.from_instance(mock_instance())
+
+        self.assertEqual(record, HostRecord.from_dict(record.to_dict()))
+
+    def test_record_generators(self):
+        mock_cloudformation, mock_ec2 = mock_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('boto.cloudformation', mock_cloudformation):
+            records = list(ec2_record_generator('us-east-1', filters={'tag:Name': 'web'},
+                                                hostname_attribute='private_ip_address', fields=['address']))
+            asg_records = list(autoscaling_group_record_generator('us-east-1', 'dummy-asg-name', fields=['address']))
+
+        self.assertListEqual(['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4'], [record.address for record in records])
+        self.assertListEqual(['a.a.a', 'b.b.b', 'c.c.c', 'd.d.d'], [record.address for record in asg_records])
+        self.assertIsNone(records[0].instance_id)
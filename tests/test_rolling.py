@@ -0,0 +1,159 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import rolling_autoscaling_group
+from fabric_aws.connections import reset_connections
+from fabric_aws.rolling import plan_waves, roll, wave_size
+from fabric.api import hide, task
+import boto.ec2
+import unittest
+import mock
+
+MEMBERS = [('i-00000001', 'us-east-1a', 'a1'), ('i-00000002', 'us-east-1a', 'a2'), ('i-00000003', 'us-east-1a', 'a3'),
+           ('i-00000004', 'us-east-1b', 'b1'), ('i-00000005', 'us-east-1b', 'b2'), ('i-00000006', 'us-east-1c', 'c1')]
+
+
+def mock_rolling_environment():
+    group = mock.Mock(instances=[mock.Mock(instance_id=instance_id, availability_zone=zone, lifecycle_state='InService',
+                                           health_status='Healthy') for instance_id, zone, _ in MEMBERS])
+    instances = [mock.Mock(id=instance_id, placement=zone, public_dns_name=host) for instance_id, zone, host in MEMBERS]
+
+    mock_autoscale_connection = mock.MagicMock(**{'get_all_groups.return_value': [group]})
+    mock_ec2_connection = mock.MagicMock(**{'get_all_instances.return_value': [mock.Mock(instances=instances)]})
+
+    return mock.MagicMock(**{'connect_to_region.return_value': mock_ec2_connection,
+                             'autoscale.connect_to_region.return_value': mock_autoscale_connection})
+
+
+def mock_execute(task, *args, **kwargs):
+    return dict((host, host.upper()) for host in kwargs['hosts'])
+
+
+class TestRolling(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
+    def test_plan_waves(self):
+        self.assertEqual(3, wave_size('50%', 5))
+        self.assertEqual(1, wave_size('1%', 5))
+        self.assertEqual(2, wave_size(2, 5))
+
+        waves = plan_waves(MEMBERS, 3)
+        self.assertListEqual([['a1', 'b1', 'c1'], ['a2', 'b2', 'a3']],
+                             [[host for _, _, host in wave] for wave in waves])
+
+        self.assertEqual(6, len(plan_waves(MEMBERS, 1)))
+        self.assertListEqual([], plan_waves([], '25%'))
+
+    def test_plan_waves_without_host(self):
+        members = MEMBERS[:3] + [('i-00000007', 'us-east-1b', None)]
+
+        with mock.patch('fabric_aws.rolling.warn') as warn:
+            waves = plan_waves(members, '50%')
+
+        self.assertListEqual([['a1', 'a2'], ['a3']], [[host for _, _, host in wave] for wave in waves])
+        warn.assert_called_once_with('Leaving out instances without a host: i-00000007')
+
+    def test_roll(self):
+        mock_ec2 = mock_rolling_environment()
+        mock_autoscale_connection = mock_ec2.autoscale.connect_to_region.return_value
+        mock_autoscale_connection.get_all_groups.return_value = [mock.Mock(instances=[])]
+        executed = []
+
+        def execute(task, *args, **kwargs):
+            self.assertTrue(task.parallel)
+            self.assertEqual(2, task.pool_size)
+            executed.append((args, kwargs['hosts'], [call[0] for call in mock_autoscale_connection.method_calls]))
+            return mock_execute(task, *args, **kwargs)
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('fabric_aws.rolling.execute', execute):
+            results = roll(lambda: None, plan_waves(MEMBERS[:4], 2), 'region', 'asg', args=('v1',), pool_size=2,
+                           detach=True, suspend_processes=['AZRebalance'])
+
+        self.assertDictEqual({'a1': 'A1', 'a2': 'A2', 'a3': 'A3', 'b1': 'B1'}, results)
+        self.assertListEqual([('v1',), ('v1',)], [args for args, _, _ in executed])
+        self.assertListEqual([['a1', 'b1'], ['a2', 'a3']], [hosts for _, hosts, _ in executed])
+        self.assertListEqual(['suspend_processes', 'detach_instances', 'get_all_groups'], executed[0][2])
+
+        mock_autoscale_connection.detach_instances.assert_any_call('asg', ['i-00000001', 'i-00000004'],
+                                                                   decrement_capacity=True)
+        mock_autoscale_connection.attach_instances.assert_any_call('asg', ['i-00000002', 'i-00000003'])
+        mock_autoscale_connection.resume_processes.assert_called_with('asg', ['AZRebalance'])
+        self.assertEqual(2, mock_autoscale_connection.resume_processes.call_count)
+
+    def test_health_gate(self):
+        mock_ec2 = mock_rolling_environment()
+        gate = mock.Mock(side_effect=lambda hosts, results: 'b1' not in hosts)
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('fabric_aws.rolling.execute', mock_execute):
+            with self.assertRaises(SystemExit), hide('aborts'):
+                roll(lambda: None, plan_waves(MEMBERS, 1), 'region', 'asg', health_gate=gate)
+
+        self.assertEqual(2, gate.call_count)
+        gate.assert_called_with(['b1'], {'b1': 'B1'})
+
+    def test_detach_failure(self):
+        mock_ec2 = mock_rolling_environment()
+        mock_autoscale_connection = mock_ec2.autoscale.connect_to_region.return_value
+        wave = [('i-%08d' % index, 'us-east-1a', 'host-%d' % index) for index in range(1, 46)]
+
+        # the instances never leave the group
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('fabric_aws.rolling.execute', mock_execute):
+            with self.assertRaises(SystemExit), hide('aborts'):
+                roll(lambda: None, [wave], 'region', 'asg', detach=True, timeout=0)
+
+        self.assertEqual(3, mock_autoscale_connection.detach_instances.call_count)
+        self.assertEqual(mock_autoscale_connection.detach_instances.call_args_list[0][0],
+                         mock_autoscale_connection.attach_instances.call_args_list[0][0])
+        self.assertEqual(3, mock_autoscale_connection.attach_instances.call_count)
+
+        # the third chunk fails to detach, only the first two are attached back
+        mock_autoscale_connection.reset_mock()
+        mock_autoscale_connection.detach_instances.side_effect = [None, None, ValueError('detach failed')]
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('fabric_aws.rolling.execute', mock_execute):
+            self.assertRaises(ValueError, roll, lambda: None, [wave], 'region', 'asg', detach=True)
+
+        self.assertListEqual([mock.call('asg', [instance_id for instance_id, _, _ in wave[:20]]),
+                              mock.call('asg', [instance_id for instance_id, _, _ in wave[20:40]])],
+                             mock_autoscale_connection.attach_instances.call_args_list)
+
+    def test_decorator(self):
+        mock_ec2 = mock_rolling_environment()
+
+        with mock.patch('boto.ec2', mock_ec2), mock.patch('fabric_aws.rolling.execute', mock_execute):
+            @rolling_autoscaling_group('region', 'asg', batch_size='50%', in_service_timeout=60)
+            @task
+            def dummy():
+                pass
+
+            self.assertFalse(mock_ec2.connect_to_region.called)
+            self.assertDictEqual(dict((host, host.upper()) for _, _, host in MEMBERS), dummy())
+
+        mock_ec2_connection = mock_ec2.connect_to_region.return_value
+        mock_ec2_connection.get_all_instances.assert_called_once_with(
+            instance_ids=[instance_id for instance_id, _, _ in MEMBERS])
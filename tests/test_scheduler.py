@@ -0,0 +1,106 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws.connections import reset_connections
+from fabric_aws.scheduler import Scheduler, TokenBucket
+import threading
+import time
+import unittest
+import mock
+
+
+class ThrottlingError(Exception):
+    error_code = 'Throttling'
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=20, capacity=2)
+
+        start = time.time()
+        for _ in range(4):
+            bucket.acquire()
+
+        self.assertGreaterEqual(time.time() - start, 0.09)
+
+    def test_adaptive_rate(self):
+        bucket = TokenBucket(rate=8, capacity=1, min_rate=1)
+
+        for _ in range(5):
+            bucket.throttled()
+        self.assertEqual(1, bucket.rate)
+
+        bucket.succeeded()
+        self.assertEqual(1.4, bucket.rate)
+
+    def test_retry_on_throttling(self):
+        scheduler = Scheduler(base_delay=0)
+        function = mock.Mock(side_effect=[ThrottlingError(), ThrottlingError(), 'result'])
+
+        self.assertEqual('result', scheduler.execute('ec2', 'us-east-1', 'get_all_instances', function))
+        self.assertEqual(3, function.call_count)
+        self.assertLess(scheduler.bucket('ec2', 'us-east-1').rate, 10)
+
+    def test_no_retry_on_other_errors(self):
+        scheduler = Scheduler(base_delay=0)
+        function = mock.Mock(side_effect=ValueError())
+
+        self.assertRaises(ValueError, scheduler.execute, 'ec2', 'us-east-1', 'get_all_instances', function)
+        self.assertEqual(1, function.call_count)
+
+    def test_backoff(self):
+        scheduler = Scheduler(base_delay=1, max_delay=5)
+
+        for attempt in range(1, 10):
+            self.assertLessEqual(scheduler.backoff(attempt), min(5, 2 ** (attempt - 1)))
+
+    def test_coalescing(self):
+        scheduler = Scheduler()
+        calls = []
+
+        def function():
+            calls.append(1)
+            time.sleep(0.2)
+            return ['a.a.a']
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            scheduler.execute('ec2', 'us-east-1', 'get_all_instances', function, key='same'))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertListEqual([['a.a.a']] * 5, results)
+
+        scheduler.execute('ec2', 'us-east-1', 'get_all_instances', function, key='same')
+        self.assertEqual(2, len(calls))
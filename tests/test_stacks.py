@@ -0,0 +1,101 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws.connections import reset_connections
+from fabric_aws.stacks import StackIndex
+from datetime import datetime, timedelta
+import boto.cloudformation
+import unittest
+import mock
+
+
+def summaries(*resources):
+    return mock.MagicMock(next_token=None, __iter__=lambda self: iter([
+        mock.Mock(logical_resource_id=logical, physical_resource_id=physical, resource_type=resource_type)
+        for logical, physical, resource_type in resources
+    ]))
+
+
+def mock_stacks_environment():
+    stacks = {
+        'stack-name': summaries(('WebGroup', 'web-asg', 'AWS::AutoScaling::AutoScalingGroup'),
+                                ('WorkerGroup', 'worker-asg', 'AWS::AutoScaling::AutoScalingGroup'),
+                                ('Backend', 'arn:backend-stack', 'AWS::CloudFormation::Stack')),
+        'arn:backend-stack': summaries(('DbGroup', 'db-asg', 'AWS::AutoScaling::AutoScalingGroup')),
+    }
+
+    mock_cloudformation_connection = mock.MagicMock(**{
+        'list_stack_resources.side_effect': lambda stack_name, next_token=None: stacks[stack_name]
+    })
+
+    return mock.MagicMock(**{'connect_to_region.return_value': mock_cloudformation_connection})
+
+
+class TestStackIndex(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+
+    def test_single_call_per_stack(self):
+        mock_cloudformation = mock_stacks_environment()
+        index = StackIndex()
+
+        with mock.patch('boto.cloudformation', mock_cloudformation):
+            self.assertEqual('web-asg', index.logical_to_physical('region', 'stack-name', 'WebGroup'))
+            self.assertEqual('worker-asg', index.logical_to_physical('region', 'stack-name', 'WorkerGroup'))
+
+        mock_cfn_connection = mock_cloudformation.connect_to_region.return_value
+        mock_cfn_connection.list_stack_resources.assert_called_once_with('stack-name', next_token=None)
+        self.assertFalse(mock_cfn_connection.describe_stack_resource.called)
+
+    def test_nested_stack(self):
+        mock_cloudformation = mock_stacks_environment()
+        index = StackIndex()
+
+        with mock.patch('boto.cloudformation', mock_cloudformation):
+            self.assertEqual('db-asg', index.logical_to_physical('region', 'stack-name', 'Backend.DbGroup'))
+
+            self.assertRaises(LookupError, index.logical_to_physical, 'region', 'stack-name', 'Missing')
+            self.assertRaises(LookupError, index.logical_to_physical, 'region', 'stack-name', 'WebGroup.DbGroup')
+
+    def test_revalidation(self):
+        mock_cloudformation = mock_stacks_environment()
+        mock_cfn_connection = mock_cloudformation.connect_to_region.return_value
+        index = StackIndex(revalidate_after=0)
+
+        with mock.patch('boto.cloudformation', mock_cloudformation):
+            index.resources('region', 'stack-name')
+
+            mock_cfn_connection.describe_stack_events.return_value = [
+                mock.Mock(timestamp=datetime.utcnow() - timedelta(days=1))]
+            index.resources('region', 'stack-name')
+            self.assertEqual(1, mock_cfn_connection.list_stack_resources.call_count)
+
+            mock_cfn_connection.describe_stack_events.return_value = [
+                mock.Mock(timestamp=datetime.utcnow() + timedelta(seconds=1))]
+            index.resources('region', 'stack-name')
+            self.assertEqual(2, mock_cfn_connection.list_stack_resources.call_count)
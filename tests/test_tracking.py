@@ -0,0 +1,158 @@
+#
+# Copyright 2015 DoAT. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY DoAT ``AS IS'' AND ANY EXPRESS OR IMPLIED
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+# EVENT SHALL DoAT OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA,
+# OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE,
+# EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation are
+# those of the authors and should not be interpreted as representing official
+# policies, either expressed or implied, of DoAT
+
+from fabric_aws import autoscaling_group_generator, ec2_generator
+from fabric_aws.connections import reset_connections
+from fabric_aws.tracking import AutoscalingGroupTracker, InstanceIdsTracker, reset_trackers
+import boto.ec2
+import unittest
+import mock
+
+
+class MockFleet(object):
+    def __init__(self):
+        self.instances = {}
+        self.members = []
+        self.activities = [mock.Mock(activity_id='activity-1', status_code='Successful')]
+
+        for instance_id in ['i-00000001', 'i-00000002', 'i-00000003']:
+            self.launch(instance_id)
+
+        self.ec2_connection = mock.MagicMock(**{
+            'get_all_instances.side_effect': self.get_all_instances,
+            'get_all_instance_status.side_effect': self.get_all_instance_status,
+        })
+        self.autoscale_connection = mock.MagicMock(**{
+            'get_all_activities.side_effect': lambda name, max_records=None: self.activities[:max_records],
+            'get_all_groups.side_effect': lambda names: [
+                mock.Mock(instances=[mock.Mock(instance_id=instance_id) for instance_id in self.members])]
+        })
+        self.ec2 = mock.MagicMock(**{'connect_to_region.return_value': self.ec2_connection,
+                                     'autoscale.connect_to_region.return_value': self.autoscale_connection})
+
+    def launch(self, instance_id):
+        self.instances[instance_id] = mock.Mock(id=instance_id, state='running',
+                                                public_dns_name=instance_id + '.example.com')
+        self.members.append(instance_id)
+
+    def get_all_instances(self, filters):
+        return [mock.Mock(instances=[self.instances[instance_id] for instance_id in filters['instance-id']
+                                     if instance_id in self.instances])]
+
+    def get_all_instance_status(self, instance_ids, include_all_instances):
+        return [mock.Mock(id=instance_id, state_name=self.instances[instance_id].state) for instance_id in instance_ids]
+
+    def described(self):
+        return [call_args[1]['filters']['instance-id']
+                for call_args in self.ec2_connection.get_all_instances.call_args_list]
+
+
+class TestTracking(unittest.TestCase):
+    def setUp(self):
+        reset_connections()
+        reset_trackers()
+
+    def test_autoscaling_group_deltas(self):
+        fleet = MockFleet()
+        tracker = AutoscalingGroupTracker('region', 'asg')
+
+        with mock.patch('boto.ec2', fleet.ec2):
+            self.assertListEqual(['i-00000001', 'i-00000002', 'i-00000003'],
+                                 [instance.id for instance in tracker.instances()])
+
+            # nothing happened since, a single cheap call
+            tracker.refresh()
+            self.assertEqual(1, fleet.autoscale_connection.get_all_groups.call_count)
+            self.assertEqual(2, fleet.autoscale_connection.get_all_activities.call_count)
+
+            # i-00000002 was replaced by i-00000004
+            fleet.members.remove('i-00000002')
+            fleet.launch('i-00000004')
+            fleet.activities.insert(0, mock.Mock(activity_id='activity-2', status_code='InProgress'))
+
+            self.assertListEqual(['i-00000001', 'i-00000003', 'i-00000004'],
+                                 [instance.id for instance in tracker.instances()])
+
+            # the activity is still in progress, membership is read again but nothing is described
+            tracker.refresh()
+            self.assertEqual(3, fleet.autoscale_connection.get_all_groups.call_count)
+
+        self.assertListEqual([['i-00000001', 'i-00000002', 'i-00000003'], ['i-00000004']], fleet.described())
+        self.assertEqual(4, tracker.described)
+
+    def test_autoscaling_group_pending_member(self):
+        fleet = MockFleet()
+        fleet.instances['i-00000003'] = mock.Mock(id='i-00000003', state='pending', public_dns_name='')
+        tracker = AutoscalingGroupTracker('region', 'asg')
+
+        with mock.patch('boto.ec2', fleet.ec2):
+            self.assertListEqual(['pending'], [instance.state for instance in tracker.instances()
+                                               if instance.id == 'i-00000003'])
+
+            # the member is running now, the scaling activity was already finished
+            fleet.instances['i-00000003'] = mock.Mock(id='i-00000003', state='running',
+                                                      public_dns_name='i-00000003.example.com')
+            self.assertListEqual(['i-00000001.example.com', 'i-00000002.example.com', 'i-00000003.example.com'],
+                                 [instance.public_dns_name for instance in tracker.instances()])
+
+            # settled, nothing is described anymore
+            tracker.refresh()
+
+        self.assertEqual(1, fleet.autoscale_connection.get_all_groups.call_count)
+        self.assertListEqual([['i-00000001', 'i-00000002', 'i-00000003'], ['i-00000003']], fleet.described())
+
+    def test_instance_ids_deltas(self):
+        fleet = MockFleet()
+        fleet.instances['i-00000002'].state = 'stopped'
+        tracker = InstanceIdsTracker('region', ['i-00000001', 'i-00000002', 'i-00000003'])
+
+        with mock.patch('boto.ec2', fleet.ec2):
+            self.assertEqual(3, len(tracker.instances()))
+
+            tracker.refresh()
+
+            fleet.instances['i-00000002'] = mock.Mock(id='i-00000002', state='running')
+            fleet.instances['i-00000003'].state = 'terminated'
+            self.assertListEqual(['i-00000001', 'i-00000002'], [instance.id for instance in tracker.instances()])
+
+        self.assertListEqual([['i-00000001', 'i-00000002', 'i-00000003'], ['i-00000002']], fleet.described())
+
+    def test_generators(self):
+        fleet = MockFleet()
+
+        with mock.patch('boto.ec2', fleet.ec2):
+            for _ in range(3):
+                self.assertListEqual(['i-00000001.example.com', 'i-00000002.example.com', 'i-00000003.example.com'],
+                                     list(autoscaling_group_generator('region', 'asg', incremental=True)))
+                self.assertListEqual(['i-00000001.example.com'],
+                                     list(ec2_generator('region', ['i-00000001'], incremental=True)))
+
+            with self.assertRaises(ValueError):
+                list(ec2_generator('region', filters={'tag:Name': 'web'}, incremental=True))
+
+        self.assertEqual(2, fleet.ec2_connection.get_all_instances.call_count)